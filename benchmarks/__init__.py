@@ -0,0 +1,4 @@
+"""
+Пакет замеров производительности имитационной модели.
+Запуск: python -m benchmarks.<имя модуля>
+"""
@@ -0,0 +1,95 @@
+"""Проход диспетчера при пачках одновременных освобождений врачей.
+Смена начинается с полного буфера и свободных врачей, время приема постоянное,
+поэтому врачи освобождаются одновременно. Сравниваются одиночное назначение
+на событие и проход до исчерпания свободных врачей или пациентов: простой врачей
+при непустой очереди, ожидание и пропускная способность.
+Запуск: python -m benchmarks.bench_dispatch [горизонт_мин] [повторов]"""
+
+import random
+import sys
+import time
+from config.scenario import compile_scenario
+from core.simulation_core import SimulationCore
+from core.time_parallel import PatientRecord, SegmentState, restore_state
+from utils.output import suppressed_output
+
+NUM_DOCTORS = 4
+BUFFER_CAPACITY = 8
+SERVICE_TIME = 30.0
+
+
+class IdleWithQueueMonitor:
+    """Наблюдатель ядра: врачи-минуты простоя, пока в буфере есть пациенты"""
+
+    def __init__(self, start_time: float):
+        self.last_time = start_time
+        self.idle_doctors = 0
+        self.idle_minutes = 0.0
+
+    def on_event(self, core) -> None:
+        self.idle_minutes += self.idle_doctors * (core.current_time - self.last_time)
+        self.last_time = core.current_time
+        free = sum(1 for doctor in core.doctors if not doctor.is_busy)
+        self.idle_doctors = min(free, core.waiting_room.size)
+
+
+def _burst_scenario(drain_all: bool):
+    return compile_scenario({'system': {'drain_all': drain_all},
+                             'service_time': {'default': {'law': 'discrete', 'values': [SERVICE_TIME]}}})
+
+
+def _shift_start(scenario) -> SegmentState:
+    """Начало смены: буфер заполнен, все врачи свободны"""
+    sources = scenario.source_ids
+    buffer = tuple(PatientRecord(1_000_000 + i, sources[i % len(sources)], f"Ожидающий {i + 1}", 0.0, None)
+                   for i in range(BUFFER_CAPACITY))
+    return SegmentState(time=0.0, buffer=buffer, doctors=(None,) * NUM_DOCTORS)
+
+
+def run_once(horizon: float, seed: int, drain_all: bool) -> dict:
+    scenario = _burst_scenario(drain_all)
+    random.seed(seed)
+    with suppressed_output():
+        core = SimulationCore(scenario)
+        core.initialize_system(num_doctors=NUM_DOCTORS, buffer_capacity=BUFFER_CAPACITY,
+                               mean_service_time=SERVICE_TIME)
+        restore_state(core, _shift_start(scenario))
+        monitor = IdleWithQueueMonitor(core.current_time)
+        core.add_observer(monitor)
+        started = time.perf_counter()
+        core.dispatcher.dispatch(core.current_time)
+        monitor.on_event(core)
+        core.run_until(horizon)
+        elapsed = time.perf_counter() - started
+
+    statistics = core.statistics
+    return {
+        'served': statistics.total_patients_served,
+        'avg_wait_time': statistics.get_average_wait_time(),
+        'rejection_rate': statistics.get_rejection_rate(),
+        'idle_with_queue': monitor.idle_minutes,
+        'seconds': elapsed
+    }
+
+
+def main():
+    horizon = float(sys.argv[1]) if len(sys.argv) > 1 else 2000.0
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    print(f"{'Горизонт, мин':<40} {horizon:.0f}")
+    print(f"{'Показатель (среднее по повторам)':<40} {'по одному':<15} {'до исчерпания':<15}")
+    print(f"{'-' * 70}")
+    single = [run_once(horizon, seed, drain_all=False) for seed in range(repeats)]
+    drained = [run_once(horizon, seed, drain_all=True) for seed in range(repeats)]
+    for key, title in (('served', 'Обслужено'),
+                       ('avg_wait_time', 'Среднее ожидание, мин'),
+                       ('rejection_rate', 'Отказов, %'),
+                       ('idle_with_queue', 'Простой при очереди, врачо-мин'),
+                       ('seconds', 'Время прогона, с')):
+        first = sum(result[key] for result in single) / repeats
+        second = sum(result[key] for result in drained) / repeats
+        print(f"{title:<40} {first:<15.3f} {second:<15.3f}")
+
+
+if __name__ == '__main__':
+    main()
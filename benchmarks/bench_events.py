@@ -0,0 +1,77 @@
+"""Замер обработки событий: событий в секунду и число созданных объектов событий
+для двух вариантов одного прогона - без пула событий (каждое событие создается заново,
+как до введения EventPool) и с пулом. Сравнивается только переиспользование событий:
+прежняя диспетчеризация через hasattr в дереве не сохранилась.
+Запуск: python -m benchmarks.bench_events [горизонт_мин] [повторов]"""
+
+import random
+import sys
+import time
+from core.simulation_core import SimulationCore
+from events.event import Event
+from events.event_pool import EventPool
+from utils.output import suppressed_output
+
+
+def _count_event_allocations():
+    """Подменяет Event.__new__ счетчиком созданных объектов событий"""
+    counter = {'allocated': 0}
+    original_new = Event.__new__
+
+    def counting_new(cls, *args, **kwargs):
+        counter['allocated'] += 1
+        return original_new(cls)
+
+    Event.__new__ = counting_new
+    return counter, original_new
+
+
+def run_once(horizon: float, seed: int, pooled: bool = True) -> dict:
+    """Один безэкранный прогон на горизонт horizon (pooled=False - пул не хранит событий)"""
+    random.seed(seed)
+    with suppressed_output():
+        core = SimulationCore()
+        core.initialize_system()
+    if not pooled:
+        core.event_pool = EventPool(max_size=0)
+
+    counter, original_new = _count_event_allocations()
+    try:
+        started = time.perf_counter()
+        core.run_until(horizon)
+        elapsed = time.perf_counter() - started
+    finally:
+        Event.__new__ = original_new
+
+    return {
+        'events': core.processed_events,
+        'seconds': elapsed,
+        'events_per_second': core.processed_events / elapsed if elapsed > 0 else 0.0,
+        'event_objects_allocated': counter['allocated']
+    }
+
+
+def main():
+    horizon = float(sys.argv[1]) if len(sys.argv) > 1 else 200000.0
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    print(f"{'Горизонт, мин':<30} {horizon:.0f}")
+    print(f"{'Повторов (одни и те же зерна)':<30} {repeats}")
+    print(f"{'':<30} {'без пула':>12} {'с пулом':>12}")
+    rows = []
+    for pooled in (False, True):
+        results = [run_once(horizon, seed, pooled) for seed in range(repeats)]
+        rows.append({key: sum(result[key] for result in results)
+                     for key in ('events', 'seconds', 'event_objects_allocated')})
+    cells = {
+        'Событий обработано': [f"{row['events']}" for row in rows],
+        'Событий в секунду': [f"{row['events'] / row['seconds']:.0f}" if row['seconds'] > 0 else '0'
+                              for row in rows],
+        'Создано объектов событий': [f"{row['event_objects_allocated']}" for row in rows],
+        'Объектов на событие': [f"{row['event_objects_allocated'] / max(1, row['events']):.3f}" for row in rows]
+    }
+    for title, values in cells.items():
+        print(f"{title:<30}" + "".join(f" {value:>12}" for value in values))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Сравнение компактного ядра с объектной моделью на одинаковом горизонте.
+Запуск: python -m benchmarks.bench_kernel [горизонт_мин] [повторов]"""
+
+import random
+import sys
+import time
+from core.fast_kernel import run_fast
+from core.simulation_core import SimulationCore
+from utils.output import suppressed_output
+
+
+def run_engine(horizon: float, seed: int) -> float:
+    random.seed(seed)
+    with suppressed_output():
+        core = SimulationCore()
+        core.initialize_system()
+    started = time.perf_counter()
+    core.run_until(horizon)
+    return time.perf_counter() - started
+
+
+def run_kernel(horizon: float, seed: int) -> float:
+    started = time.perf_counter()
+    run_fast(horizon, seed=seed)
+    return time.perf_counter() - started
+
+
+def main():
+    horizon = float(sys.argv[1]) if len(sys.argv) > 1 else 200000.0
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    engine = min(run_engine(horizon, seed) for seed in range(repeats))
+    kernel = min(run_kernel(horizon, seed) for seed in range(repeats))
+
+    print(f"{'Горизонт, мин':<30} {horizon:.0f}")
+    print(f"{'Объектная модель, с':<30} {engine:.3f}")
+    print(f"{'Компактное ядро, с':<30} {kernel:.3f}")
+    print(f"{'Ускорение':<30} {engine / kernel:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,451 @@
+"""Сценарий модели: загрузка из файла, проверка и компиляция в неизменяемый объект."""
+
+import json
+import math
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from entities.priority import Priority
+from config.settings import (
+    PATIENT_GENERATION_SETTINGS, SOURCE_ID_MAPPING, DISPLAY_DESCRIPTIONS,
+    DEFAULT_NUM_DOCTORS, DEFAULT_BUFFER_CAPACITY, DEFAULT_MEAN_SERVICE_TIME,
+    DISPLAY_SETTINGS, STATISTICS_SETTINGS, ARRIVAL_PROFILE_SETTINGS, SERVICE_TIME_SETTINGS,
+    PATIENCE_SETTINGS, ARRIVAL_TRACE_SETTINGS, DISPATCH_SETTINGS, EVENT_QUEUE_SETTINGS
+)
+from services.service_time import ServiceTimeLaw, make_service_time_law
+from utils.timestamps import parse_trace_time
+
+# Описание закона в неизменяемом виде: ((параметр, значение), ...), списки - кортежи
+LawSpec = Tuple[Tuple[str, Any], ...]
+
+# Разделы файла сценария (ключи раздела - ключи сценария по умолчанию) и поля источника
+SCENARIO_SECTIONS = ('system', 'display', 'statistics', 'arrival_profile', 'arrival_trace', 'service_time',
+                     'patience')
+SOURCE_KEYS = ('source_id', 'key', 'priority', 'min_interval', 'max_interval', 'probability',
+               'description', 'display_name')
+
+
+@dataclass(frozen=True, slots=True)
+class SourceSpec:
+    """Источник заявок сценария"""
+    source_id: int
+    key: str  # Имя приоритета (категории): 'EMERGENCY', 'BY_APPOINTMENT', ...
+    priority: Priority  # Свой у каждого источника (Д2Б4)
+    min_interval: float
+    max_interval: float
+    probability: float
+    description: str  # Полное описание ('Неотложная помощь')
+    display_name: str  # Краткое имя для таблиц ('Неотложка')
+
+
+@dataclass(frozen=True, slots=True)
+class Scenario:
+    """Скомпилированный сценарий. Проверяется один раз при загрузке,
+    производные величины (накопленные вероятности, таблицы соответствия)
+    считаются заранее, поэтому горячие участки модели обходятся без словарей."""
+    name: str
+    sources: Tuple[SourceSpec, ...]  # По возрастанию source_id
+    source_ids: Tuple[int, ...]  # Номера источников по возрастанию (счетчики статистики - по номеру)
+    cumulative_probabilities: Tuple[float, ...]  # Для выбора типа пациента
+    source_priorities: Tuple[Priority, ...]  # Приоритеты в порядке sources
+    priorities_by_source_id: Tuple[Optional[Priority], ...]  # Индекс - source_id
+    source_ids_by_priority: Tuple[int, ...]  # Индекс - priority.value
+    source_names_by_id: Tuple[str, ...]  # Индекс - source_id
+
+    num_doctors: int
+    buffer_capacity: int
+    mean_service_time: float
+    min_service_time: float
+    drain_all: bool  # Проход диспетчера назначает всех, кого можно (False - одно назначение на событие)
+    batch_same_time: bool  # События с одинаковым временем обрабатываются одним пакетом
+
+    table_width: int
+    max_events_display: int
+    status_free: str
+    status_busy: str
+
+    confidence_t_alpha: float
+    relative_accuracy_delta: float
+    min_patients_for_accuracy: int
+
+    arrival_profile_path: Optional[str]
+    arrival_profile_period: float
+
+    arrival_trace_path: Optional[str]  # Журнал поступлений вместо генерации
+    arrival_trace_start: Optional[float]  # Время записи, соответствующее модельному нулю, мин
+    arrival_trace_scale: float
+
+    service_time_law: LawSpec  # Закон по умолчанию
+    service_time_by_doctor: Tuple[Tuple[int, LawSpec], ...]
+    service_time_by_priority: Tuple[Tuple[str, LawSpec], ...]  # Имя приоритета -> закон
+
+    patience_by_priority: Tuple[Tuple[str, LawSpec], ...]  # Имя приоритета -> закон времени терпения
+    balk_threshold_by_priority: Tuple[Tuple[str, int], ...]  # Имя приоритета -> порог очереди
+
+    @property
+    def has_patience(self) -> bool:
+        """Заданы ли уход из очереди или отказ встать в очередь"""
+        return bool(self.patience_by_priority) or bool(self.balk_threshold_by_priority)
+
+    def build_patience_laws(self) -> List[Optional[ServiceTimeLaw]]:
+        """Законы времени терпения, индекс - source_id (None - пациент ждет сколько угодно)"""
+        laws: List[Optional[ServiceTimeLaw]] = [None] * (max(self.source_ids) + 1)
+        specs = dict(self.patience_by_priority)
+        for source in self.sources:
+            if source.key in specs:
+                laws[source.source_id] = make_service_time_law(_thaw_law(specs[source.key]), 1.0)
+        return laws
+
+    def build_balk_thresholds(self) -> List[Optional[int]]:
+        """Пороги очереди для отказа встать в нее, индекс - source_id (None - без отказа)"""
+        thresholds: List[Optional[int]] = [None] * (max(self.source_ids) + 1)
+        by_key = dict(self.balk_threshold_by_priority)
+        for source in self.sources:
+            thresholds[source.source_id] = by_key.get(source.key)
+        return thresholds
+
+    @property
+    def has_custom_service_time(self) -> bool:
+        """Задан ли закон обслуживания, отличный от экспоненциального со средним врача"""
+        return (self.service_time_law != (('law', 'exponential'),) or
+                bool(self.service_time_by_doctor) or bool(self.service_time_by_priority))
+
+    def get_service_time_spec(self, doctor_id: Optional[int] = None,
+                              priority: Optional[Priority] = None) -> Dict:
+        """Описание закона обслуживания: по приоритету, иначе по врачу, иначе по умолчанию"""
+        if priority is not None:
+            for key, spec in self.service_time_by_priority:
+                if key == priority.name:
+                    return _thaw_law(spec)
+        if doctor_id is not None:
+            for key, spec in self.service_time_by_doctor:
+                if key == doctor_id:
+                    return _thaw_law(spec)
+        return _thaw_law(self.service_time_law)
+
+    def get_source(self, priority: Priority) -> SourceSpec:
+        """Возвращает источник заявок данного приоритета"""
+        return self.sources[self.source_priorities.index(priority)]
+
+    def to_dict(self) -> Dict:
+        """Возвращает сценарий в формате файла (для сохранения и изменения)"""
+        return {
+            'name': self.name,
+            'sources': [{
+                'source_id': source.source_id,
+                'key': source.key,
+                'priority': source.priority.value,
+                'min_interval': source.min_interval,
+                'max_interval': source.max_interval,
+                'probability': source.probability,
+                'description': source.description,
+                'display_name': source.display_name
+            } for source in self.sources],
+            'system': {
+                'num_doctors': self.num_doctors,
+                'buffer_capacity': self.buffer_capacity,
+                'mean_service_time': self.mean_service_time,
+                'min_service_time': self.min_service_time,
+                'drain_all': self.drain_all,
+                'batch_same_time': self.batch_same_time
+            },
+            'display': {
+                'table_width': self.table_width,
+                'max_events_display': self.max_events_display,
+                'status_free': self.status_free,
+                'status_busy': self.status_busy
+            },
+            'statistics': {
+                'confidence_t_alpha': self.confidence_t_alpha,
+                'relative_accuracy_delta': self.relative_accuracy_delta,
+                'min_patients_for_accuracy': self.min_patients_for_accuracy
+            },
+            'arrival_profile': {
+                'table_path': self.arrival_profile_path,
+                'period': self.arrival_profile_period
+            },
+            'arrival_trace': {
+                'path': self.arrival_trace_path,
+                'start': self.arrival_trace_start,
+                'scale': self.arrival_trace_scale
+            },
+            'service_time': {
+                'default': _thaw_law(self.service_time_law),
+                'by_doctor': {doctor_id: _thaw_law(spec) for doctor_id, spec in self.service_time_by_doctor},
+                'by_priority': {key: _thaw_law(spec) for key, spec in self.service_time_by_priority}
+            },
+            'patience': {
+                'by_priority': {key: _thaw_law(spec) for key, spec in self.patience_by_priority},
+                'balk_threshold': dict(self.balk_threshold_by_priority)
+            }
+        }
+
+    def with_changes(self, **system_changes) -> 'Scenario':
+        """Возвращает новый сценарий с измененными параметрами раздела system"""
+        data = self.to_dict()
+        data['system'].update(system_changes)
+        return compile_scenario(data)
+
+
+def _default_scenario_data() -> Dict:
+    """Сценарий по умолчанию в формате файла - из config.settings"""
+    return {
+        'name': 'default',
+        'sources': [{
+            'source_id': source_id,
+            'key': key,
+            'min_interval': PATIENT_GENERATION_SETTINGS[key]['min_interval'],
+            'max_interval': PATIENT_GENERATION_SETTINGS[key]['max_interval'],
+            'probability': PATIENT_GENERATION_SETTINGS[key]['probability'],
+            'description': PATIENT_GENERATION_SETTINGS[key]['description'],
+            'display_name': DISPLAY_DESCRIPTIONS['sources'].get(source_id, f"И{source_id}")
+        } for source_id, key in sorted(SOURCE_ID_MAPPING.items())],
+        'system': {
+            'num_doctors': DEFAULT_NUM_DOCTORS,
+            'buffer_capacity': DEFAULT_BUFFER_CAPACITY,
+            'mean_service_time': DEFAULT_MEAN_SERVICE_TIME,
+            'min_service_time': DISPLAY_SETTINGS['min_service_time'],
+            'drain_all': DISPATCH_SETTINGS['drain_all'],
+            'batch_same_time': EVENT_QUEUE_SETTINGS['batch_same_time']
+        },
+        'display': {
+            'table_width': DISPLAY_SETTINGS['table_width'],
+            'max_events_display': DISPLAY_SETTINGS['max_events_display'],
+            'status_free': DISPLAY_DESCRIPTIONS['statuses']['free'],
+            'status_busy': DISPLAY_DESCRIPTIONS['statuses']['busy']
+        },
+        'statistics': dict(STATISTICS_SETTINGS),
+        'arrival_profile': dict(ARRIVAL_PROFILE_SETTINGS),
+        'arrival_trace': {key: ARRIVAL_TRACE_SETTINGS[key] for key in ('path', 'start', 'scale')},
+        'service_time': {
+            'default': dict(SERVICE_TIME_SETTINGS['default']),
+            'by_doctor': dict(SERVICE_TIME_SETTINGS['by_doctor']),
+            'by_priority': dict(SERVICE_TIME_SETTINGS['by_priority'])
+        },
+        'patience': {
+            'by_priority': dict(PATIENCE_SETTINGS['by_priority']),
+            'balk_threshold': dict(PATIENCE_SETTINGS['balk_threshold'])
+        }
+    }
+
+
+def _check_keys(given, known, where: str) -> None:
+    """Опечатка в ключе не должна молча превращаться в значение по умолчанию"""
+    unknown = sorted(set(given) - set(known))
+    if unknown:
+        raise ValueError(f"Неизвестные ключи {where}: {', '.join(map(str, unknown))}. "
+                         f"Допустимы: {', '.join(known)}")
+
+
+def _require_positive(value, name: str) -> None:
+    if not isinstance(value, (int, float)) or value <= 0:
+        raise ValueError(f"Параметр сценария '{name}' должен быть положительным числом, получено {value!r}")
+
+
+def _freeze_law(spec: Dict) -> LawSpec:
+    return tuple(sorted((key, tuple(value) if isinstance(value, list) else value)
+                        for key, value in spec.items()))
+
+
+def _thaw_law(spec: LawSpec) -> Dict:
+    return {key: list(value) if isinstance(value, tuple) else value for key, value in spec}
+
+
+def _compile_law(spec: Dict, name: str, mean_service_time: float) -> LawSpec:
+    """Проверяет описание закона обслуживания (строит его один раз) и замораживает"""
+    spec = dict(spec)
+    spec.setdefault('law', 'exponential')
+    try:
+        make_service_time_law(spec, mean_service_time)
+    except (ValueError, OSError, KeyError) as error:
+        raise ValueError(f"Закон обслуживания {name}: {error}") from None
+    return _freeze_law(spec)
+
+
+def compile_scenario(data: Dict) -> Scenario:
+    """Проверяет описание сценария и компилирует его.
+    Отсутствующие разделы берутся из сценария по умолчанию."""
+    merged = _default_scenario_data()
+    _check_keys(data, ('name', 'sources') + SCENARIO_SECTIONS, "сценария")
+    for section in SCENARIO_SECTIONS:
+        _check_keys(data.get(section, {}), tuple(merged[section]), f"раздела '{section}'")
+        merged[section].update(data.get(section, {}))
+    if 'sources' in data:
+        merged['sources'] = data['sources']
+    merged['name'] = data.get('name', merged['name'])
+
+    # Источники. Приоритет источника - категория key со значением priority
+    # (по умолчанию - значение стандартной категории или номер источника)
+    sources = []
+    seen_ids = set()
+    seen_keys = set()
+    seen_values = set()
+    for raw in merged['sources']:
+        _check_keys(raw, SOURCE_KEYS, "источника")
+        source_id = int(raw['source_id'])
+        key = raw['key']
+        if source_id in seen_ids:
+            raise ValueError(f"Источник {source_id} описан дважды")
+        if source_id < 1:
+            raise ValueError(f"Номер источника должен быть положительным, получено {source_id}")
+        if key in seen_keys:
+            raise ValueError(f"Приоритет '{key}' задан у нескольких источников")
+        known = Priority.__members__.get(key)
+        value = int(raw.get('priority', known.value if known is not None else source_id))
+        if value < 1:
+            raise ValueError(f"Источник {source_id}: значение приоритета '{key}' должно быть положительным")
+        if value in seen_values:
+            raise ValueError(f"Источник {source_id}: значение приоритета {value} уже занято")
+        # Приоритет принадлежит сценарию: реестр стандартных категорий не меняется
+        description = raw.get('display_name') or (known.description if known is not None else key)
+        priority = Priority(key, value, description)
+        seen_ids.add(source_id)
+        seen_keys.add(key)
+        seen_values.add(value)
+
+        min_interval = float(raw['min_interval'])
+        max_interval = float(raw['max_interval'])
+        probability = float(raw['probability'])
+        _require_positive(max_interval, f"sources[{source_id}].max_interval")
+        if not 0 <= min_interval <= max_interval:
+            raise ValueError(f"Источник {source_id}: нужно 0 <= min_interval <= max_interval")
+        if not 0 <= probability <= 1:
+            raise ValueError(f"Источник {source_id}: вероятность вне [0, 1]")
+
+        sources.append(SourceSpec(
+            source_id=source_id,
+            key=key,
+            priority=priority,
+            min_interval=min_interval,
+            max_interval=max_interval,
+            probability=probability,
+            description=raw.get('description', key),
+            display_name=raw.get('display_name', f"И{source_id}")
+        ))
+
+    if not sources:
+        raise ValueError("В сценарии нет источников")
+    sources.sort(key=lambda source: source.source_id)
+
+    total_probability = sum(source.probability for source in sources)
+    if not math.isclose(total_probability, 1.0, abs_tol=1e-9):
+        raise ValueError(f"Сумма вероятностей источников должна быть 1, получено {total_probability}")
+
+    cumulative = []
+    acc = 0.0
+    for source in sources:
+        acc += source.probability
+        cumulative.append(acc)
+    cumulative[-1] = 1.0  # Защита от накопленной ошибки округления
+
+    max_source_id = max(source.source_id for source in sources)
+    priorities_by_source_id = [None] * (max_source_id + 1)
+    source_names_by_id = [f"И{i}" for i in range(max_source_id + 1)]
+    source_ids_by_priority = [0] * (max(source.priority.value for source in sources) + 1)
+    for source in sources:
+        priorities_by_source_id[source.source_id] = source.priority
+        source_names_by_id[source.source_id] = source.display_name
+        source_ids_by_priority[source.priority.value] = source.source_id
+
+    # Система
+    system = merged['system']
+    for name in ('num_doctors', 'buffer_capacity', 'mean_service_time', 'min_service_time'):
+        _require_positive(system[name], name)
+    for name in ('drain_all', 'batch_same_time'):
+        if not isinstance(system[name], bool):
+            raise ValueError(f"Параметр сценария '{name}' должен быть true или false, получено {system[name]!r}")
+
+    display = merged['display']
+    statistics = merged['statistics']
+    for name in ('confidence_t_alpha', 'relative_accuracy_delta', 'min_patients_for_accuracy'):
+        _require_positive(statistics[name], name)
+
+    profile = merged['arrival_profile']
+    trace = merged['arrival_trace']
+    if trace.get('path') and profile.get('table_path'):
+        raise ValueError("Журнал поступлений и профиль прибытий нельзя задать одновременно")
+    _require_positive(trace.get('scale', 1.0), 'arrival_trace.scale')
+    trace_start = trace.get('start')
+    if trace_start is not None:
+        trace_start = parse_trace_time(trace_start)
+
+    # Законы времени обслуживания
+    service_time = merged['service_time']
+    mean_service_time = float(system['mean_service_time'])
+    by_doctor = []
+    for doctor_id, spec in service_time.get('by_doctor', {}).items():
+        by_doctor.append((int(doctor_id), _compile_law(spec, f"врача {doctor_id}", mean_service_time)))
+    by_priority = []
+    for key, spec in service_time.get('by_priority', {}).items():
+        if key not in seen_keys:
+            raise ValueError(f"Неизвестный приоритет в законах обслуживания: '{key}'")
+        by_priority.append((key, _compile_law(spec, f"приоритета {key}", mean_service_time)))
+
+    # Терпение: законы с явным средним и пороги отказа встать в очередь
+    patience = merged['patience']
+    patience_by_priority = []
+    for key, spec in patience.get('by_priority', {}).items():
+        if key not in seen_keys:
+            raise ValueError(f"Неизвестный приоритет в законах терпения: '{key}'")
+        spec = dict(spec)
+        spec.setdefault('mean', PATIENCE_SETTINGS['default_mean'])
+        patience_by_priority.append((key, _compile_law(spec, f"терпения {key}", spec['mean'])))
+    balk_thresholds = []
+    for key, threshold in patience.get('balk_threshold', {}).items():
+        if key not in seen_keys:
+            raise ValueError(f"Неизвестный приоритет в порогах отказа: '{key}'")
+        if not isinstance(threshold, int) or threshold < 1:
+            raise ValueError(f"Порог отказа встать в очередь для '{key}' должен быть целым >= 1")
+        balk_thresholds.append((key, threshold))
+
+    return Scenario(
+        name=str(merged['name']),
+        sources=tuple(sources),
+        source_ids=tuple(source.source_id for source in sources),
+        cumulative_probabilities=tuple(cumulative),
+        source_priorities=tuple(source.priority for source in sources),
+        priorities_by_source_id=tuple(priorities_by_source_id),
+        source_ids_by_priority=tuple(source_ids_by_priority),
+        source_names_by_id=tuple(source_names_by_id),
+        num_doctors=int(system['num_doctors']),
+        buffer_capacity=int(system['buffer_capacity']),
+        mean_service_time=mean_service_time,
+        min_service_time=float(system['min_service_time']),
+        drain_all=system['drain_all'],
+        batch_same_time=system['batch_same_time'],
+        table_width=int(display['table_width']),
+        max_events_display=int(display['max_events_display']),
+        status_free=str(display['status_free']),
+        status_busy=str(display['status_busy']),
+        confidence_t_alpha=float(statistics['confidence_t_alpha']),
+        relative_accuracy_delta=float(statistics['relative_accuracy_delta']),
+        min_patients_for_accuracy=int(statistics['min_patients_for_accuracy']),
+        arrival_profile_path=profile.get('table_path'),
+        arrival_profile_period=float(profile.get('period', 1440.0)),
+        arrival_trace_path=trace.get('path'),
+        arrival_trace_start=trace_start,
+        arrival_trace_scale=float(trace.get('scale', 1.0)),
+        service_time_law=_compile_law(service_time.get('default', {}), "по умолчанию", mean_service_time),
+        service_time_by_doctor=tuple(sorted(by_doctor)),
+        service_time_by_priority=tuple(sorted(by_priority)),
+        patience_by_priority=tuple(sorted(patience_by_priority)),
+        balk_threshold_by_priority=tuple(sorted(balk_thresholds))
+    )
+
+
+def load_scenario(path: str) -> Scenario:
+    """Загружает сценарий из файла JSON или TOML"""
+    if path.endswith('.toml'):
+        import tomllib
+        with open(path, 'rb') as scenario_file:
+            data = tomllib.load(scenario_file)
+    else:
+        with open(path, encoding='utf-8') as scenario_file:
+            data = json.load(scenario_file)
+    return compile_scenario(data)
+
+
+@lru_cache(maxsize=None)
+def default_scenario() -> Scenario:
+    """Сценарий по умолчанию, собранный из config.settings"""
+    return compile_scenario(_default_scenario_data())
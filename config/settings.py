@@ -23,6 +23,26 @@ PATIENT_GENERATION_SETTINGS = {
     }
 }
 
+# Профиль прибытий по времени суток (неоднородный поток).
+# Если задан путь к таблице (CSV: source_id, start_minute, rate_per_hour),
+# генератор использует его вместо равномерных интервалов,
+# например 'config/arrival_profile_example.csv'
+ARRIVAL_PROFILE_SETTINGS = {
+    'table_path': None,
+    'period': 1440.0  # Длина периода профиля, мин (сутки)
+}
+
+# Журнал поступлений (core/arrival_trace.py): воспроизведение записанных прибытий
+# вместо генерации. CSV с колонками time, source или двоичный журнал.
+# start - время записи (минуты или ISO 8601), соответствующее модельному нулю
+# (None - первая запись); scale - множитель времени журнала.
+# Пример журнала: 'config/arrival_trace_example.csv'
+ARRIVAL_TRACE_SETTINGS = {
+    'path': None,
+    'start': None,
+    'scale': 1.0,
+    'lookahead': 256  # Окно упорядочивания записей, идущих не по порядку
+}
 
 DEFAULT_NUM_DOCTORS = 3
 DEFAULT_BUFFER_CAPACITY = 5
@@ -42,6 +62,136 @@ STATISTICS_SETTINGS = {
     'min_patients_for_accuracy': 100
 }
 
+# Настройки HTTP/JSON-эндпоинта состояния для внешних дашбордов
+STATE_ENDPOINT_SETTINGS = {
+    'host': '127.0.0.1',
+    'port': 8765,
+    'rebuild_every_events': 50,  # Снимок перестраивается не чаще раза за N событий
+    'history_size': 64  # Сколько версий хранится для выдачи дельт
+}
+
+# Настройки параллельного по времени прогона длинного горизонта
+TIME_PARALLEL_SETTINGS = {
+    'default_horizon': 10080.0  # Неделя модельного времени, мин
+}
+
+# Настройки SQLite-хранилища результатов прогонов
+RESULTS_STORE_SETTINGS = {
+    'batch_size': 100,  # Прогонов в одной транзакции записи
+    'busy_timeout': 30.0  # Ожидание блокировки записи, с
+}
+
+# Настройки потоковой выгрузки исходов пациентов
+PATIENT_EXPORT_SETTINGS = {
+    'buffer_size': 65536  # Записей в одном сбрасываемом блоке
+}
+
+# Настройки оценки редких отказов расщеплением траекторий
+SPLITTING_SETTINGS = {
+    'effort': 1000,  # Траекторий на каждом уровне (и регенерационных циклов на нулевом)
+    'replications': 10  # Независимых повторений оценки для доверительного интервала
+}
+
+# Настройки подбора штата (число врачей и мест в буфере)
+OPTIMIZER_SETTINGS = {
+    'horizon': 10080.0,  # Длина одной репликации, мин
+    'max_doctors': 10,  # Перебираемые конфигурации: 1..max_doctors врачей
+    'max_buffer': 10,  # и 1..max_buffer мест в буфере
+    'initial_replications': 5,  # Репликаций на конфигурацию при первом просмотре
+    'replications_per_round': 10,  # Дополнительных репликаций за раунд распределения
+    'max_replications': 500  # Общий бюджет репликаций
+}
+
+# Настройки планирования экспериментов и суррогатной модели
+DOE_SETTINGS = {
+    'initial_points': 20,  # Точек латинского гиперкуба в начальном плане
+    'max_points': 60,  # Всего моделируемых точек
+    'batch_size': 4,  # Точек, добавляемых за один адаптивный шаг
+    'candidate_pool': 500,  # Кандидатов, среди которых ищется наибольшая неопределенность
+    'horizon': 10080.0,  # Длина репликации в точке, мин
+    # Границы параметров: (нижняя, верхняя, целочисленный)
+    'bounds': {
+        'num_doctors': (1, 6, True),
+        'buffer_capacity': (1, 8, True),
+        'mean_service_time': (10.0, 40.0, False),
+        'emergency_probability': (0.05, 0.30, False),
+        'appointment_probability': (0.20, 0.60, False)  # Без записи - остаток до 1
+    }
+}
+
+# Настройки профилирования памяти длинных прогонов (tracemalloc)
+MEMORY_PROFILE_SETTINGS = {
+    'interval_minutes': 1440.0,  # Снимок каждые N минут модельного времени
+    'top_sites': 10,  # Строк в списке мест наибольшего роста
+    'frames': 1,  # Глубина стека, запоминаемая для каждого выделения
+    # Подсистемы: (имя, путь относительно корня проекта); первое совпадение выигрывает
+    'subsystems': (
+        ('statistics', 'services/statistics.py'),
+        ('waiting_room', 'services/waiting_room.py'),
+        ('events', 'events/'),
+        ('entities', 'entities/'),
+        ('services', 'services/'),
+        ('core', 'core/'),
+        ('utils', 'utils/')
+    )
+}
+
+# Настройки временных рядов состояния системы
+TIME_SERIES_SETTINGS = {
+    'interval': 5.0,  # Шаг опроса состояния, мин модельного времени
+    'capacity': 2048  # Интервалов в буфере; при заполнении соседние сливаются попарно
+}
+
+# Настройки гистограмм времени ожидания, приема и пребывания
+HISTOGRAM_SETTINGS = {
+    'unit': 0.01,  # Наименьшее различимое значение, мин
+    'max_value': 1_000_000.0,  # Наибольшее отслеживаемое значение, мин (больше - в последний интервал)
+    'sub_bucket_bits': 7,  # 2^7 подынтервалов на удвоение: относительная погрешность <= 2/128
+    'percentiles': (50.0, 90.0, 95.0, 99.0)  # Процентили в отчетах
+}
+
+# Законы распределения времени обслуживания (services/service_time.py).
+# Закон: {'law': имя, 'mean': ..., параметры}; без 'mean' берется среднее время приема.
+# Законы: exponential, erlang (k), lognormal (cv), hyperexponential (probabilities, means
+# или ratios), discrete (values, weights), empirical (values или path к CSV).
+# Выбор закона для приема: по приоритету пациента, иначе по врачу, иначе default
+SERVICE_TIME_SETTINGS = {
+    'default': {'law': 'exponential'},
+    'by_doctor': {},  # doctor_id -> закон, например {2: {'law': 'lognormal', 'cv': 0.8}}
+    'by_priority': {},  # имя приоритета -> закон, например {'EMERGENCY': {'law': 'erlang', 'k': 3}}
+    'empirical_column': 'duration'  # Колонка длительностей в CSV эмпирического закона
+}
+
+# Терпение пациентов (уход из очереди) и отказ встать в очередь.
+# by_priority: имя приоритета -> закон времени терпения (как в SERVICE_TIME_SETTINGS;
+# без 'mean' - default_mean). balk_threshold: имя приоритета -> число ожидающих,
+# при котором пришедший пациент сразу уходит. Пустые словари - модель без терпения
+PATIENCE_SETTINGS = {
+    'default_mean': 30.0,  # Среднее время терпения, мин
+    'by_priority': {},  # например {'WITHOUT_APPOINTMENT': {'law': 'exponential', 'mean': 40.0}}
+    'balk_threshold': {}  # например {'WITHOUT_APPOINTMENT': 4}
+}
+
+# Календарь событий: уплотнение при накоплении отмененных событий и пакетная обработка
+# (batch_same_time - значение по умолчанию для раздела system сценария)
+EVENT_QUEUE_SETTINGS = {
+    'compaction_ratio': 0.5,  # Доля отмененных событий в календаре, при которой он уплотняется
+    'compaction_min_cancelled': 64,  # Меньшее число отмененных событий не уплотняется
+    'batch_same_time': False  # Обрабатывать события с одинаковым временем одним пакетом
+}
+
+# Диспетчер: за один проход врачи и пациенты сопоставляются, пока не кончится одна из сторон
+# (значение по умолчанию для раздела system сценария)
+DISPATCH_SETTINGS = {
+    'drain_all': True  # False - не больше одного назначения на событие (для сравнения в бенчмарке)
+}
+
+# Ветвление "что если" от текущего состояния (os.fork, копирование при записи)
+BRANCH_SETTINGS = {
+    'default_horizon': 480.0,  # Горизонт ветви, мин модельного времени (смена)
+    'workers': None  # Одновременно работающих ветвей (None - число процессоров)
+}
+
 # Соответствие source_id и приоритетов
 SOURCE_ID_MAPPING = {
     1: 'EMERGENCY',
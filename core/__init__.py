@@ -5,8 +5,12 @@
 
 from .simulation_core import SimulationCore
 from .patient_generator import PatientGenerator
+from .time_parallel import TimeParallelSimulation
+from .splitting import SplittingEstimator
 
 __all__ = [
     'SimulationCore',
-    'PatientGenerator'
+    'PatientGenerator',
+    'TimeParallelSimulation',
+    'SplittingEstimator'
 ]
\ No newline at end of file
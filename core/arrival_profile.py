@@ -0,0 +1,117 @@
+import csv
+import math
+import random
+from bisect import bisect_right
+from typing import Dict, List, Tuple
+
+
+class ArrivalProfile:
+    """Кусочно-постоянная (по времени суток) интенсивность прибытий по источникам.
+    Поток заявок - неоднородный пуассоновский. Момент следующего прибытия находится
+    обращением накопленной интенсивности по заранее посчитанной таблице (бинарный поиск),
+    без прореживания, поэтому в часы пик не тратятся розыгрыши на отвергнутых кандидатов."""
+
+    def __init__(self, rates: Dict[int, List[Tuple[float, float]]], period: float = 1440.0):
+        """rates: source_id -> [(начало участка в минутах от начала периода, заявок в час), ...]"""
+        if not rates:
+            raise ValueError("Профиль прибытий пуст")
+
+        self.period = period
+        self.source_ids = sorted(rates)
+
+        # Общая сетка точек излома по всем источникам
+        breaks = {0.0}
+        for source_id, segments in rates.items():
+            for start, rate in segments:
+                if not 0.0 <= start < period:
+                    raise ValueError(f"Начало участка {start} вне периода [0, {period})")
+                if rate < 0:
+                    raise ValueError(f"Отрицательная интенсивность для источника {source_id}")
+                breaks.add(float(start))
+        self.breaks: List[float] = sorted(breaks)
+
+        # Интенсивность каждого источника (заявок в минуту) на каждом участке сетки
+        self.source_rates: List[List[float]] = []
+        for break_time in self.breaks:
+            row = []
+            for source_id in self.source_ids:
+                row.append(self._rate_at(sorted(rates[source_id]), break_time) / 60.0)
+            self.source_rates.append(row)
+
+        # Суммарная интенсивность, накопленные доли источников и накопленная интенсивность
+        self.total_rates: List[float] = [sum(row) for row in self.source_rates]
+        self.cumulative_source_rates: List[List[float]] = []
+        for row in self.source_rates:
+            cumulative, acc = [], 0.0
+            for rate in row:
+                acc += rate
+                cumulative.append(acc)
+            self.cumulative_source_rates.append(cumulative)
+
+        self.cumulative: List[float] = [0.0]
+        for j, break_time in enumerate(self.breaks):
+            end = self.breaks[j + 1] if j + 1 < len(self.breaks) else period
+            self.cumulative.append(self.cumulative[-1] + self.total_rates[j] * (end - break_time))
+        self.total_per_period = self.cumulative[-1]
+
+        if self.total_per_period <= 0:
+            raise ValueError("Суммарная интенсивность профиля за период равна нулю")
+
+    @staticmethod
+    def _rate_at(segments: List[Tuple[float, float]], time: float) -> float:
+        """Интенсивность источника (заявок в час) в момент time внутри периода"""
+        rate = segments[-1][1]  # До первого участка действует последний (цикличность)
+        for start, segment_rate in segments:
+            if start <= time:
+                rate = segment_rate
+            else:
+                break
+        return rate
+
+    def _cumulative_at(self, offset: float) -> float:
+        """Накопленная интенсивность от начала периода до offset"""
+        j = bisect_right(self.breaks, offset) - 1
+        return self.cumulative[j] + self.total_rates[j] * (offset - self.breaks[j])
+
+    def sample_next(self, current_time: float) -> Tuple[float, int]:
+        """Разыгрывает момент следующего прибытия и номер источника"""
+        cycles, offset = divmod(current_time, self.period)
+        target = self._cumulative_at(offset) - math.log(1.0 - random.random())
+
+        extra_cycles, remainder = divmod(target, self.total_per_period)
+        j = min(bisect_right(self.cumulative, remainder) - 1, len(self.breaks) - 1)
+        # Участки с нулевой интенсивностью имеют нулевую длину в накопленной шкале
+        while self.total_rates[j] == 0.0:
+            j += 1
+        arrival_offset = self.breaks[j] + (remainder - self.cumulative[j]) / self.total_rates[j]
+        arrival_time = (cycles + extra_cycles) * self.period + arrival_offset
+
+        # Источник - пропорционально интенсивностям на участке прибытия
+        u = random.random() * self.total_rates[j]
+        k = bisect_right(self.cumulative_source_rates[j], u)
+        source_id = self.source_ids[min(k, len(self.source_ids) - 1)]
+
+        return arrival_time, source_id
+
+    def get_mean_rate(self, source_id: int) -> float:
+        """Средняя за период интенсивность источника, заявок в час"""
+        index = self.source_ids.index(source_id)
+        total = 0.0
+        for j, break_time in enumerate(self.breaks):
+            end = self.breaks[j + 1] if j + 1 < len(self.breaks) else self.period
+            total += self.source_rates[j][index] * (end - break_time)
+        return total / self.period * 60.0
+
+    def __str__(self) -> str:
+        return (f"ArrivalProfile(sources={self.source_ids}, segments={len(self.breaks)}, "
+                f"per_period={self.total_per_period:.1f})")
+
+
+def load_arrival_profile(path: str, period: float = 1440.0) -> ArrivalProfile:
+    """Загружает профиль из CSV с колонками source_id, start_minute, rate_per_hour"""
+    rates: Dict[int, List[Tuple[float, float]]] = {}
+    with open(path, newline='', encoding='utf-8') as table:
+        for row in csv.DictReader(table):
+            source_id = int(row['source_id'])
+            rates.setdefault(source_id, []).append((float(row['start_minute']), float(row['rate_per_hour'])))
+    return ArrivalProfile(rates, period=period)
@@ -0,0 +1,203 @@
+"""Воспроизведение записанного журнала поступлений вместо генерации И32.
+Журнал читается потоком через mmap: в памяти только окно из lookahead записей
+(куча по времени), поэтому журнал за годы не загружается целиком, а записи,
+перепутанные в пределах окна, выдаются по порядку.
+
+Форматы:
+- CSV с заголовком и колонками time, source. time - минуты (число) или метка
+  ISO 8601 ('2023-01-05 08:30'); source - номер источника, имя приоритета
+  (EMERGENCY) или описание источника без учета регистра.
+- Двоичный: заголовок TRACE_MAGIC и записи '<dI' (минуты, номер источника),
+  упорядоченные по времени; получается из CSV функцией convert_arrival_trace.
+  Начало воспроизведения в нем находится бинарным поиском, без чтения предыдущих записей.
+
+Модельное время прибытия = (время записи - start) * scale."""
+
+import csv
+import heapq
+import mmap
+import os
+import struct
+from typing import Dict, Iterator, Optional, Tuple
+from config.settings import ARRIVAL_TRACE_SETTINGS
+from utils.timestamps import parse_trace_time
+
+TRACE_MAGIC = b'HSTRACE1'
+_RECORD_FORMAT = struct.Struct('<dI')
+
+
+class ArrivalTrace:
+    """Поток прибытий (модельное время, номер источника) из журнала"""
+
+    def __init__(self, path: str, scenario, start: Optional[float] = None, scale: float = 1.0,
+                 lookahead: Optional[int] = None):
+        """start - время записи (минуты), соответствующее модельному нулю; более ранние
+        записи пропускаются. По умолчанию - время первой записи.
+        scale - множитель времени (0.5 - воспроизведение вдвое быстрее, вдвое выше нагрузка)."""
+        if scale <= 0:
+            raise ValueError("Масштаб времени журнала должен быть положительным")
+        self.path = path
+        self.start = start
+        self.scale = scale
+        self.lookahead = lookahead or ARRIVAL_TRACE_SETTINGS['lookahead']
+        if self.lookahead < 1:
+            raise ValueError("Окно упорядочивания журнала должно быть не меньше 1")
+
+        # Имена источников для CSV: номер, имя приоритета, описание, отображаемое имя
+        self._source_names: Dict[str, int] = {}
+        for source in scenario.sources:
+            for name in (str(source.source_id), source.key, source.description, source.display_name):
+                self._source_names.setdefault(name.lower(), source.source_id)
+        self._valid_source_ids = set(scenario.source_ids)
+
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.binary = self._map is not None and self._map[:len(TRACE_MAGIC)] == TRACE_MAGIC
+        self._records = self._binary_records() if self.binary else self._csv_records()
+
+        self._window = []  # Куча (время записи, порядковый номер, источник)
+        self._order = 0
+        self.last_raw_time = float('-inf')
+        self.emitted = 0
+        self.closed = False
+
+    def _csv_records(self) -> Iterator[Tuple[float, int]]:
+        if self._map is None:
+            return
+        header = next(csv.reader([self._map.readline().decode('utf-8-sig')]), [])
+        columns = [name.strip().lower() for name in header]
+        if 'time' not in columns or 'source' not in columns:
+            raise ValueError(f"{self.path}: в заголовке нужны колонки time и source")
+        time_column, source_column = columns.index('time'), columns.index('source')
+
+        line_number = 1
+        while True:
+            line = self._map.readline()
+            if not line:
+                return
+            line_number += 1
+            if not line.strip():
+                continue
+            row = next(csv.reader([line.decode('utf-8')]))
+            try:
+                raw_time = parse_trace_time(row[time_column])
+                source_id = self._source_names[row[source_column].strip().lower()]
+            except (ValueError, IndexError, KeyError) as error:
+                raise ValueError(f"{self.path}, строка {line_number}: неверная запись ({error})") from None
+            yield raw_time, source_id
+
+    def _binary_records(self) -> Iterator[Tuple[float, int]]:
+        data = self._map
+        offset = len(TRACE_MAGIC)
+        count = (len(data) - offset) // _RECORD_FORMAT.size
+        first = 0
+        if self.start is not None:
+            # Записи упорядочены: первая с временем >= start - бинарным поиском
+            low, high = 0, count
+            while low < high:
+                middle = (low + high) // 2
+                if _RECORD_FORMAT.unpack_from(data, offset + middle * _RECORD_FORMAT.size)[0] < self.start:
+                    low = middle + 1
+                else:
+                    high = middle
+            first = low
+        for index in range(first, count):
+            raw_time, source_id = _RECORD_FORMAT.unpack_from(data, offset + index * _RECORD_FORMAT.size)
+            if source_id not in self._valid_source_ids:
+                raise ValueError(f"{self.path}, запись {index + 1}: неизвестный источник {source_id}")
+            yield raw_time, source_id
+
+    def next_raw(self) -> Optional[Tuple[float, int]]:
+        """Следующая по времени запись журнала (время записи, источник) или None в конце"""
+        if self.closed:
+            return None
+        window = self._window
+        while len(window) < self.lookahead:
+            record = next(self._records, None)
+            if record is None:
+                break
+            heapq.heappush(window, (record[0], self._order, record[1]))
+            self._order += 1
+        if not window:
+            return None
+        raw_time, _, source_id = heapq.heappop(window)
+        if raw_time < self.last_raw_time:
+            raise ValueError(f"{self.path}: запись со временем {raw_time} идет после {self.last_raw_time} "
+                             f"дальше окна упорядочивания ({self.lookahead} записей)")
+        self.last_raw_time = raw_time
+        return raw_time, source_id
+
+    def next_arrival(self, current_time: float = 0.0) -> Optional[Tuple[float, int]]:
+        """Следующее прибытие не раньше current_time: (модельное время, источник) или None"""
+        while True:
+            record = self.next_raw()
+            if record is None:
+                return None
+            raw_time, source_id = record
+            if self.start is None:
+                self.start = raw_time
+            if raw_time < self.start:
+                continue
+            arrival_time = (raw_time - self.start) * self.scale
+            if arrival_time < current_time:
+                continue
+            self.emitted += 1
+            return arrival_time, source_id
+
+    def close(self) -> None:
+        """Закрывает файл журнала; повторный вызов ничего не делает"""
+        if self.closed:
+            return
+        self.closed = True
+        self._records.close()
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> 'ArrivalTrace':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __str__(self) -> str:
+        kind = 'двоичный' if self.binary else 'CSV'
+        return (f"ArrivalTrace({self.path}, {kind}, start={self.start}, scale={self.scale}, "
+                f"выдано={self.emitted})")
+
+
+def load_arrival_trace(scenario, lookahead: Optional[int] = None) -> ArrivalTrace:
+    """Открывает журнал прибытий сценария"""
+    return ArrivalTrace(scenario.arrival_trace_path, scenario, start=scenario.arrival_trace_start,
+                        scale=scenario.arrival_trace_scale, lookahead=lookahead)
+
+
+def convert_arrival_trace(csv_path: str, binary_path: str, scenario, lookahead: Optional[int] = None) -> int:
+    """Переводит CSV-журнал в двоичный (упорядоченный в пределах окна) потоком.
+    Возвращает число записей."""
+    count = 0
+    with ArrivalTrace(csv_path, scenario, lookahead=lookahead) as trace, open(binary_path, 'wb') as output:
+        output.write(TRACE_MAGIC)
+        chunk = []
+        while True:
+            record = trace.next_raw()
+            if record is not None:
+                chunk.append(_RECORD_FORMAT.pack(*record))
+                count += 1
+            if len(chunk) >= 4096 or (record is None and chunk):
+                output.write(b"".join(chunk))
+                chunk = []
+            if record is None:
+                return count
+
+
+if __name__ == '__main__':
+    import sys
+    from config.scenario import default_scenario, load_scenario
+
+    if len(sys.argv) < 3:
+        print("Запуск: python -m core.arrival_trace журнал.csv журнал.bin [сценарий.json]")
+        sys.exit(1)
+    trace_scenario = load_scenario(sys.argv[3]) if len(sys.argv) > 3 else default_scenario()
+    print(f"Записей: {convert_arrival_trace(sys.argv[1], sys.argv[2], trace_scenario)}")
@@ -0,0 +1,164 @@
+"""Ветвление "что если" от живого состояния симуляции.
+Каждая ветвь - дочерний процесс os.fork: он получает копию всего состояния
+(календарь, буфер, врачи, генератор случайных чисел) с копированием при записи,
+без сериализации, меняет параметры, прогоняется на заданный горизонт и
+возвращает отчет через канал (pickle небольшого словаря).
+По умолчанию ветви продолжают с состояния генератора случайных чисел родителя:
+ветвь без изменений в точности повторяет обычное продолжение, а ветви с изменениями
+начинают с тех же случайных чисел (общие случайные числа уменьшают разброс разностей)."""
+
+import os
+import pickle
+import random
+import sys
+from typing import Dict, List, Optional
+from entities.doctor import Doctor
+from utils.output import suppressed_output
+from config.settings import BRANCH_SETTINGS
+
+# Параметры ветви: имя -> описание
+BRANCH_CHANGES = {
+    'num_doctors': "число врачей (новые начинают работу сразу, лишние доканчивают прием и уходят)",
+    'buffer_capacity': "вместимость буфера",
+    'mean_service_time': "среднее время приема для следующих приемов",
+    'seed': "зерно генератора случайных чисел ветви (по умолчанию - состояние родителя)"
+}
+
+
+def apply_branch_changes(core, changes: Dict) -> None:
+    """Применяет изменения параметров к ядру (в процессе ветви)"""
+    unknown = set(changes) - set(BRANCH_CHANGES) - {'name'}
+    if unknown:
+        raise ValueError(f"Неизвестные параметры ветви: {', '.join(sorted(unknown))}")
+
+    if 'seed' in changes:
+        random.seed(changes['seed'])
+
+    mean_service_time = changes.get('mean_service_time')
+    if mean_service_time is not None:
+        if mean_service_time <= 0:
+            raise ValueError("Среднее время приема должно быть положительным")
+        for doctor in core.doctors_by_id.values():
+            doctor.configure_service_time(mean_service_time, core.scenario)
+
+    num_doctors = changes.get('num_doctors')
+    if num_doctors is not None:
+        if num_doctors <= 0:
+            raise ValueError("Количество врачей должно быть положительным")
+        doctors = core.doctors  # Тот же список, что у диспетчера
+        while len(doctors) < num_doctors:
+            doctor_id = max(core.doctors_by_id) + 1
+            mean = mean_service_time if mean_service_time is not None else doctors[0].mean_service_time
+            doctor = Doctor(doctor_id=doctor_id, mean_service_time=mean, scenario=core.scenario)
+            doctors.append(doctor)
+            core.doctors_by_id[doctor_id] = doctor
+            core.statistics.initialize_doctor_stats(doctor_id)
+        # Ушедшие врачи больше не выбираются, но остаются в doctors_by_id до окончания приема
+        del doctors[num_doctors:]
+        core.dispatcher.next_doctor_index %= len(doctors)
+
+    buffer_capacity = changes.get('buffer_capacity')
+    if buffer_capacity is not None:
+        if buffer_capacity <= 0:
+            raise ValueError("Вместимость буфера должна быть положительной")
+        core.waiting_room.capacity = buffer_capacity
+
+    # Новые врачи сразу принимают ожидающих пациентов
+    core.dispatcher.dispatch(core.current_time)
+
+
+def _run_branch(core, changes: Dict, horizon: float) -> Dict:
+    """Тело ветви: изменения, статистика с нуля, безэкранный прогон, отчет"""
+    start_time = core.current_time
+    with suppressed_output():
+        # Ветвь считает только свое будущее; наблюдатели родителя ей не нужны
+        core.observers = []
+        core.statistics.listeners = []
+        core.statistics.reset_statistics()
+        for doctor in core.doctors:
+            core.statistics.initialize_doctor_stats(doctor.id)
+
+        apply_branch_changes(core, changes)
+        core.run_until(start_time + horizon)
+
+    statistics = core.statistics
+    return {
+        'name': changes.get('name', ''),
+        'changes': {key: value for key, value in changes.items() if key != 'name'},
+        'start_time': start_time,
+        'horizon': horizon,
+        'summary': statistics.get_summary(),
+        'detailed_report': statistics.generate_detailed_report(horizon, len(core.doctors)),
+        'buffer_size': core.waiting_room.size
+    }
+
+
+def fork_branches(core, branches: List[Dict], horizon: Optional[float] = None,
+                  workers: Optional[int] = None) -> List[Dict]:
+    """Прогоняет ветви от текущего состояния core параллельно в дочерних процессах.
+    branches - словари изменений (BRANCH_CHANGES, плюс необязательное 'name');
+    пустой словарь - продолжение без изменений. Состояние core не меняется.
+    Возвращает отчеты в порядке ветвей (с ключом 'error', если ветвь завершилась ошибкой)."""
+    if not hasattr(os, 'fork'):
+        raise RuntimeError("Ветвление требует os.fork (POSIX)")
+    horizon = horizon if horizon is not None else BRANCH_SETTINGS['default_horizon']
+    if horizon <= 0:
+        raise ValueError("Горизонт ветви должен быть положительным")
+    workers = max(1, workers or BRANCH_SETTINGS['workers'] or os.cpu_count() or 1)
+
+    # Модуль random пересевает генератор в дочернем процессе, поэтому состояние переносится явно
+    random_state = random.getstate()
+    results: List[Optional[Dict]] = [None] * len(branches)
+    for wave in range(0, len(branches), workers):
+        running = []
+        for index in range(wave, min(wave + workers, len(branches))):
+            sys.stdout.flush()
+            read_end, write_end = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                # Дочерний процесс: никаких обработчиков завершения родителя, выход через os._exit
+                os.close(read_end)
+                random.setstate(random_state)
+                try:
+                    result = _run_branch(core, branches[index], horizon)
+                except BaseException as error:
+                    result = {'name': branches[index].get('name', ''), 'error': f"{type(error).__name__}: {error}"}
+                try:
+                    with os.fdopen(write_end, 'wb') as output:
+                        output.write(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+                finally:
+                    os._exit(0)
+            os.close(write_end)
+            running.append((index, pid, read_end))
+
+        for index, pid, read_end in running:
+            with os.fdopen(read_end, 'rb') as source:
+                payload = source.read()
+            os.waitpid(pid, 0)
+            results[index] = (pickle.loads(payload) if payload else
+                              {'name': branches[index].get('name', ''), 'error': "ветвь завершилась без отчета"})
+    return results
+
+
+def format_branch_comparison(results: List[Dict]) -> str:
+    """Таблица сравнения ветвей"""
+    width = 22 + 16 * len(results)
+    lines = [f"{'Показатель':<22}" + "".join(f"{result.get('name') or f'Ветвь {i + 1}':<16}"
+                                             for i, result in enumerate(results)),
+             '-' * width]
+    rows = (('Прибыло', 'total_arrived', 'd'), ('Обслужено', 'total_served', 'd'),
+            ('Отказов', 'total_rejected', 'd'), ('% отказов', 'rejection_rate', '.2f'),
+            ('Ожидание, мин', 'avg_wait_time', '.2f'))
+    for title, key, form in rows:
+        cells = []
+        for result in results:
+            cells.append('ошибка' if 'error' in result else format(result['summary'][key], form))
+        lines.append(f"{title:<22}" + "".join(f"{cell:<16}" for cell in cells))
+    cells = ['ошибка' if 'error' in result else
+             f"{result['detailed_report']['system_characteristics']['system_utilization']:.1f}"
+             for result in results]
+    lines.append(f"{'Загрузка врачей, %':<22}" + "".join(f"{cell:<16}" for cell in cells))
+    for result in results:
+        if 'error' in result:
+            lines.append(f"{result.get('name') or 'Ветвь'}: {result['error']}")
+    return "\n".join(lines)
@@ -0,0 +1,97 @@
+"""Условные точки останова пошагового режима.
+Точка проверяется перед каждым пропускаемым шагом (по состоянию после предыдущего шага
+и событиям следующего) и останавливает перемотку, после чего состояние отображается."""
+
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+
+class Breakpoint(ABC):
+    """Точка останова: triggered() возвращает True, если перемотку нужно остановить"""
+
+    def reset(self, core) -> None:
+        """Запоминает текущее состояние перед началом перемотки"""
+        pass
+
+    @abstractmethod
+    def triggered(self, core, events: List) -> bool:
+        """Нужно ли остановить перемотку перед шагом с событиями events"""
+
+    @abstractmethod
+    def __str__(self) -> str:
+        """Описание точки для списка 'b'"""
+
+
+class BufferFullBreakpoint(Breakpoint):
+    """Буфер заполнился (срабатывает при переходе в состояние 'полон')"""
+
+    def __init__(self):
+        self.was_full = False
+
+    def reset(self, core) -> None:
+        self.was_full = core.waiting_room.is_full()
+
+    def triggered(self, core, events: List) -> bool:
+        full = core.waiting_room.is_full()
+        became_full = full and not self.was_full
+        self.was_full = full
+        return became_full
+
+    def __str__(self) -> str:
+        return "буфер полон"
+
+
+class RejectionBreakpoint(Breakpoint):
+    """Отказ (Д1О4) пациенту данного источника"""
+
+    def __init__(self, source_id: int, description: str):
+        self.source_id = source_id
+        self.description = description
+        self.last_rejected = 0
+
+    def reset(self, core) -> None:
+        self.last_rejected = core.statistics.rejected_by_source[self.source_id]
+
+    def triggered(self, core, events: List) -> bool:
+        rejected = core.statistics.rejected_by_source[self.source_id]
+        if rejected > self.last_rejected:
+            self.last_rejected = rejected
+            return True
+        return False
+
+    def __str__(self) -> str:
+        return f"отказ: {self.description}"
+
+
+class PatientBreakpoint(Breakpoint):
+    """Следующий шаг содержит событие данного пациента (прибытие, окончание приема, уход)"""
+
+    def __init__(self, patient_id: int):
+        self.patient_id = patient_id
+
+    def triggered(self, core, events: List) -> bool:
+        return any(event.patient_id == self.patient_id for event in events)
+
+    def __str__(self) -> str:
+        return f"пациент {self.patient_id}"
+
+
+def parse_breakpoint(text: str, scenario) -> Optional[Breakpoint]:
+    """Разбирает описание точки останова: 'full', 'reject <приоритет>', 'patient <номер>'.
+    Приоритет задается именем (EMERGENCY) или описанием источника без учета регистра.
+    Возвращает None, если описание не распознано."""
+    words = text.split()
+    if not words:
+        return None
+    kind = words[0].lower()
+    if kind == 'full' and len(words) == 1:
+        return BufferFullBreakpoint()
+    if kind == 'reject' and len(words) >= 2:
+        name = " ".join(words[1:]).lower()
+        for source in scenario.sources:
+            if name in (source.key.lower(), source.description.lower(), source.display_name.lower()):
+                return RejectionBreakpoint(source.source_id, source.description)
+        return None
+    if kind == 'patient' and len(words) == 2 and words[1].isdigit():
+        return PatientBreakpoint(int(words[1]))
+    return None
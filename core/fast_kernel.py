@@ -0,0 +1,286 @@
+"""Компактное ядро для пакетных прогонов: та же модель, что и у SimulationCore
+(Д1О32, Д1О4, Д2Б4, Д2П2, законы обслуживания сценария, уход из очереди), но в одной функции
+на локальных переменных и плоских списках, без объектов пациентов, врачей и событий
+и без вывода. Результат - обычный объект Statistics."""
+
+import heapq
+import math
+import random
+from typing import Optional
+from services.statistics import Statistics
+from services.service_time import make_service_time_law
+from utils.alias_table import AliasTable
+from core.arrival_profile import load_arrival_profile
+from core.arrival_trace import load_arrival_trace
+from config.scenario import Scenario, default_scenario
+
+
+def run_fast(horizon: float,
+             num_doctors: Optional[int] = None,
+             buffer_capacity: Optional[int] = None,
+             mean_service_time: Optional[float] = None,
+             scenario: Optional[Scenario] = None,
+             seed: Optional[int] = None) -> Statistics:
+    """Прогон до модельного времени horizon (как SimulationCore.run_until).
+    Использует общий генератор random; seed, если задан, сбрасывает его."""
+    scenario = scenario or default_scenario()
+    num_doctors = num_doctors if num_doctors is not None else scenario.num_doctors
+    capacity = buffer_capacity if buffer_capacity is not None else scenario.buffer_capacity
+    mean = mean_service_time if mean_service_time is not None else scenario.mean_service_time
+    min_service = scenario.min_service_time
+    if seed is not None:
+        random.seed(seed)
+
+    rand = random.random
+    log = math.log
+    heappush = heapq.heappush
+    heappop = heapq.heappop
+
+    # Источники: (min_interval, ширина интервала, номер источника), выбор - по alias-таблице
+    sources = [(source.min_interval, source.max_interval - source.min_interval, source.source_id)
+               for source in scenario.sources]
+    table = AliasTable([source.probability for source in scenario.sources])
+    alias_probability = table.probability
+    alias = table.alias
+    source_count = len(sources)
+    profile = None
+    if scenario.arrival_profile_path:
+        profile = load_arrival_profile(scenario.arrival_profile_path, period=scenario.arrival_profile_period)
+    trace = load_arrival_trace(scenario) if scenario.arrival_trace_path else None
+
+    # Счетчики по номеру источника; rank - значение приоритета источника (Д2Б4)
+    levels = max(scenario.source_ids) + 1
+    rank = [0] * levels
+    for source in scenario.sources:
+        rank[source.source_id] = source.priority.value
+    generated = [0] * levels
+    arrived = [0] * levels
+    served = [0] * levels
+    rejected = [0] * levels
+    abandoned = [0] * levels
+    balked = [0] * levels
+    total_wait = 0.0
+    total_service = 0.0
+
+    # Ожидания и длительности сразу записываются в накопители статистики (связанные методы по source_id)
+    statistics = Statistics(scenario)
+    record_wait = [None] * levels
+    record_wait_histogram = [None] * levels
+    record_service = [None] * levels
+    record_service_histogram = [None] * levels
+    record_sojourn = [None] * levels
+    for source_id in scenario.source_ids:
+        record_wait[source_id] = statistics.wait_moments[source_id].record
+        record_wait_histogram[source_id] = statistics.wait_histograms[source_id].record
+        record_service[source_id] = statistics.service_moments[source_id].record
+        record_service_histogram[source_id] = statistics.service_histograms[source_id].record
+        record_sojourn[source_id] = statistics.sojourn_histograms[source_id].record
+
+    # Буфер: параллельные списки времени прибытия, источника и момента ухода из очереди
+    buffer_arrival = []
+    buffer_source = []
+    buffer_deadline = []
+    infinity = float('inf')
+
+    # Терпение: законы и пороги отказа по source_id (без терпения - ни розыгрышей, ни поиска ухода)
+    patience_samplers = None
+    balk_thresholds = None
+    if scenario.has_patience:
+        patience_samplers = [law.sample if law is not None else None for law in scenario.build_patience_laws()]
+        balk_thresholds = scenario.build_balk_thresholds()
+
+    # Законы обслуживания, отличные от экспоненциального: samplers[врач][source_id]
+    samplers = None
+    if scenario.has_custom_service_time:
+        samplers = []
+        for doctor in range(num_doctors):
+            doctor_law = make_service_time_law(scenario.get_service_time_spec(doctor_id=doctor + 1), mean)
+            row = [doctor_law.sample] * levels
+            for source in scenario.sources:
+                if any(key == source.key for key, _ in scenario.service_time_by_priority):
+                    row[source.source_id] = make_service_time_law(
+                        scenario.get_service_time_spec(priority=source.priority), mean).sample
+            samplers.append(row)
+
+    # Врачи
+    busy = [False] * num_doctors
+    service_start = [0.0] * num_doctors
+    patient_arrival = [0.0] * num_doctors
+    patient_source = [0] * num_doctors
+    doctor_served = [0] * num_doctors
+    doctor_service = [0.0] * num_doctors
+    next_doctor = 0
+
+    # Календарь: окончания приема (время, номер события, врач) и одно ожидаемое прибытие
+    ends = []
+    sequence = 0
+    arrival_time = 0.0
+    arrival_source = 0
+    arrival_sequence = 0
+    need_arrival = True
+    time = 0.0
+
+    while True:
+        if need_arrival:
+            # Генерация следующего прибытия (журнал, профиль по времени суток или И32)
+            if trace is not None:
+                record = trace.next_arrival(time)
+                if record is None:
+                    # Журнал закончился: прибытий больше нет
+                    arrival_time = infinity
+                    need_arrival = False
+                    continue
+                arrival_time, arrival_source = record
+            elif profile is not None:
+                arrival_time, arrival_source = profile.sample_next(time)
+            else:
+                u = rand() * source_count
+                index = int(u)
+                if u - index >= alias_probability[index]:
+                    index = alias[index]
+                low, width, arrival_source = sources[index]
+                arrival_time = time + low + width * rand()
+            generated[arrival_source] += 1
+            arrival_sequence = sequence
+            sequence += 1
+            need_arrival = False
+
+        if patience_samplers is not None and buffer_deadline:
+            # Ближайший уход из очереди - минимум по буферу
+            deadline = min(buffer_deadline)
+            if deadline < arrival_time and (not ends or deadline < ends[0][0]):
+                if deadline >= horizon:
+                    break
+                time = deadline
+                index = buffer_deadline.index(deadline)
+                buffer_arrival.pop(index)
+                abandoned[buffer_source.pop(index)] += 1
+                buffer_deadline.pop(index)
+                continue
+
+        if ends and (ends[0][0] < arrival_time or (ends[0][0] == arrival_time and ends[0][1] < arrival_sequence)):
+            # Окончание обслуживания
+            if ends[0][0] >= horizon:
+                break
+            time, _, doctor = heappop(ends)
+            busy[doctor] = False
+            source = patient_source[doctor]
+            duration = time - service_start[doctor]
+            served[source] += 1
+            total_service += duration
+            record_service[source](duration)
+            record_service_histogram[source](duration)
+            record_sojourn[source](time - patient_arrival[doctor])
+            doctor_served[doctor] += 1
+            doctor_service[doctor] += duration
+        else:
+            # Прибытие пациента
+            if arrival_time >= horizon:
+                break
+            time = arrival_time
+            source = arrival_source
+            arrived[source] += 1
+            deadline = infinity
+            if patience_samplers is not None:
+                # Терпение разыгрывается при каждом прибытии, как в SimulationCore
+                sampler = patience_samplers[source]
+                if sampler is not None:
+                    deadline = time + sampler()
+                threshold = balk_thresholds[source]
+                if threshold is not None and len(buffer_arrival) >= threshold:
+                    balked[source] += 1
+                    need_arrival = True
+                    continue
+            if len(buffer_arrival) >= capacity:
+                # Д1О4: вытесняется самый свежий пациент буфера
+                latest = 0
+                latest_time = -1.0
+                for i in range(len(buffer_arrival)):
+                    if buffer_arrival[i] > latest_time:
+                        latest_time = buffer_arrival[i]
+                        latest = i
+                rejected[buffer_source[latest]] += 1
+                buffer_arrival[latest] = time
+                buffer_source[latest] = source
+                buffer_deadline[latest] = deadline
+            else:
+                buffer_arrival.append(time)
+                buffer_source.append(source)
+                buffer_deadline.append(deadline)
+            need_arrival = True
+
+        # Проход диспетчера: врачи и пациенты сопоставляются, пока не кончится одна из сторон
+        while True:
+            # Д2П2: свободный врач по кольцу (указатель сдвигается, даже если буфер пуст)
+            doctor = -1
+            for i in range(num_doctors):
+                candidate = (next_doctor + i) % num_doctors
+                if not busy[candidate]:
+                    doctor = candidate
+                    next_doctor = (candidate + 1) % num_doctors
+                    break
+            if doctor < 0 or not buffer_arrival:
+                break
+
+            # Д2Б4: высший приоритет, при равенстве - раньше прибывший
+            selected = 0
+            best = rank[buffer_source[0]]
+            for i in range(1, len(buffer_arrival)):
+                level = rank[buffer_source[i]]
+                if level < best or (level == best and buffer_arrival[i] < buffer_arrival[selected]):
+                    selected = i
+                    best = level
+            arrival = buffer_arrival.pop(selected)
+            source = buffer_source.pop(selected)
+            buffer_deadline.pop(selected)
+
+            # Начало обслуживания: экспоненциальное время приема или закон сценария
+            if samplers is None:
+                u = rand()
+                if u < 0.000001:
+                    u = 0.000001
+                elif u > 0.999999:
+                    u = 0.999999
+                duration = -mean * log(1 - u)
+            else:
+                duration = samplers[doctor][source]()
+            if duration < min_service:
+                duration = min_service
+            wait = time - arrival
+            total_wait += wait
+            record_wait[source](wait)
+            record_wait_histogram[source](wait)
+            busy[doctor] = True
+            service_start[doctor] = time
+            patient_arrival[doctor] = arrival
+            patient_source[doctor] = source
+            heappush(ends, (time + duration, sequence, doctor))
+            sequence += 1
+            if not buffer_arrival:
+                break
+
+    if trace is not None:
+        trace.close()
+
+    # Перенос счетчиков в Statistics
+    statistics.total_patients_arrived = sum(arrived)
+    statistics.total_patients_served = sum(served)
+    statistics.total_patients_rejected = sum(rejected)
+    statistics.total_patients_abandoned = sum(abandoned)
+    statistics.total_patients_balked = sum(balked)
+    statistics.total_wait_time = total_wait
+    statistics.total_service_time = total_service
+    statistics.generated_by_source = generated
+    statistics.arrived_by_source = arrived
+    statistics.served_by_source = served
+    statistics.rejected_by_source = rejected
+    statistics.abandoned_by_source = abandoned
+    statistics.balked_by_source = balked
+    for doctor in range(num_doctors):
+        statistics.initialize_doctor_stats(doctor + 1)
+        doctor_stats = statistics.doctors_stats[doctor + 1]
+        doctor_stats['served_count'] = doctor_served[doctor]
+        doctor_stats['total_service_time'] = doctor_service[doctor]
+        doctor_stats['busy_time'] = doctor_service[doctor]
+    statistics.mark_changed()
+    return statistics
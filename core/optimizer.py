@@ -0,0 +1,363 @@
+import math
+import random
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from entities.priority import Priority
+from core.fast_kernel import run_fast
+from config.scenario import Scenario, default_scenario
+from config.settings import OPTIMIZER_SETTINGS
+
+
+def _normal_cdf(x: float) -> float:
+    return 0.5 * (1.0 + math.erf(x / math.sqrt(2.0)))
+
+
+def _incomplete_beta(x: float, a: float, b: float) -> float:
+    """Регуляризованная неполная бета-функция I_x(a, b) (цепная дробь Лентца)"""
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    if x > (a + 1.0) / (a + b + 2.0):
+        return 1.0 - _incomplete_beta(1.0 - x, b, a)
+    log_front = (math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) +
+                 a * math.log(x) + b * math.log(1.0 - x))
+    tiny = 1e-300
+    c, d = 1.0, 1.0 - (a + b) * x / (a + 1.0)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    fraction = d
+    for m in range(1, 300):
+        for numerator in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                          -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+            d = 1.0 + numerator * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            fraction *= c * d
+        if abs(c * d - 1.0) < 1e-12:
+            break
+    return math.exp(log_front) * fraction / a
+
+
+def _student_t_cdf(t: float, df: int) -> float:
+    """Функция распределения Стьюдента с df степенями свободы"""
+    if math.isinf(t):
+        return 1.0 if t > 0 else 0.0
+    tail = 0.5 * _incomplete_beta(df / (df + t * t), df / 2.0, 0.5)
+    return 1.0 - tail if t > 0 else tail
+
+
+def _student_t_quantile(p: float, df: int) -> float:
+    """Квантиль распределения Стьюдента уровня p (бисекция по функции распределения)"""
+    low, high = -1.0, 1.0
+    while _student_t_cdf(low, df) > p:
+        low *= 2.0
+    while _student_t_cdf(high, df) < p:
+        high *= 2.0
+    for _ in range(100):
+        middle = 0.5 * (low + high)
+        if _student_t_cdf(middle, df) < p:
+            low = middle
+        else:
+            high = middle
+    return 0.5 * (low + high)
+
+
+def _wilson_std(events: int, trials: int, z: float) -> float:
+    """Стандартное отклонение оценки доли по Уилсону: (events + z^2/2) / (trials + z^2)
+    вместо events / trials, поэтому при 0 или trials событиях оно не обращается в ноль"""
+    adjusted = trials + z * z
+    proportion = (events + z * z / 2.0) / adjusted
+    return math.sqrt(proportion * (1.0 - proportion) / adjusted)
+
+
+def run_replication(task) -> Dict:
+    """Одна репликация конфигурации (выполняется в рабочем процессе) на компактном ядре.
+    Возвращает детальный отчет статистики."""
+    params, horizon, seed, scenario = task
+    statistics = run_fast(horizon, scenario=scenario, seed=seed, **params)
+    return statistics.generate_detailed_report(horizon, params['num_doctors'])
+
+
+@dataclass
+class Candidate:
+    """Конфигурация штата и накопленные по ней репликации"""
+    num_doctors: int
+    buffer_capacity: int
+    emergency_reject_rates: List[float] = field(default_factory=list)  # % отказов неотложным
+    walkin_wait_times: List[float] = field(default_factory=list)  # Среднее ожидание без записи, мин
+    # Для нижней границы разброса: счетчики неотложных и обслуженных без записи,
+    # стандартная ошибка среднего ожидания внутри репликации
+    emergency_arrived: int = 0
+    emergency_rejected: int = 0
+    walkin_served: int = 0
+    walkin_wait_errors: List[float] = field(default_factory=list)
+
+    @property
+    def cost(self) -> Tuple[int, int]:
+        """Стоимость: сначала число врачей, затем мест в буфере"""
+        return self.num_doctors, self.buffer_capacity
+
+    @property
+    def replications(self) -> int:
+        return len(self.emergency_reject_rates)
+
+    def samples(self) -> Tuple[List[float], List[float]]:
+        return self.emergency_reject_rates, self.walkin_wait_times
+
+
+class StaffingOptimizer:
+    """Подбор минимального штата (сначала врачей, затем мест в буфере), при котором
+    доля отказов неотложным не выше max_emergency_reject (%) и среднее ожидание
+    пациентов без записи не выше max_walkin_wait (мин).
+
+    Конфигурации просматриваются по возрастанию стоимости, более дорогие, чем лучшая
+    предположительно допустимая, не моделируются вовсе. Дополнительные репликации
+    распределяются в духе OCBA для задачи допустимости: только конфигурациям, чья
+    допустимость еще не установлена с нужной достоверностью, пропорционально
+    (s / (порог - среднее))^2 по определяющему ограничению - то есть тем, что
+    статистически близки к границе. Явно недопустимые отсеиваются после первых репликаций.
+    Все конфигурации используют общие случайные числа (k-я репликация - одно зерно)."""
+
+    def __init__(self, max_emergency_reject: float, max_walkin_wait: float,
+                 mean_service_time: Optional[float] = None,
+                 max_doctors: Optional[int] = None,
+                 max_buffer: Optional[int] = None,
+                 horizon: Optional[float] = None,
+                 initial_replications: Optional[int] = None,
+                 replications_per_round: Optional[int] = None,
+                 max_replications: Optional[int] = None,
+                 workers: Optional[int] = None,
+                 seed: Optional[int] = None,
+                 scenario: Optional[Scenario] = None,
+                 store=None):
+        settings = OPTIMIZER_SETTINGS
+        self.scenario = scenario or default_scenario()
+        self.thresholds = (max_emergency_reject, max_walkin_wait)
+        self.mean_service_time = (mean_service_time if mean_service_time is not None
+                                  else self.scenario.mean_service_time)
+        self.horizon = horizon or settings['horizon']
+        self.initial_replications = max(2, initial_replications or settings['initial_replications'])
+        self.replications_per_round = replications_per_round or settings['replications_per_round']
+        self.max_replications = max_replications or settings['max_replications']
+        self.workers = workers or 1
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.store = store  # ResultsStore для сохранения всех репликаций (необязательно)
+
+        # Порог уверенности в классификации: односторонний уровень из сценария
+        self.alpha = 1.0 - _normal_cdf(self.scenario.confidence_t_alpha)
+
+        self.candidates = [Candidate(d, b)
+                           for d in range(1, (max_doctors or settings['max_doctors']) + 1)
+                           for b in range(1, (max_buffer or settings['max_buffer']) + 1)]
+        self.candidates.sort(key=lambda candidate: candidate.cost)
+        self.total_replications = 0
+        self.rounds = 0
+        self._executor = None
+
+    def _simulate(self, allocation: List[Tuple[Candidate, int]]) -> None:
+        """Выполняет заданное число новых репликаций для каждой конфигурации"""
+        tasks, owners = [], []
+        for candidate, count in allocation:
+            params = {'num_doctors': candidate.num_doctors,
+                      'buffer_capacity': candidate.buffer_capacity,
+                      'mean_service_time': self.mean_service_time}
+            start = candidate.replications
+            for k in range(start, start + count):
+                tasks.append((params, self.horizon, self.seed + k, self.scenario))
+                owners.append((candidate, k))
+
+        mapper = self._executor.map if self._executor is not None else map
+        for (candidate, k), report in zip(owners, mapper(run_replication, tasks)):
+            self._record(candidate, report, k)
+        self.total_replications += len(tasks)
+
+    def _record(self, candidate: Candidate, report: Dict, replication: int) -> None:
+        emergency, walkin, walkin_error = 0.0, 0.0, 0.0
+        for source in report['sources_characteristics']:
+            if source['key'] == Priority.EMERGENCY.name:
+                emergency = source['p_reject_percent']
+                candidate.emergency_arrived += source['total_arrived']
+                candidate.emergency_rejected += source['total_rejected']
+            elif source['key'] == Priority.WITHOUT_APPOINTMENT.name:
+                walkin = source['avg_wait_time']
+                served = source['total_served']
+                candidate.walkin_served += served
+                walkin_error = source['std_wait'] / math.sqrt(served) if served else 0.0
+        candidate.emergency_reject_rates.append(emergency)
+        candidate.walkin_wait_times.append(walkin)
+        candidate.walkin_wait_errors.append(walkin_error)
+
+        if self.store is not None:
+            self.store.add_report(report, num_doctors=candidate.num_doctors,
+                                  buffer_capacity=candidate.buffer_capacity,
+                                  mean_service_time=self.mean_service_time,
+                                  scenario=self.scenario.name, seed=self.seed + replication,
+                                  replication=replication, label='staffing')
+
+    def _std_floors(self, candidate: Candidate) -> Tuple[float, float]:
+        """Нижние границы разброса репликаций по ограничениям. Одинаковые значения во всех
+        репликациях (например, ни одного отказа) не означают нулевой дисперсии: для доли
+        отказов берется граница Уилсона по суммарным счетчикам, для ожидания - стандартная
+        ошибка внутри репликаций, а если никто не ждал - граница Уилсона для доли ожидавших,
+        умноженная на среднее время приема."""
+        n = candidate.replications
+        z = self.scenario.confidence_t_alpha
+        # Разброс доли по репликациям в sqrt(n) раз больше, чем у доли по всем сразу
+        reject_floor = 100.0 * math.sqrt(n) * _wilson_std(candidate.emergency_rejected,
+                                                          candidate.emergency_arrived, z)
+        errors = candidate.walkin_wait_errors
+        wait_floor = math.sqrt(sum(error * error for error in errors) / n)
+        if wait_floor == 0.0:
+            wait_floor = self.mean_service_time * math.sqrt(n) * _wilson_std(0, candidate.walkin_served, z)
+        return reject_floor, wait_floor
+
+    def _z_scores(self, candidate: Candidate) -> List[Tuple[float, float, float]]:
+        """(t, среднее, стандартное отклонение) по каждому ограничению; t > 0 - на допустимой стороне.
+        Стандартное отклонение не меньше нижней границы _std_floors, поэтому t всегда конечно."""
+        result = []
+        n = candidate.replications
+        for values, threshold, floor in zip(candidate.samples(), self.thresholds, self._std_floors(candidate)):
+            mean = sum(values) / n
+            variance = sum((x - mean) ** 2 for x in values) / (n - 1) if n > 1 else 0.0
+            std = max(math.sqrt(variance), floor)
+            t = (threshold - mean) / (std / math.sqrt(n))
+            result.append((t, mean, std))
+        return result
+
+    def _feasibility(self, candidate: Candidate) -> float:
+        """Приближенная вероятность допустимости конфигурации (распределение Стьюдента, n - 1 степеней свободы)"""
+        probability = 1.0
+        df = max(candidate.replications - 1, 1)
+        for t, _, _ in self._z_scores(candidate):
+            probability *= _student_t_cdf(t, df)
+        return probability
+
+    def _is_resolved(self, candidate: Candidate) -> bool:
+        probability = self._feasibility(candidate)
+        return probability >= 1.0 - self.alpha or probability <= self.alpha
+
+    def _ocba_weight(self, candidate: Candidate) -> float:
+        """Вес OCBA по определяющему ограничению: (s / |порог - среднее|)^2.
+        Определяющее - с наименьшим z: для предположительно допустимой это самое близкое
+        к границе ограничение, для недопустимой - самое сильное нарушение."""
+        scores = self._z_scores(candidate)
+        index = min(range(len(scores)), key=lambda i: scores[i][0])
+        _, mean, std = scores[index]
+        gap = max(abs(self.thresholds[index] - mean), 1e-9 * (1.0 + abs(self.thresholds[index])))
+        return (std / gap) ** 2
+
+    def _best(self) -> Optional[Candidate]:
+        """Самая дешевая конфигурация, допустимая по выборочным средним"""
+        for candidate in self.candidates:
+            if candidate.replications and all(z > 0 for z, _, _ in self._z_scores(candidate)):
+                return candidate
+        return None
+
+    def _next_unseen(self, best: Optional[Candidate]) -> Optional[Candidate]:
+        for candidate in self.candidates:
+            if best is not None and candidate.cost >= best.cost:
+                return None
+            if not candidate.replications:
+                return candidate
+        return None
+
+    def _allocate(self, candidates: List[Candidate]) -> List[Tuple[Candidate, int]]:
+        """Делит раунд репликаций между неразрешенными конфигурациями по весам OCBA"""
+        budget = min(self.replications_per_round, self.max_replications - self.total_replications)
+        weights = [self._ocba_weight(candidate) for candidate in candidates]
+        total = sum(weights)
+        allocation = []
+        for candidate, weight in zip(candidates, weights):
+            count = int(budget * weight / total)
+            if count:
+                allocation.append((candidate, count))
+        if not allocation:
+            # Весь раунд - самой неопределенной конфигурации
+            allocation.append((candidates[weights.index(max(weights))], max(1, budget)))
+        return allocation
+
+    def run(self) -> Dict:
+        """Выполняет подбор и возвращает рекомендуемую конфигурацию с достоверностью"""
+        if self.workers > 1:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            best = self._search()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+            if self.store is not None:
+                self.store.flush()
+        return self._result(best)
+
+    def _search(self) -> Optional[Candidate]:
+        while self.total_replications < self.max_replications:
+            best = self._best()
+
+            # Пока нет предположительно допустимой - смотрим следующую по стоимости
+            unseen = self._next_unseen(best)
+            if unseen is not None:
+                self._simulate([(unseen, self.initial_replications)])
+                continue
+
+            # Значимы лишь конфигурации не дороже лучшей: остальные не могут стать ответом
+            relevant = [candidate for candidate in self.candidates
+                        if candidate.replications and (best is None or candidate.cost <= best.cost)]
+            unresolved = [candidate for candidate in relevant if not self._is_resolved(candidate)]
+            if not unresolved:
+                return best
+
+            self._simulate(self._allocate(unresolved))
+            self.rounds += 1
+
+        return self._best()
+
+    def _result(self, best: Optional[Candidate]) -> Dict:
+        # Достоверность ответа: лучшая допустима, а все более дешевые - нет
+        confidence = 0.0
+        if best is not None:
+            confidence = self._feasibility(best)
+            for candidate in self.candidates:
+                if candidate.cost >= best.cost:
+                    break
+                confidence *= 1.0 - self._feasibility(candidate)
+
+        candidates = []
+        for candidate in self.candidates:
+            if not candidate.replications:
+                continue
+            scores = self._z_scores(candidate)
+            candidates.append({
+                'num_doctors': candidate.num_doctors,
+                'buffer_capacity': candidate.buffer_capacity,
+                'replications': candidate.replications,
+                'emergency_reject_rate': scores[0][1],
+                'walkin_wait_time': scores[1][1],
+                'feasibility': self._feasibility(candidate)
+            })
+
+        recommended = None
+        if best is not None:
+            scores = self._z_scores(best)
+            n = best.replications
+            t_alpha = _student_t_quantile(1.0 - self.alpha, max(n - 1, 1))
+            recommended = {
+                'num_doctors': best.num_doctors,
+                'buffer_capacity': best.buffer_capacity,
+                'replications': n,
+                'emergency_reject_rate': scores[0][1],
+                'emergency_reject_half_width': t_alpha * scores[0][2] / math.sqrt(n),
+                'walkin_wait_time': scores[1][1],
+                'walkin_wait_half_width': t_alpha * scores[1][2] / math.sqrt(n)
+            }
+
+        return {
+            'recommended': recommended,
+            'confidence': confidence,
+            'total_replications': self.total_replications,
+            'grid_size': len(self.candidates),
+            'rounds': self.rounds,
+            'candidates': candidates
+        }
@@ -1,9 +1,11 @@
 import random
-from typing import Dict, Optional
+from typing import Dict, Iterator, Optional, Tuple
+from utils.alias_table import AliasTable
 from utils.name_generator import NameGenerator
 from entities.priority import Priority
-from events.patient_arrival_event import PatientArrivalEvent
-from config.settings import PATIENT_GENERATION_SETTINGS, SOURCE_ID_MAPPING
+from core.arrival_profile import ArrivalProfile, load_arrival_profile
+from core.arrival_trace import ArrivalTrace, load_arrival_trace
+from config.scenario import SourceSpec
 
 
 class PatientGenerator:
@@ -13,35 +15,79 @@ class PatientGenerator:
     def __init__(self, simulation_core):
         self.simulation_core = simulation_core
         self.next_patient_id = 1
-
-        # Используем настройки из конфигурации
-        self.arrival_settings = {
-            Priority.EMERGENCY: PATIENT_GENERATION_SETTINGS['EMERGENCY'],
-            Priority.BY_APPOINTMENT: PATIENT_GENERATION_SETTINGS['BY_APPOINTMENT'],
-            Priority.WITHOUT_APPOINTMENT: PATIENT_GENERATION_SETTINGS['WITHOUT_APPOINTMENT']
-        }
+        self.started = False
+        # Если задан, прибытия берутся из заранее разыгранных меток (core/time_parallel.py),
+        # а не разыгрываются по ходу прогона; исчерпание итератора - конец потока
+        self.arrival_marks: Optional[Iterator] = None
+
+        # Источники сценария и alias-таблица их вероятностей (выбор источника за O(1))
+        self.scenario = simulation_core.scenario
+        self.sources = self.scenario.sources
+        self.source_table = AliasTable([source.probability for source in self.sources])
+
+        # Профиль интенсивности по времени суток (если задан в сценарии)
+        self.arrival_profile: Optional[ArrivalProfile] = None
+        if self.scenario.arrival_profile_path:
+            self.arrival_profile = load_arrival_profile(self.scenario.arrival_profile_path,
+                                                        period=self.scenario.arrival_profile_period)
+
+        # Журнал поступлений (если задан): прибытия воспроизводятся, а не разыгрываются
+        self.arrival_trace: Optional[ArrivalTrace] = None
+        if self.scenario.arrival_trace_path:
+            self.arrival_trace = load_arrival_trace(self.scenario)
+
+    def draw_arrival(self, current_time: float) -> Optional[Tuple[float, int]]:
+        """Разыгрывает время и источник прибытия, следующего за моментом current_time.
+        Возвращает None, если журнал поступлений закончился (прибытий больше не будет)"""
+
+        if self.arrival_trace is not None:
+            # Записанный журнал: время и источник следующей записи
+            record = self.arrival_trace.next_arrival(current_time)
+            if record is None:
+                # Журнал исчерпан - файл больше не нужен
+                self.arrival_trace.close()
+                print("Журнал поступлений закончился")
+            return record
+
+        if self.arrival_profile is not None:
+            # Неоднородный поток: время и источник из профиля по времени суток
+            return self.arrival_profile.sample_next(current_time)
+
+        # Выбираем источник (тип пациента) и интервал прибытия
+        source = self._select_source()
+        interval = random.uniform(source.min_interval, source.max_interval)
+        return current_time + interval, source.source_id
 
     def generate_next_arrival(self) -> Optional[float]:
-        """Генерирует следующее время прибытия пациента"""
-
-        # Выбираем тип пациента
-        patient_type = self._select_patient_type()
+        """Генерирует следующее время прибытия пациента.
+        Возвращает None, если прибытий больше не будет (журнал или метки исчерпаны)"""
+
+        service_time = patience = None
+        if self.arrival_marks is not None:
+            # Заранее разыгранная метка: время, источник, ID, время приема и терпение
+            mark = next(self.arrival_marks, None)
+            if mark is None:
+                return None
+            next_arrival_time, source_id = mark.time, mark.source_id
+            service_time, patience = mark.service_time, mark.patience
+            self.next_patient_id = mark.patient_id
+        else:
+            arrival = self.draw_arrival(self.simulation_core.current_time)
+            if arrival is None:
+                return None
+            next_arrival_time, source_id = arrival
+        patient_type = self.scenario.priorities_by_source_id[source_id]
 
         # Регистрируем генерацию в статистике
-        self.simulation_core.statistics.record_patient_generation(patient_type)
-
-        # Интервал прибытия
-        settings = self.arrival_settings[patient_type]
-        interval = random.uniform(settings['min_interval'], settings['max_interval'])
-
-        next_arrival_time = self.simulation_core.current_time + interval
+        self.simulation_core.statistics.record_patient_generation(source_id)
 
         # Создаем событие прибытия пациента
-        source_id = self._priority_to_source_id(patient_type)
-        arrival_event = PatientArrivalEvent(
+        arrival_event = self.simulation_core.event_pool.patient_arrival(
             time=next_arrival_time,
             patient_id=self.next_patient_id,
-            source_id=source_id
+            source_id=source_id,
+            service_time=service_time,
+            patience=patience
         )
 
         # Планируем событие
@@ -56,40 +102,47 @@ class PatientGenerator:
 
         return next_arrival_time
 
+    def _select_source(self) -> SourceSpec:
+        """Выбирает источник по вероятностям сценария (alias-таблица)"""
+        return self.sources[self.source_table.sample()]
+
     def _select_patient_type(self) -> Priority:
         """Выбирает тип пациента по нашим вероятностям"""
-        rand = random.random()
-        emergency_prob = self.arrival_settings[Priority.EMERGENCY]['probability']
-        appointment_prob = self.arrival_settings[Priority.BY_APPOINTMENT]['probability']
-
-        if rand < emergency_prob:
-            return Priority.EMERGENCY
-        elif rand < emergency_prob + appointment_prob:
-            return Priority.BY_APPOINTMENT
-        else:
-            return Priority.WITHOUT_APPOINTMENT
+        return self._select_source().priority
 
     def _priority_to_source_id(self, priority: Priority) -> int:
         """Конвертирует Priority в source_id"""
-        mapping = {
-            Priority.EMERGENCY: 1,
-            Priority.BY_APPOINTMENT: 2,
-            Priority.WITHOUT_APPOINTMENT: 3
-        }
-        return mapping[priority]
+        return self.scenario.source_ids_by_priority[priority.value]
 
     def start_generation(self):
         """Запускает генерацию пациентов"""
+        self.started = True
         if not self.simulation_core.step_by_step:
             print("Запуск генерации пациентов с реалистичными интервалами...")
-            print("Ожидаемое распределение:")
-            for priority, settings in self.arrival_settings.items():
-                print(f" • {settings['description']}: {settings['probability'] * 100:.0f}% "
-                      f"(интервал {settings['min_interval']}-{settings['max_interval']} мин)")
+            if self.arrival_trace is not None:
+                print(f"Прибытия из журнала {self.arrival_trace.path} "
+                      f"(масштаб времени {self.arrival_trace.scale:g})")
+            elif self.arrival_profile is not None:
+                print("Интенсивность по профилю времени суток (в среднем):")
+                for source in self.sources:
+                    if source.source_id not in self.arrival_profile.source_ids:
+                        continue
+                    print(f" • {source.description}: "
+                          f"{self.arrival_profile.get_mean_rate(source.source_id):.2f} в час")
+            else:
+                print("Ожидаемое распределение:")
+                for source in self.sources:
+                    print(f" • {source.description}: {source.probability * 100:.0f}% "
+                          f"(интервал {source.min_interval}-{source.max_interval} мин)")
 
         # Генерируем первого пациента
         self.generate_next_arrival()
 
+    def close(self) -> None:
+        """Закрывает журнал поступлений (если он открыт)"""
+        if self.arrival_trace is not None:
+            self.arrival_trace.close()
+
     def get_generation_stats(self) -> Dict:
         """Возвращает статистику генерации (теперь делегирует Statistics)"""
         return self.simulation_core.statistics.get_generation_stats()
\ No newline at end of file
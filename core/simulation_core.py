@@ -1,27 +1,63 @@
 import heapq
 import sys
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from entities.doctor import Doctor
 from services.waiting_room import WaitingRoom
 from services.dispatcher import Dispatcher
 from services.statistics import Statistics
 from core.patient_generator import PatientGenerator
-from entities.priority import Priority
+from core.breakpoints import Breakpoint, parse_breakpoint
+from core.branching import fork_branches, format_branch_comparison
+from entities.patient import Patient
+from events.event import EVENT_KIND_SERVICE_END
+from events.event_pool import EventPool
+from events.abandonment_event import AbandonmentEvent
+from events.patient_arrival_event import PatientArrivalEvent
 from events.service_end_event import ServiceEndEvent
-from config.settings import (
-    DEFAULT_NUM_DOCTORS, DEFAULT_BUFFER_CAPACITY, DEFAULT_MEAN_SERVICE_TIME,
-    DISPLAY_SETTINGS, DISPLAY_DESCRIPTIONS
-)
+from services.state_publisher import StateSnapshotCache, StateServer
+from services.memory_tracker import MemoryTracker
+from services.time_series import TimeSeriesSampler
+from services.sensitivity import SensitivityEstimator
+from utils.output import suppressed_output
+from utils.name_generator import NameGenerator
+from config.scenario import Scenario, default_scenario
+from config.settings import STATE_ENDPOINT_SETTINGS, EVENT_QUEUE_SETTINGS
+
+
+# Команды пошагового режима
+STEP_COMMANDS_HELP = """Команды:
+  Enter            - обработать одно событие
+  n N              - пропустить N событий без отображения
+  t T              - пропустить события до модельного времени T
+  c                - пропускать события до точки останова (Ctrl+C - прервать)
+  b                - список точек останова
+  b full           - остановиться, когда буфер заполнится
+  b reject ИМЯ     - остановиться при отказе пациенту приоритета (EMERGENCY, 'срочно')
+  b patient N      - остановиться перед событием пациента N
+  b clear          - удалить точки останова
+  w doctors=N buffer=M service_time=T horizon=H
+                   - что если: сравнить продолжение с измененными параметрами (ветви os.fork)
+  q                - выход"""
 
 
 class SimulationCore:
     """Главный класс управления имитационной моделью.
     Запускает и координирует все компоненты системы."""
 
-    def __init__(self):
+    def __init__(self, scenario: Optional[Scenario] = None):
+        self.scenario = scenario or default_scenario()
         self.current_time = 0.0
         self.event_queue = []
+        self.event_pool = EventPool()
+        # Таблица обработчиков событий, индекс - код типа события (Event.kind)
+        self.event_handlers = (self._handle_patient_arrival, self._handle_service_end,
+                               self._handle_abandonment)
+        self.cancelled_events = 0  # Отмененных событий, еще лежащих в календаре
+        self.batch_same_time = self.scenario.batch_same_time  # Пакеты событий с одним временем
+        self.patience_laws = []  # Законы терпения, индекс - source_id
+        self.balk_thresholds = []  # Пороги отказа встать в очередь, индекс - source_id
         self.doctors: List[Doctor] = []
+        self.doctors_by_id: Dict[int, Doctor] = {}
         self.waiting_room: WaitingRoom = None
         self.dispatcher: Dispatcher = None
         self.patient_generator: PatientGenerator = None
@@ -33,11 +69,25 @@ class SimulationCore:
         self.should_stop = False
         self.event_counter = 0
         self.step_count = 0
+        self.processed_events = 0
+        self.observers = []  # Наблюдатели, уведомляемые после каждого события
+        self.breakpoints: List[Breakpoint] = []  # Точки останова перемотки пошагового режима
+        self.state_cache: Optional[StateSnapshotCache] = None
+        self.state_server: Optional[StateServer] = None
+        self.memory_tracker: Optional[MemoryTracker] = None
+        self.time_series: Optional[TimeSeriesSampler] = None
+        self.sensitivity: Optional[SensitivityEstimator] = None
+
+    def initialize_system(self, num_doctors: Optional[int] = None,
+                          buffer_capacity: Optional[int] = None,
+                          mean_service_time: Optional[float] = None):
+        """Инициализирует все компоненты системы.
+        Не заданные параметры берутся из сценария."""
+        scenario = self.scenario
+        num_doctors = num_doctors if num_doctors is not None else scenario.num_doctors
+        buffer_capacity = buffer_capacity if buffer_capacity is not None else scenario.buffer_capacity
+        mean_service_time = mean_service_time if mean_service_time is not None else scenario.mean_service_time
 
-    def initialize_system(self, num_doctors: int = DEFAULT_NUM_DOCTORS,
-                          buffer_capacity: int = DEFAULT_BUFFER_CAPACITY,
-                          mean_service_time: float = DEFAULT_MEAN_SERVICE_TIME):
-        """Инициализирует все компоненты системы"""
         print("ИНИЦИАЛИЗАЦИЯ СИСТЕМЫ МАССОВОГО ОБСЛУЖИВАНИЯ")
         print("=" * 50)
 
@@ -46,17 +96,21 @@ class SimulationCore:
         for i in range(1, num_doctors + 1):
             doctor = Doctor(
                 doctor_id=i,
-                mean_service_time=mean_service_time
+                mean_service_time=mean_service_time,
+                scenario=scenario
             )
             self.doctors.append(doctor)
             print(f"Создан врач: {doctor.name}")
+        self.doctors_by_id = {doctor.id: doctor for doctor in self.doctors}
 
         # Создаем буфер ожидания
         self.waiting_room = WaitingRoom(capacity=buffer_capacity)
         print(f"Создан буфер ожидания на {buffer_capacity} мест")
 
         # Создаем статистику
-        self.statistics = Statistics()
+        self.statistics = Statistics(scenario)
+        for doctor in self.doctors:
+            self.statistics.initialize_doctor_stats(doctor.id)
         print("Система статистики инициализирована")
 
         # Создаем диспетчер
@@ -67,7 +121,13 @@ class SimulationCore:
         )
         print("Диспетчер инициализирован")
 
-        # Создаем генератор пациентов
+        # Терпение пациентов: уход из очереди и отказ встать в нее
+        self.patience_laws = scenario.build_patience_laws()
+        self.balk_thresholds = scenario.build_balk_thresholds()
+
+        # Создаем генератор пациентов (журнал прежнего генератора закрывается)
+        if self.patient_generator is not None:
+            self.patient_generator.close()
         self.patient_generator = PatientGenerator(self)
         print("Генератор пациентов готов к работе")
 
@@ -76,12 +136,100 @@ class SimulationCore:
         print()
 
 
+    def add_observer(self, observer) -> None:
+        """Регистрирует наблюдателя с методом on_event(core)"""
+        self.observers.append(observer)
+
+    def _notify_observers(self) -> None:
+        """Уведомляет наблюдателей об обработанном событии"""
+        for observer in self.observers:
+            observer.on_event(self)
+
+    def enable_state_endpoint(self, host: Optional[str] = None, port: Optional[int] = None,
+                              rebuild_every: Optional[int] = None) -> StateServer:
+        """Запускает локальный HTTP/JSON эндпоинт состояния для дашбордов"""
+        settings = STATE_ENDPOINT_SETTINGS
+        self.state_cache = StateSnapshotCache(
+            rebuild_every=rebuild_every if rebuild_every is not None else settings['rebuild_every_events'],
+            history_size=settings['history_size']
+        )
+        self.state_cache.rebuild(self)
+        self.add_observer(self.state_cache)
+
+        self.state_server = StateServer(
+            self.state_cache,
+            host=host if host is not None else settings['host'],
+            port=port if port is not None else settings['port']
+        )
+        self.state_server.start()
+        print(f"Эндпоинт состояния: http://{self.state_server.host}:{self.state_server.port}/state")
+        return self.state_server
+
+    def enable_memory_tracking(self, interval_minutes: Optional[float] = None) -> MemoryTracker:
+        """Включает профилирование памяти: снимок tracemalloc каждые interval_minutes модельного времени"""
+        self.memory_tracker = MemoryTracker(interval_minutes=interval_minutes)
+        self.memory_tracker.start()
+        self.add_observer(self.memory_tracker)
+        return self.memory_tracker
+
+    def enable_time_series(self, interval: Optional[float] = None,
+                           capacity: Optional[int] = None) -> TimeSeriesSampler:
+        """Включает запись временного ряда состояния фиксированного объема
+        (с текущего модельного времени - ряд можно включить посреди прогона)"""
+        self.time_series = TimeSeriesSampler(interval=interval, capacity=capacity, start_time=self.current_time)
+        # Первые опросы видят текущее состояние, а не пустую систему
+        self.time_series.on_event(self)
+        self.add_observer(self.time_series)
+        return self.time_series
+
+    def enable_sensitivity(self) -> SensitivityEstimator:
+        """Включает оценки чувствительности (IPA и LR) по ходу прогона"""
+        self.sensitivity = SensitivityEstimator(self)
+        self.statistics.add_listener(self.sensitivity)
+        return self.sensitivity
+
+    def branch(self, branches: List[Dict], horizon: Optional[float] = None,
+               workers: Optional[int] = None) -> List[Dict]:
+        """Прогоняет ветви "что если" от текущего состояния (копирование при записи через os.fork).
+        Каждая ветвь - словарь изменений параметров (core.branching.BRANCH_CHANGES);
+        состояние самой симуляции не меняется. Возвращает отчеты ветвей."""
+        return fork_branches(self, branches, horizon=horizon, workers=workers)
+
     def schedule_event(self, event):
         """Добавляет событие в приоритетную очередь с учетом коллизий времени"""
         event.event_id = self.event_counter
         self.event_counter += 1
         heapq.heappush(self.event_queue, event)
 
+    def cancel_event(self, event) -> None:
+        """Отменяет запланированное событие (ленивое удаление).
+        Событие помечается отмененным и остается в календаре, пока не будет извлечено;
+        когда отмененных становится слишком много, календарь уплотняется."""
+        event.cancelled = True
+        self.cancelled_events += 1
+        settings = EVENT_QUEUE_SETTINGS
+        if (self.cancelled_events >= settings['compaction_min_cancelled'] and
+                self.cancelled_events > settings['compaction_ratio'] * len(self.event_queue)):
+            self._compact_event_queue()
+
+    def _compact_event_queue(self) -> None:
+        """Убирает отмененные события из календаря и возвращает их в пул"""
+        live = []
+        for event in self.event_queue:
+            if event.cancelled:
+                self.event_pool.release(event)
+            else:
+                live.append(event)
+        self.event_queue[:] = live
+        heapq.heapify(self.event_queue)
+        self.cancelled_events = 0
+
+    def schedule_abandonment(self, patient: Patient) -> None:
+        """Планирует уход ожидающего пациента из очереди по истечении терпения"""
+        event = self.event_pool.abandonment(patient.arrival_time + patient.patience, patient.id)
+        patient.abandonment_event = event
+        self.schedule_event(event)
+
     def schedule_next_arrival(self):
         """Планирует следующее прибытие пациента"""
         self.patient_generator.generate_next_arrival()
@@ -94,22 +242,112 @@ class SimulationCore:
 
     def find_doctor_by_id(self, doctor_id: int) -> Optional[Doctor]:
         """Находит врача по ID"""
-        for doctor in self.doctors:
-            if doctor.id == doctor_id:
-                return doctor
-        return None
+        return self.doctors_by_id.get(doctor_id)
+
+    def _handle_patient_arrival(self, event: PatientArrivalEvent) -> None:
+        """Обрабатывает прибытие пациента"""
+        patient = Patient(
+            id=event.patient_id,
+            source_id=event.source_id,
+            arrival_time=event.time,
+            name=NameGenerator.generate_patient_name(),
+            service_time=event.service_time,
+            priority=self.scenario.priorities_by_source_id[event.source_id]
+        )
 
-    def display_step_state(self, current_event=None):
-        """Отображает состояние системы в пошаговом режиме с таблицами"""
+        # Терпение разыгрывается при прибытии каждого пациента, даже если он сразу попадет
+        # к врачу: так розыгрыши идут в порядке прибытий и не зависят от состояния системы.
+        # Заранее разыгранное терпение (метка прибытия) берется из события
+        patience_law = self.patience_laws[event.source_id]
+        if event.patience is not None:
+            patient.patience = event.patience
+        elif patience_law is not None:
+            patient.patience = patience_law.sample()
+
+        if not self.step_by_step:
+            print(f"Время {event.time:.2f}: Обработка прибытия пациента - {patient}")
+
+        # Регистрируем в статистике
+        self.statistics.record_patient_arrival(patient)
+
+        # Отказ встать в очередь: пациент уходит, увидев слишком длинную очередь
+        threshold = self.balk_thresholds[event.source_id]
+        if threshold is not None and self.waiting_room.size >= threshold:
+            print(f"Время {event.time:.2f}: {patient.name} не встал в очередь "
+                  f"({self.waiting_room.size} ожидающих)")
+            self.statistics.record_patient_balking(patient)
+            self.schedule_next_arrival()
+            return
+
+        # Передаем диспетчеру
+        success = self.dispatcher.on_patient_arrival(patient, event.time)
+
+        if not success and not self.step_by_step:
+            print(f"Пациенту {patient.name} отказано в обслуживании")
+
+        # Планируем следующее прибытие
+        self.schedule_next_arrival()
+
+    def _handle_service_end(self, event: ServiceEndEvent) -> None:
+        """Обрабатывает окончание обслуживания"""
+        print(f"Время {event.time:.2f}: Завершение обслуживания врачом {event.doctor_id}, "
+              f"пациент {event.patient_id}")
+
+        doctor = self.doctors_by_id.get(event.doctor_id)
+        if doctor is None:
+            print(f"Ошибка: Врач {event.doctor_id} не найден")
+            return
+
+        # Завершаем обслуживание
+        try:
+            patient = doctor.end_service(event.time)
+
+            if patient is None:
+                print(f"Ошибка: Врач {doctor.name} не занят обслуживанием")
+                return
+
+            # Регистрируем в статистике
+            self.statistics.record_service_end(patient)
+            self.statistics.record_service_end_by_doctor(doctor.id, patient.service_end_time -
+                                                         patient.service_start_time)
+
+            # Уведомляем диспетчер о свободном враче
+            self.dispatcher.on_doctor_became_free(event.doctor_id, event.time)
+
+            print(f"Врач {doctor.name} освободился после приема {patient.name}")
+
+        except Exception as e:
+            print(f"Ошибка при завершении обслуживания: {e}")
+
+    def _handle_abandonment(self, event: AbandonmentEvent) -> None:
+        """Обрабатывает уход пациента из очереди по истечении терпения"""
+        patient = self.waiting_room.remove_patient_by_id(event.patient_id)
+        if patient is None:
+            print(f"Ошибка: Пациент {event.patient_id} не найден в буфере")
+            return
+
+        patient.abandonment_event = None
+        print(f"Время {event.time:.2f}: {patient.name} ушел из очереди, не дождавшись приема")
+        self.statistics.record_patient_abandonment(patient, event.time)
+
+    def display_step_state(self, current_events=None):
+        """Отображает состояние системы в пошаговом режиме с таблицами.
+        current_events - события текущего шага (одно или пакет с одинаковым временем)"""
         self.step_count += 1
 
-        table_width = DISPLAY_SETTINGS['table_width']
+        scenario = self.scenario
+        table_width = scenario.table_width
         print(f"\n{'=' * table_width}")
         print(f"ШАГ {self.step_count} - Время: {self.current_time:.2f} мин")
         print(f"{'=' * table_width}")
 
-        if current_event:
-            print(f"ОБРАБАТЫВАЕМОЕ СОБЫТИЕ: {current_event}")
+        if current_events:
+            if len(current_events) == 1:
+                print(f"ОБРАБАТЫВАЕМОЕ СОБЫТИЕ: {current_events[0]}")
+            else:
+                print(f"ОБРАБАТЫВАЕМЫЕ СОБЫТИЯ ({len(current_events)}):")
+                for event in current_events:
+                    print(f"  {event}")
             print(f"{'-' * table_width}")
 
         # Таблица 1: Календарь событий
@@ -118,14 +356,11 @@ class SimulationCore:
         print(f"{'-' * 55}")
 
         if self.event_queue:
-            next_events = heapq.nsmallest(DISPLAY_SETTINGS['max_events_display'], self.event_queue)
+            next_events = heapq.nsmallest(scenario.max_events_display,
+                                          (event for event in self.event_queue if not event.cancelled))
             for event in next_events:
-                if hasattr(event, 'patient_id'):
-                    patient_info = f"P{event.patient_id}"
-                else:
-                    patient_info = "-"
-
-                if hasattr(event, 'doctor_id'):
+                patient_info = f"P{event.patient_id}"
+                if event.kind == EVENT_KIND_SERVICE_END:
                     doctor_info = f"D{event.doctor_id}"
                 else:
                     doctor_info = "-"
@@ -145,7 +380,7 @@ class SimulationCore:
         buffer_info = self.waiting_room.get_queue_info()
         for i, patient in enumerate(buffer_info):
             if patient is not None:
-                source_desc = DISPLAY_DESCRIPTIONS['sources'].get(patient.source_id, f"И{patient.source_id}")
+                source_desc = scenario.source_names_by_id[patient.source_id]
                 print(
                     f"{i + 1:<10} {patient.arrival_time:<10.2f} {source_desc:<10} P{patient.id:<9} {str(patient.priority):<15}")
             else:
@@ -161,15 +396,14 @@ class SimulationCore:
 
         for doctor in self.doctors:
             if doctor.is_busy and doctor.current_patient:
-                status = DISPLAY_DESCRIPTIONS['statuses']['busy']
+                status = scenario.status_busy
                 patient_name = f"P{doctor.current_patient.id}"
                 start_time = f"{doctor.current_patient.service_start_time:.2f}"
 
                 # ИСПРАВЛЕННЫЙ РАСЧЕТ: используем реальное время окончания из события
                 service_end_time = None
                 for event in self.event_queue:
-                    if (hasattr(event, 'doctor_id') and event.doctor_id == doctor.id and
-                            isinstance(event, ServiceEndEvent)):
+                    if event.kind == EVENT_KIND_SERVICE_END and event.doctor_id == doctor.id:
                         service_end_time = event.time
                         break
 
@@ -179,7 +413,7 @@ class SimulationCore:
                     end_time = "расчет..."
 
             else:
-                status = DISPLAY_DESCRIPTIONS['statuses']['free']
+                status = scenario.status_free
                 patient_name = "-"
                 start_time = "-"
                 end_time = "-"
@@ -197,37 +431,147 @@ class SimulationCore:
         print(f"{'Следующий врач (Д2П2)':<30} #{self.dispatcher.next_doctor_index + 1:<20}")
 
         # Статистика
-        stats = self.statistics
-        total_arrived = stats.total_patients_arrived
-        total_served = stats.total_patients_served
-        total_rejected = stats.total_patients_rejected
+        aggregate = self.statistics.get_aggregate()
+        total_arrived = aggregate['total_arrived']
 
         print(f"{'Всего пациентов':<30} {total_arrived:<20}")
-        print(f"{'Обслужено':<30} {total_served:<20}")
-        print(f"{'Отказов':<30} {total_rejected:<20}")
+        print(f"{'Обслужено':<30} {aggregate['total_served']:<20}")
+        print(f"{'Отказов':<30} {aggregate['total_rejected']:<20}")
+        if self.scenario.has_patience:
+            print(f"{'Ушли из очереди':<30} {aggregate['total_abandoned']:<20}")
+            print(f"{'Не встали в очередь':<30} {aggregate['total_balked']:<20}")
 
         if total_arrived > 0:
-            rejection_rate = (total_rejected / total_arrived) * 100
-            print(f"{'Процент отказов':<30} {rejection_rate:.2f}%")
+            print(f"{'Процент отказов':<30} {aggregate['rejection_rate']:.2f}%")
 
         # Статистика по приоритетам
         print(f"{'--- По приоритетам ---':<30} {'':<20}")
-        for priority in [Priority.EMERGENCY, Priority.BY_APPOINTMENT, Priority.WITHOUT_APPOINTMENT]:
-            arrived = stats.patients_by_priority[priority]
-            served = stats.served_by_priority[priority]
-            rejected = stats.rejected_by_priority[priority]
+        for priority, priority_stats in aggregate['priorities'].items():
+            arrived = priority_stats['arrived']
+            rejected = priority_stats['rejected']
 
             if arrived > 0:
-                rejection_rate = (rejected / arrived) * 100
+                rejection_rate = priority_stats['rejection_rate']
                 print(f"{str(priority):<30} {f'прибыло {arrived}, отказов {rejected} ({rejection_rate:.1f}%)':<20}")
 
         print(f"{'=' * table_width}")
 
+    def process_next_event(self) -> None:
+        """Извлекает и обрабатывает ближайшее событие без отображения.
+        Обработанное событие возвращается в пул."""
+        event = heapq.heappop(self.event_queue)
+        if event.cancelled:
+            # Отмененное событие (ленивое удаление) не обрабатывается
+            self.cancelled_events -= 1
+            self.event_pool.release(event)
+            return
+        self.current_time = event.time
+        self.event_handlers[event.kind](event)
+        self.event_pool.release(event)
+        self.processed_events += 1
+        if self.current_time > self.total_simulation_time:
+            self.total_simulation_time = self.current_time
+        if self.observers:
+            self._notify_observers()
+
+    def process_next_batch(self) -> None:
+        """Извлекает и обрабатывает все события с временем ближайшего (пакет) без отображения.
+        События пакета обрабатываются в порядке event_id. Назначение на прием после окончаний
+        обслуживания откладывается и выполняется одним проходом диспетчера; исход прибытия
+        (Д1О4, отказ встать в очередь) и ухода из очереди зависит от буфера, поэтому перед ними
+        отложенный проход выполняется, а их собственное назначение - сразу (порядок розыгрышей
+        тот же). От поочередной обработки пакет отличается только тем, какому из одновременно
+        освободившихся врачей достается пациент (один проход Д2П2 на всех).
+        Наблюдатели уведомляются один раз на пакет."""
+        queue = self.event_queue
+        handlers = self.event_handlers
+        dispatcher = self.dispatcher
+        time = queue[0].time
+        processed = 0
+        try:
+            while queue and queue[0].time == time:
+                event = heapq.heappop(queue)
+                if event.cancelled:
+                    self.cancelled_events -= 1
+                    self.event_pool.release(event)
+                    continue
+                dispatcher.deferred = event.kind == EVENT_KIND_SERVICE_END
+                if not dispatcher.deferred:
+                    dispatcher.flush(time)
+                self.current_time = time
+                handlers[event.kind](event)
+                self.event_pool.release(event)
+                processed += 1
+        finally:
+            dispatcher.deferred = False
+        dispatcher.flush(time)
+
+        if not processed:
+            return
+        self.processed_events += processed
+        if self.current_time > self.total_simulation_time:
+            self.total_simulation_time = self.current_time
+        if self.observers:
+            self._notify_observers()
+
+    def step(self) -> None:
+        """Один шаг модели: ближайшее событие или пакет событий с одинаковым временем"""
+        if self.batch_same_time:
+            self.process_next_batch()
+        else:
+            self.process_next_event()
+
+    def peek_step(self) -> list:
+        """События следующего шага без извлечения (отмененные с вершины календаря убираются)"""
+        queue = self.event_queue
+        while queue and queue[0].cancelled:
+            self.cancelled_events -= 1
+            self.event_pool.release(heapq.heappop(queue))
+        if not queue:
+            return []
+        if not self.batch_same_time:
+            return [queue[0]]
+        # Обход кучи от вершины только по узлам с тем же временем: потомки не раньше родителя,
+        # поэтому поддерево с более поздним корнем событий пакета не содержит
+        time = queue[0].time
+        size = len(queue)
+        batch = []
+        pending = [0]
+        while pending:
+            index = pending.pop()
+            event = queue[index]
+            if event.time != time:
+                continue
+            if not event.cancelled:
+                batch.append(event)
+            child = 2 * index + 1
+            if child < size:
+                pending.append(child)
+                if child + 1 < size:
+                    pending.append(child + 1)
+        batch.sort()
+        return batch
+
+    def run_until(self, end_time: float) -> None:
+        """Пакетный прогон без отображения и ввода до модельного времени end_time.
+        События с временем >= end_time остаются в календаре."""
+        with suppressed_output():
+            if not self.patient_generator.started:
+                self.patient_generator.start_generation()
+
+            step = self.process_next_batch if self.batch_same_time else self.process_next_event
+            while self.event_queue and self.event_queue[0].time < end_time:
+                step()
+
+        if end_time > self.current_time:
+            self.current_time = end_time
+            self.total_simulation_time = end_time
+
     def run(self):
         """Запускает симуляцию в пошаговом режиме БЕЗ ограничений по времени"""
         print("РЕЖИМ ПОШАГОВОГО ВЫПОЛНЕНИЯ")
         print("Нажимайте Enter для перехода к следующему событию")
-        print("Введите 'q' для выхода из симуляции")
+        print("Введите 'q' для выхода из симуляции, 'h' - список команд перемотки и точек останова")
         print("=" * 100)
 
         self.running = True
@@ -238,38 +582,41 @@ class SimulationCore:
 
         # Главный цикл симуляции - БЕЗ ограничений по времени
         while self.event_queue and self.running:
-            # Извлекаем следующее событие
-            event = heapq.heappop(self.event_queue)
-            self.current_time = event.get_time()
+            # События следующего шага (одно или пакет с одинаковым временем)
+            events = self.peek_step()
+            if not events:
+                break
+            self.current_time = events[0].get_time()
 
             # Отображаем состояние ДО обработки события
-            self.display_step_state(event)
+            self.display_step_state(events)
 
             # Ждем команду пользователя
-            try:
-                user_input = input("\nНажмите Enter для обработки события или 'q' для выхода: ")
-                if user_input.lower() == 'q':
-                    self.running = False
-                    break
-            except KeyboardInterrupt:
-                self.running = False
-                break
-            except Exception as e:
-                print(f"Ошибка ввода: {e}")
+            command = self._read_step_command()
+            if command is None:
                 self.running = False
                 break
 
-            # Обрабатываем событие
-            event.process_event(self)
-
-            # Обновляем общее время симуляции
-            self.total_simulation_time = max(self.total_simulation_time, self.current_time)
+            max_steps, until_time = command
+            if max_steps == 1:
+                # Обрабатываем событие (пакет) по таблице обработчиков и возвращаем его в пул
+                self.step()
+            else:
+                # Перемотка без отображения до числа шагов, времени или точки останова
+                steps, hits = self.fast_forward(max_steps, until_time)
+                print(f"\nПропущено шагов: {steps}")
+                for breakpoint in hits:
+                    print(f"ОСТАНОВ: {breakpoint}")
 
         # Завершение симуляции
         self.running = False
         if not self.event_queue:
             print("\nСобытия закончились - симуляция завершена")
 
+        # Публикуем финальное состояние для внешних наблюдателей
+        if self.state_cache is not None:
+            self.state_cache.rebuild(self)
+
         # Финальное состояние
         self.display_step_state()
         self.generate_final_report()
@@ -278,6 +625,132 @@ class SimulationCore:
         print("СИМУЛЯЦИЯ ЗАВЕРШЕНА")
         print("=" * 100)
 
+    def fast_forward(self, max_steps: Optional[int] = None,
+                     until_time: Optional[float] = None) -> Tuple[int, List[Breakpoint]]:
+        """Безэкранная перемотка: не больше max_steps шагов, до модельного времени until_time
+        (события с временем >= until_time остаются в календаре) или до срабатывания точки
+        останова. Точки проверяются перед каждым шагом, кроме первого (он уже отображен).
+        Ctrl+C прерывает перемотку. Возвращает число шагов и сработавшие точки."""
+        for breakpoint in self.breakpoints:
+            breakpoint.reset(self)
+
+        steps = 0
+        hits: List[Breakpoint] = []
+        try:
+            with suppressed_output():
+                while self.event_queue and self.running:
+                    events = self.peek_step()
+                    if not events:
+                        break
+                    if until_time is not None and events[0].time >= until_time:
+                        break
+                    if max_steps is not None and steps >= max_steps:
+                        break
+                    if steps > 0:
+                        hits = [breakpoint for breakpoint in self.breakpoints
+                                if breakpoint.triggered(self, events)]
+                        if hits:
+                            break
+                    self.step()
+                    steps += 1
+        except KeyboardInterrupt:
+            print("\nПеремотка прервана")
+
+        # Первый шаг уже учтен при отображении
+        self.step_count += max(0, steps - 1)
+        return steps, hits
+
+    def _read_step_command(self) -> Optional[Tuple[Optional[int], Optional[float]]]:
+        """Читает команды пошагового режима, пока не будет введена команда продвижения.
+        Возвращает (число шагов, время останова) или None для выхода."""
+        while True:
+            try:
+                user_input = input("\nНажмите Enter для обработки события или 'q' для выхода: ").strip()
+            except KeyboardInterrupt:
+                return None
+            except Exception as e:
+                print(f"Ошибка ввода: {e}")
+                return None
+
+            words = user_input.split()
+            command = words[0].lower() if words else ''
+            argument = words[1] if len(words) == 2 else None
+
+            if command == '':
+                return 1, None
+            if command == 'q':
+                return None
+            if command == 'n' and argument is not None and argument.isdigit() and int(argument) > 0:
+                return int(argument), None
+            if command == 't' and argument is not None:
+                try:
+                    until_time = float(argument)
+                except ValueError:
+                    until_time = None
+                if until_time is not None and until_time > self.current_time:
+                    return None, until_time
+                print(f"Время останова должно быть числом больше текущего ({self.current_time:.2f})")
+                continue
+            if command == 'c':
+                if not self.breakpoints:
+                    print("Точек останова нет - перемотка до Ctrl+C")
+                return None, None
+            if command == 'b':
+                self._edit_breakpoints(user_input[1:].strip())
+                continue
+            if command == 'w':
+                self._what_if(words[1:])
+                continue
+            if command in ('h', '?'):
+                print(STEP_COMMANDS_HELP)
+                continue
+            print("Неизвестная команда, 'h' - список команд")
+
+    def _edit_breakpoints(self, text: str) -> None:
+        """Команда 'b': список, очистка или добавление точки останова"""
+        if not text:
+            if not self.breakpoints:
+                print("Точек останова нет")
+            for number, breakpoint in enumerate(self.breakpoints, 1):
+                print(f"{number}: {breakpoint}")
+            return
+        if text.lower() == 'clear':
+            self.breakpoints.clear()
+            print("Точки останова удалены")
+            return
+        breakpoint = parse_breakpoint(text, self.scenario)
+        if breakpoint is None:
+            print("Не удалось разобрать точку останова, 'h' - список команд")
+            return
+        self.breakpoints.append(breakpoint)
+        print(f"Добавлена точка останова: {breakpoint}")
+
+    def _what_if(self, words: List[str]) -> None:
+        """Команда 'w': текущее продолжение против ветви с измененными параметрами"""
+        names = {'doctors': ('num_doctors', int), 'buffer': ('buffer_capacity', int),
+                 'service_time': ('mean_service_time', float)}
+        changes = {'name': 'Что если'}
+        horizon = None
+        for word in words:
+            key, _, value = word.partition('=')
+            try:
+                if key == 'horizon':
+                    horizon = float(value)
+                elif key in names:
+                    changes[names[key][0]] = names[key][1](value)
+                else:
+                    raise ValueError
+            except ValueError:
+                print(f"Не удалось разобрать '{word}', 'h' - список команд")
+                return
+        try:
+            results = self.branch([{'name': 'Как есть'}, changes], horizon=horizon)
+        except (RuntimeError, ValueError) as error:
+            print(f"Ветвление невозможно: {error}")
+            return
+        print(f"\nЧТО ЕСЛИ: {results[0].get('horizon', 0):.0f} мин от t={self.current_time:.2f}")
+        print(format_branch_comparison(results))
+
     def generate_final_report(self):
         """Генерирует итоговый отчет"""
         print("\n" + "=" * 100)
@@ -287,54 +760,43 @@ class SimulationCore:
         stats = self.statistics
         gen_stats = self.patient_generator.get_generation_stats()
 
-        # Итоговая таблица
+        # Итоговая таблица: колонка на каждый источник сценария
+        sources = self.scenario.sources
+        aggregate = stats.get_aggregate()
+        priorities = aggregate['priorities']
+        width = 37 + 13 * len(sources)
         print("\nТАБЛИЦА 5 - ИТОГОВАЯ СТАТИСТИКА")
-        print(f"{'Параметр':<25} {'Всего':<10} {'Неотложка':<12} {'По записи':<12} {'Без записи':<12}")
-        print(f"{'-' * 71}")
+        print(f"{'Параметр':<25} {'Всего':<10} " + " ".join(f"{source.display_name:<12}" for source in sources))
+        print(f"{'-' * width}")
 
         # Сгенерировано
         if gen_stats:
-            print(f"{'Сгенерировано':<25} {gen_stats['total_generated']:<10} "
-                  f"{gen_stats['emergency_count']:<12} {gen_stats['appointment_count']:<12} "
-                  f"{gen_stats['walkin_count']:<12}")
-
-        # Прибыло
-        print(f"{'Прибыло':<25} {stats.total_patients_arrived:<10} "
-              f"{stats.patients_by_priority[Priority.EMERGENCY]:<12} "
-              f"{stats.patients_by_priority[Priority.BY_APPOINTMENT]:<12} "
-              f"{stats.patients_by_priority[Priority.WITHOUT_APPOINTMENT]:<12}")
-
-        # Обслужено
-        print(f"{'Обслужено':<25} {stats.total_patients_served:<10} "
-              f"{stats.served_by_priority[Priority.EMERGENCY]:<12} "
-              f"{stats.served_by_priority[Priority.BY_APPOINTMENT]:<12} "
-              f"{stats.served_by_priority[Priority.WITHOUT_APPOINTMENT]:<12}")
-
-        # Отказы
-        print(f"{'Отказов':<25} {stats.total_patients_rejected:<10} "
-              f"{stats.rejected_by_priority[Priority.EMERGENCY]:<12} "
-              f"{stats.rejected_by_priority[Priority.BY_APPOINTMENT]:<12} "
-              f"{stats.rejected_by_priority[Priority.WITHOUT_APPOINTMENT]:<12}")
+            print(f"{'Сгенерировано':<25} {gen_stats['total_generated']:<10} " +
+                  " ".join(f"{gen_stats['counts'][source.source_id]:<12}" for source in sources))
+
+        # Прибыло, обслужено, отказы
+        for title, total, key in (('Прибыло', aggregate['total_arrived'], 'arrived'),
+                                  ('Обслужено', aggregate['total_served'], 'served'),
+                                  ('Отказов', aggregate['total_rejected'], 'rejected'),
+                                  ('Ушли из очереди', aggregate['total_abandoned'], 'abandoned'),
+                                  ('Не встали в очередь', aggregate['total_balked'], 'balked')):
+            if key in ('abandoned', 'balked') and not self.scenario.has_patience:
+                continue
+            print(f"{title:<25} {total:<10} " +
+                  " ".join(f"{priorities[source.priority][key]:<12}" for source in sources))
 
         # Проценты отказов
-        print(f"{'% отказов':<25} ", end="")
-        if stats.total_patients_arrived > 0:
-            total_reject_pct = (stats.total_patients_rejected / stats.total_patients_arrived) * 100
-            print(f"{total_reject_pct:<10.2f}", end="")
-        else:
-            print(f"{'0.00':<10}", end="")
+        print(f"{'% отказов':<25} {aggregate['rejection_rate']:<10.2f} " +
+              " ".join(f"{priorities[source.priority]['rejection_rate']:<12.2f}" for source in sources))
 
-        for priority in [Priority.EMERGENCY, Priority.BY_APPOINTMENT, Priority.WITHOUT_APPOINTMENT]:
-            arrived = stats.patients_by_priority[priority]
-            rejected = stats.rejected_by_priority[priority]
-            if arrived > 0:
-                reject_pct = (rejected / arrived) * 100
-                print(f"{reject_pct:<12.2f}", end="")
-            else:
-                print(f"{'0.00':<12}", end="")
-        print()
+        # Процентили времени ожидания и пребывания (по гистограммам)
+        for key, title in (('wait_percentiles', 'Ожидание'), ('sojourn_percentiles', 'Пребывание')):
+            for percentile in (90.0, 99.0):
+                print(f"{f'{title} p{percentile:g}, мин':<25} {aggregate[key].get(percentile, 0.0):<10.2f} " +
+                      " ".join(f"{priorities[source.priority][key].get(percentile, 0.0):<12.2f}"
+                               for source in sources))
 
-        print(f"{'-' * 71}")
+        print(f"{'-' * width}")
 
         # Статистика по врачам
         print(f"\nСТАТИСТИКА ПО ВРАЧАМ:")
@@ -366,12 +828,27 @@ class SimulationCore:
         """Возвращает текущее состояние системы"""
         return {
             'current_time': self.current_time,
-            'events_in_queue': len(self.event_queue),
+            'events_in_queue': len(self.event_queue) - self.cancelled_events,
             'doctors_state': [str(doctor) for doctor in self.doctors],
             'waiting_room_state': self.waiting_room.get_state_description(),
             'statistics': self.statistics.get_current_state()
         }
 
+    def close(self) -> None:
+        """Освобождает внешние ресурсы прогона: журнал поступлений и эндпоинт состояния.
+        Календарь и статистика остаются доступными."""
+        if self.patient_generator is not None:
+            self.patient_generator.close()
+        if self.state_server is not None:
+            self.state_server.stop()
+            self.state_server = None
+
+    def __enter__(self) -> 'SimulationCore':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
     def __str__(self) -> str:
         state = self.get_system_state()
         return (f"SimulationCore(time={self.current_time:.2f}, "
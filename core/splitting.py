@@ -0,0 +1,226 @@
+import math
+import random
+from typing import Dict, List, Optional, Sequence, Tuple
+from entities.priority import Priority
+from core.time_parallel import SegmentState, capture_state, restore_state
+from utils.output import suppressed_output
+from config.scenario import Scenario, default_scenario
+from config.settings import SPLITTING_SETTINGS
+
+# Снимок траектории: граничное состояние вместе с запланированным прибытием
+# (SegmentState.arrival). Прибытие нужно хранить: интервалы равномерные,
+# поэтому остаток до следующего прибытия - часть состояния.
+Snapshot = SegmentState
+
+
+def importance(core, priority: Priority) -> int:
+    """Функция важности: число пациентов в системе (у врачей и в буфере)
+    плюс единица, если система полна и самый свежий пациент в буфере - данного приоритета.
+    Только такого пациента может вытеснить следующее прибытие (Д1О4)."""
+    busy = 0
+    for doctor in core.doctors:
+        if doctor.is_busy:
+            busy += 1
+    waiting_room = core.waiting_room
+    level = busy + waiting_room.size
+    if waiting_room.is_full() and busy == len(core.doctors):
+        latest = max(waiting_room.patients, key=lambda patient: patient.arrival_time)
+        if latest.priority == priority:
+            level += 1
+    return level
+
+
+class SplittingEstimator:
+    """Оценка вероятности отказа пациентам одного приоритета (по умолчанию неотложным)
+    расщеплением траекторий с фиксированным усилием (fixed-effort splitting).
+
+    Прибытие в пустую систему - точка регенерации, поэтому
+    P(отказа) = E[отказов за цикл] / E[прибытий за цикл].
+    Отказ возможен только с верхнего уровня важности (полная система, последним в буфер
+    попал пациент этого приоритета). Функция важности может перескакивать уровни: прибытие
+    пациента этого приоритета, когда все врачи заняты и в буфере одно свободное место,
+    поднимает ее сразу на два. Поэтому состояние входа, уже лежащее на следующем уровне
+    или выше, сразу считается достигшим его (до первого шага траектории).
+    Нулевой этап - обычный прогон effort циклов: из него берутся знаменатель,
+    вероятность достичь первого уровня и состояния входа. На каждом следующем уровне
+    effort траекторий стартуют из случайных состояний входа предыдущего уровня
+    и идут до следующего уровня или до опустошения системы. С последнего уровня
+    траектории досчитываются до конца цикла с подсчетом отказов.
+    Произведение долей достигших уровней на средний счет отказов - несмещенная оценка
+    числителя. Доверительный интервал строится по независимым повторениям."""
+
+    def __init__(self, num_doctors: Optional[int] = None,
+                 buffer_capacity: Optional[int] = None,
+                 mean_service_time: Optional[float] = None,
+                 priority: Priority = Priority.EMERGENCY,
+                 levels: Optional[Sequence[int]] = None,
+                 effort: Optional[int] = None,
+                 replications: Optional[int] = None,
+                 seed: Optional[int] = None,
+                 scenario: Optional[Scenario] = None):
+        self.scenario = scenario or default_scenario()
+        if self.scenario.arrival_profile_path:
+            raise ValueError("Расщепление требует регенерирующей модели: профиль прибытий не поддерживается")
+        if self.scenario.arrival_trace_path:
+            raise ValueError("Расщепление требует регенерирующей модели: журнал поступлений не поддерживается")
+
+        self.params = {
+            'num_doctors': num_doctors if num_doctors is not None else self.scenario.num_doctors,
+            'buffer_capacity': buffer_capacity if buffer_capacity is not None else self.scenario.buffer_capacity,
+            'mean_service_time': (mean_service_time if mean_service_time is not None
+                                  else self.scenario.mean_service_time)
+        }
+        self.priority = priority
+        self.source_id = self.scenario.get_source(priority).source_id
+        self.effort = effort or SPLITTING_SETTINGS['effort']
+        self.replications = replications or SPLITTING_SETTINGS['replications']
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+
+        # Последний уровень - полная система с пациентом приоритета под угрозой вытеснения
+        top = self.params['num_doctors'] + self.params['buffer_capacity'] + 1
+        if levels is None:
+            levels = range(self.params['num_doctors'], top + 1)
+        self.levels: List[int] = sorted(set(int(level) for level in levels))
+        if not self.levels or self.levels[0] < 1 or self.levels[-1] != top:
+            raise ValueError(f"Уровни должны лежать в [1, {top}] и заканчиваться уровнем {top}")
+
+        self.events_processed = 0
+
+    def _new_core(self):
+        from core.simulation_core import SimulationCore
+
+        core = SimulationCore(self.scenario)
+        core.initialize_system(**self.params)
+        return core
+
+    def _snapshot(self, core) -> Snapshot:
+        state = capture_state(core)
+        if state.arrival is None:
+            raise RuntimeError("В календаре нет запланированного прибытия")
+        return state
+
+    def _restore(self, snapshot: Snapshot):
+        core = self._new_core()
+        restore_state(core, snapshot)
+        return core
+
+    def _run_cycles(self) -> Tuple[int, int, List[Snapshot]]:
+        """Нулевой этап: effort регенерационных циклов обычным прогоном.
+        Возвращает число прибытий и отказов приоритета и состояния входа на первый уровень."""
+        first_level = self.levels[0]
+        core = self._new_core()
+        core.patient_generator.start_generation()
+
+        entrances = []
+        cycles = 0
+        reached = False
+        started = False
+        while cycles < self.effort:
+            core.process_next_event()
+            level = importance(core, self.priority)
+            if level >= first_level and not reached:
+                reached = True
+                entrances.append(self._snapshot(core))
+            if level > 0:
+                started = True
+            elif started:
+                cycles += 1
+                started = reached = False
+
+        self.events_processed += core.processed_events
+        stats = core.statistics
+        return stats.arrived_by_source[self.source_id], stats.rejected_by_source[self.source_id], entrances
+
+    def _run_stage(self, entrances: List[Snapshot], next_level: Optional[int]) -> Tuple[int, List[Snapshot]]:
+        """Этап уровня: effort траекторий из случайных состояний входа.
+        С промежуточного уровня - до next_level или до конца цикла (возвращает новые состояния входа),
+        с последнего (next_level=None) - до конца цикла (возвращает суммарное число отказов)."""
+        hits = []
+        rejections = 0
+        for _ in range(self.effort):
+            entrance = random.choice(entrances)
+            core = self._restore(entrance)
+            # Вход, перескочивший через уровень, - сразу попадание (иначе отказ на первом шаге
+            # не был бы учтен ни на этом, ни на следующем этапе)
+            if next_level is not None and importance(core, self.priority) >= next_level:
+                hits.append(entrance)
+                continue
+            while True:
+                core.process_next_event()
+                level = importance(core, self.priority)
+                if next_level is not None and level >= next_level:
+                    hits.append(self._snapshot(core))
+                    break
+                if level == 0:
+                    break
+            rejections += core.statistics.rejected_by_source[self.source_id]
+            self.events_processed += core.processed_events
+        return (len(hits), hits) if next_level is not None else (rejections, [])
+
+    def _replicate(self) -> Dict:
+        """Одно повторение: несмещенная оценка отказов за цикл и прибытия за цикл"""
+        arrivals, crude_rejections, entrances = self._run_cycles()
+        level_probabilities = [len(entrances) / self.effort]
+
+        for next_level in self.levels[1:]:
+            if not entrances:
+                break
+            hits, entrances = self._run_stage(entrances, next_level)
+            level_probabilities.append(hits / self.effort)
+
+        rejections_per_entrance = 0.0
+        if entrances:
+            total_rejections, _ = self._run_stage(entrances, None)
+            rejections_per_entrance = total_rejections / self.effort
+
+        return {
+            'rejections_per_cycle': math.prod(level_probabilities) * rejections_per_entrance,
+            'arrivals_per_cycle': arrivals / self.effort,
+            'crude_rejections': crude_rejections,
+            'level_probabilities': level_probabilities
+        }
+
+    def run(self) -> Dict:
+        """Выполняет оценку и возвращает вероятность отказа с доверительным интервалом"""
+        replications = []
+        with suppressed_output():
+            for replication in range(self.replications):
+                random.seed(self.seed + replication)
+                replications.append(self._replicate())
+
+        n = len(replications)
+        numerators = [r['rejections_per_cycle'] for r in replications]
+        denominators = [r['arrivals_per_cycle'] for r in replications]
+        mean_numerator = sum(numerators) / n
+        mean_denominator = sum(denominators) / n
+        p_reject = mean_numerator / mean_denominator if mean_denominator > 0 else 0.0
+
+        # Дельта-метод для отношения средних по повторениям
+        half_width = 0.0
+        if n > 1 and mean_denominator > 0:
+            residuals = [x - p_reject * y for x, y in zip(numerators, denominators)]
+            variance = sum(z * z for z in residuals) / (n - 1)
+            half_width = (self.scenario.confidence_t_alpha * math.sqrt(variance / n)) / mean_denominator
+
+        level_probabilities = []
+        for k in range(len(self.levels)):
+            values = [r['level_probabilities'][k] if k < len(r['level_probabilities']) else 0.0
+                      for r in replications]
+            level_probabilities.append(sum(values) / n)
+
+        crude_rejections = sum(r['crude_rejections'] for r in replications)
+        crude_arrivals = mean_denominator * self.effort * n
+
+        return {
+            'priority': str(self.priority),
+            'p_reject': p_reject,
+            'confidence_interval': (max(0.0, p_reject - half_width), p_reject + half_width),
+            'relative_half_width': half_width / p_reject if p_reject > 0 else math.inf,
+            'rejections_per_cycle': mean_numerator,
+            'arrivals_per_cycle': mean_denominator,
+            'levels': list(self.levels),
+            'level_probabilities': level_probabilities,
+            'replications': n,
+            'events_processed': self.events_processed,
+            'crude_p_reject': crude_rejections / crude_arrivals if crude_arrivals > 0 else 0.0
+        }
@@ -0,0 +1,355 @@
+import math
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+from entities.priority import Priority
+from core.optimizer import run_replication
+from config.scenario import Scenario, compile_scenario, default_scenario
+from config.settings import DOE_SETTINGS
+
+# Отклики модели, которые аппроксимирует суррогат
+METRICS = ('total_reject_rate', 'emergency_reject_rate', 'avg_wait_time', 'walkin_wait_time',
+           'system_utilization')
+
+
+def latin_hypercube(n: int, dimensions: int, rng: random.Random) -> List[List[float]]:
+    """n точек латинского гиперкуба в [0, 1]^dimensions:
+    по каждой координате ровно одна точка в каждом из n равных интервалов"""
+    columns = []
+    for _ in range(dimensions):
+        strata = list(range(n))
+        rng.shuffle(strata)
+        columns.append([(stratum + rng.random()) / n for stratum in strata])
+    return [[column[i] for column in columns] for i in range(n)]
+
+
+class ParameterSpace:
+    """Пространство параметров эксперимента: число врачей, мест в буфере, среднее время
+    приема и вероятности источников (вероятность без записи - остаток до 1).
+    Точки хранятся в единичном кубе и переводятся в параметры модели."""
+
+    def __init__(self, bounds: Optional[Dict[str, Tuple[float, float, bool]]] = None,
+                 scenario: Optional[Scenario] = None):
+        self.bounds = dict(bounds or DOE_SETTINGS['bounds'])
+        self.names = list(self.bounds)
+        self.scenario = scenario or default_scenario()
+
+    @property
+    def dimensions(self) -> int:
+        return len(self.names)
+
+    def decode(self, unit: Sequence[float]) -> Dict[str, float]:
+        """Точка единичного куба -> значения параметров (целые округляются)"""
+        point = {}
+        for name, u in zip(self.names, unit):
+            low, high, integer = self.bounds[name]
+            if integer:
+                point[name] = min(int(high), int(low + u * (high - low + 1)))
+            else:
+                point[name] = low + u * (high - low)
+        return point
+
+    def encode(self, point: Dict[str, float]) -> List[float]:
+        """Значения параметров -> координаты единичного куба (для суррогата)"""
+        unit = []
+        for name in self.names:
+            low, high, integer = self.bounds[name]
+            value = point.get(name, low)
+            if integer:
+                unit.append((value - low + 0.5) / (high - low + 1))
+            else:
+                unit.append((value - low) / (high - low) if high > low else 0.0)
+        return unit
+
+    def to_task(self, point: Dict[str, float]) -> Tuple[Dict, Scenario]:
+        """Параметры initialize_system() и сценарий с вероятностями источников точки"""
+        params = {
+            'num_doctors': int(point.get('num_doctors', self.scenario.num_doctors)),
+            'buffer_capacity': int(point.get('buffer_capacity', self.scenario.buffer_capacity)),
+            'mean_service_time': float(point.get('mean_service_time', self.scenario.mean_service_time))
+        }
+
+        scenario = self.scenario
+        if 'emergency_probability' in point or 'appointment_probability' in point:
+            emergency = point.get('emergency_probability',
+                                  scenario.get_source(Priority.EMERGENCY).probability)
+            appointment = point.get('appointment_probability',
+                                    scenario.get_source(Priority.BY_APPOINTMENT).probability)
+            probabilities = {
+                Priority.EMERGENCY.name: emergency,
+                Priority.BY_APPOINTMENT.name: appointment,
+                Priority.WITHOUT_APPOINTMENT.name: 1.0 - emergency - appointment
+            }
+            data = scenario.to_dict()
+            for source in data['sources']:
+                source['probability'] = probabilities[source['key']]
+            scenario = compile_scenario(data)
+
+        return params, scenario
+
+
+class GaussianProcess:
+    """Гауссовский процесс с квадратично-экспоненциальным ядром на единичном кубе.
+    Отклик стандартизуется; длина корреляции и уровень шума подбираются по сетке
+    максимизацией маргинального правдоподобия. Среднее предсказания - одна свертка
+    с заранее посчитанными весами, O(n·d)."""
+
+    LENGTH_SCALES = (0.15, 0.3, 0.6, 1.2)
+    NOISE_LEVELS = (1e-4, 1e-2, 1e-1)
+
+    def __init__(self):
+        self.x: List[List[float]] = []
+        self.length_scale = 0.3
+        self.noise = 1e-2
+        self.y_mean = 0.0
+        self.y_std = 1.0
+        self.weights: List[float] = []
+        self.cholesky: List[List[float]] = []
+
+    def _kernel(self, a: Sequence[float], b: Sequence[float], inverse_scale: float) -> float:
+        distance = 0.0
+        for ai, bi in zip(a, b):
+            delta = ai - bi
+            distance += delta * delta
+        return math.exp(-0.5 * distance * inverse_scale)
+
+    def _factorize(self, x, length_scale: float, noise: float):
+        inverse_scale = 1.0 / (length_scale * length_scale)
+        n = len(x)
+        matrix = [[self._kernel(x[i], x[j], inverse_scale) for j in range(n)] for i in range(n)]
+        for i in range(n):
+            matrix[i][i] += noise
+        return _cholesky(matrix)
+
+    def fit(self, x: List[List[float]], y: List[float]) -> 'GaussianProcess':
+        n = len(y)
+        self.x = [list(point) for point in x]
+        self.y_mean = sum(y) / n
+        variance = sum((value - self.y_mean) ** 2 for value in y) / max(1, n - 1)
+        self.y_std = math.sqrt(variance) if variance > 0 else 1.0
+        targets = [(value - self.y_mean) / self.y_std for value in y]
+
+        best = None
+        for length_scale in self.LENGTH_SCALES:
+            for noise in self.NOISE_LEVELS:
+                lower = self._factorize(self.x, length_scale, noise)
+                if lower is None:
+                    continue
+                alpha = _cholesky_solve(lower, targets)
+                # Логарифм маргинального правдоподобия (без константы)
+                likelihood = (-0.5 * sum(t * a for t, a in zip(targets, alpha))
+                              - sum(math.log(lower[i][i]) for i in range(n)))
+                if best is None or likelihood > best[0]:
+                    best = (likelihood, length_scale, noise, lower, alpha)
+
+        if best is None:
+            raise ValueError("Не удалось обучить суррогат: матрица ковариаций вырождена")
+        _, self.length_scale, self.noise, self.cholesky, self.weights = best
+        return self
+
+    def predict(self, point: Sequence[float]) -> float:
+        """Среднее предсказание"""
+        inverse_scale = 1.0 / (self.length_scale * self.length_scale)
+        total = 0.0
+        for weight, train in zip(self.weights, self.x):
+            distance = 0.0
+            for ai, bi in zip(point, train):
+                delta = ai - bi
+                distance += delta * delta
+            total += weight * math.exp(-0.5 * distance * inverse_scale)
+        return self.y_mean + self.y_std * total
+
+    def predict_with_variance(self, point: Sequence[float]) -> Tuple[float, float]:
+        """Среднее и дисперсия предсказания (без шума наблюдения, в единицах отклика)"""
+        inverse_scale = 1.0 / (self.length_scale * self.length_scale)
+        k = [self._kernel(point, train, inverse_scale) for train in self.x]
+        mean = self.y_mean + self.y_std * sum(w * ki for w, ki in zip(self.weights, k))
+        v = _forward_substitution(self.cholesky, k)
+        variance = max(0.0, 1.0 - sum(vi * vi for vi in v))
+        return mean, variance * self.y_std * self.y_std
+
+
+def _cholesky(matrix: List[List[float]]) -> Optional[List[List[float]]]:
+    """Нижнетреугольный множитель Холецкого или None, если матрица не положительно определена"""
+    n = len(matrix)
+    lower = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        row_i = lower[i]
+        for j in range(i + 1):
+            row_j = lower[j]
+            total = matrix[i][j]
+            for k in range(j):
+                total -= row_i[k] * row_j[k]
+            if i == j:
+                if total <= 0:
+                    return None
+                row_i[i] = math.sqrt(total)
+            else:
+                row_i[j] = total / row_j[j]
+    return lower
+
+
+def _forward_substitution(lower: List[List[float]], b: Sequence[float]) -> List[float]:
+    n = len(b)
+    x = [0.0] * n
+    for i in range(n):
+        row = lower[i]
+        total = b[i]
+        for k in range(i):
+            total -= row[k] * x[k]
+        x[i] = total / row[i]
+    return x
+
+
+def _cholesky_solve(lower: List[List[float]], b: Sequence[float]) -> List[float]:
+    """Решение (L·Lᵀ) x = b"""
+    y = _forward_substitution(lower, b)
+    n = len(y)
+    x = [0.0] * n
+    for i in range(n - 1, -1, -1):
+        total = y[i]
+        for k in range(i + 1, n):
+            total -= lower[k][i] * x[k]
+        x[i] = total / lower[i][i]
+    return x
+
+
+class AdaptiveDesign:
+    """Планирование экспериментов с суррогатной моделью.
+    Начальный план - латинский гиперкуб, по откликам каждой точки обучаются
+    гауссовские процессы (по одному на показатель). Затем точки добавляются
+    пачками туда, где суммарная (в стандартизованных единицах) неопределенность
+    суррогатов наибольшая. Обученный суррогат отвечает на вопросы «что если»
+    без моделирования (predict)."""
+
+    def __init__(self, space: Optional[ParameterSpace] = None,
+                 initial_points: Optional[int] = None,
+                 max_points: Optional[int] = None,
+                 batch_size: Optional[int] = None,
+                 candidate_pool: Optional[int] = None,
+                 horizon: Optional[float] = None,
+                 workers: Optional[int] = None,
+                 seed: Optional[int] = None,
+                 scenario: Optional[Scenario] = None):
+        settings = DOE_SETTINGS
+        self.space = space or ParameterSpace(scenario=scenario)
+        self.initial_points = initial_points or settings['initial_points']
+        self.max_points = max_points or settings['max_points']
+        self.batch_size = batch_size or settings['batch_size']
+        self.candidate_pool = candidate_pool or settings['candidate_pool']
+        self.horizon = horizon or settings['horizon']
+        self.workers = workers or 1
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.rng = random.Random(self.seed)
+
+        self.points: List[Dict[str, float]] = []
+        self.responses: Dict[str, List[float]] = {metric: [] for metric in METRICS}
+        self.models: Dict[str, GaussianProcess] = {}
+
+    def _evaluate(self, points: List[Dict[str, float]], executor) -> None:
+        tasks = []
+        for i, point in enumerate(points):
+            params, scenario = self.space.to_task(point)
+            tasks.append((params, self.horizon, self.seed + len(self.points) + i, scenario))
+
+        mapper = executor.map if executor is not None else map
+        for point, report in zip(points, mapper(run_replication, tasks)):
+            self.points.append(point)
+            for metric, value in _metrics_from_report(report).items():
+                self.responses[metric].append(value)
+
+    def fit(self) -> None:
+        """Переобучает суррогаты по всем смоделированным точкам"""
+        x = [self.space.encode(point) for point in self.points]
+        self.models = {metric: GaussianProcess().fit(x, values) for metric, values in self.responses.items()}
+
+    def _uncertainty(self, unit: Sequence[float]) -> float:
+        """Суммарная дисперсия суррогатов в стандартизованных единицах"""
+        total = 0.0
+        for model in self.models.values():
+            _, variance = model.predict_with_variance(unit)
+            total += variance / (model.y_std * model.y_std)
+        return total
+
+    def _next_batch(self) -> List[Dict[str, float]]:
+        """Точки с наибольшей неопределенностью; в одной пачке - не ближе min_distance друг к другу"""
+        count = min(self.batch_size, self.max_points - len(self.points))
+        pool = [self.space.encode(self.space.decode(unit))
+                for unit in latin_hypercube(self.candidate_pool, self.space.dimensions, self.rng)]
+        ranked = sorted(pool, key=self._uncertainty, reverse=True)
+
+        min_distance = 0.5 / math.sqrt(len(self.points) + count)
+        chosen: List[List[float]] = []
+        for unit in ranked:
+            if all(math.dist(unit, other) >= min_distance for other in chosen):
+                chosen.append(unit)
+                if len(chosen) == count:
+                    break
+        return [self.space.decode(unit) for unit in chosen]
+
+    def run(self) -> Dict:
+        """Строит план, моделирует точки и обучает суррогаты"""
+        executor = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        try:
+            initial = [self.space.decode(unit)
+                       for unit in latin_hypercube(self.initial_points, self.space.dimensions, self.rng)]
+            self._evaluate(initial, executor)
+            self.fit()
+
+            while len(self.points) < self.max_points:
+                self._evaluate(self._next_batch(), executor)
+                self.fit()
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        return {
+            'points': len(self.points),
+            'initial_points': self.initial_points,
+            'metrics': list(METRICS),
+            'length_scales': {metric: model.length_scale for metric, model in self.models.items()}
+        }
+
+    def predict(self, point: Dict[str, float]) -> Dict[str, float]:
+        """Предсказание суррогата для набора параметров (отсутствующие - из сценария)"""
+        unit = self.space.encode(self._complete(point))
+        return {metric: model.predict(unit) for metric, model in self.models.items()}
+
+    def predict_with_uncertainty(self, point: Dict[str, float]) -> Dict[str, Tuple[float, float]]:
+        """Предсказание и его стандартное отклонение по каждому показателю"""
+        unit = self.space.encode(self._complete(point))
+        result = {}
+        for metric, model in self.models.items():
+            mean, variance = model.predict_with_variance(unit)
+            result[metric] = (mean, math.sqrt(variance))
+        return result
+
+    def _complete(self, point: Dict[str, float]) -> Dict[str, float]:
+        scenario = self.space.scenario
+        defaults = {
+            'num_doctors': scenario.num_doctors,
+            'buffer_capacity': scenario.buffer_capacity,
+            'mean_service_time': scenario.mean_service_time,
+            'emergency_probability': scenario.get_source(Priority.EMERGENCY).probability,
+            'appointment_probability': scenario.get_source(Priority.BY_APPOINTMENT).probability
+        }
+        defaults.update(point)
+        return defaults
+
+
+def _metrics_from_report(report: Dict) -> Dict[str, float]:
+    """Отклики суррогата из детального отчета репликации"""
+    system = report['system_characteristics']
+    metrics = {
+        'total_reject_rate': system['total_reject_rate'],
+        'emergency_reject_rate': 0.0,
+        'avg_wait_time': system['avg_wait_time'],
+        'walkin_wait_time': 0.0,
+        'system_utilization': system['system_utilization']
+    }
+    for source in report['sources_characteristics']:
+        if source['key'] == Priority.EMERGENCY.name:
+            metrics['emergency_reject_rate'] = source['p_reject_percent']
+        elif source['key'] == Priority.WITHOUT_APPOINTMENT.name:
+            metrics['walkin_wait_time'] = source['avg_wait_time']
+    return metrics
@@ -0,0 +1,324 @@
+import os
+import random
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Tuple
+from entities.patient import Patient
+from events.event import EVENT_KIND_PATIENT_ARRIVAL, EVENT_KIND_SERVICE_END
+from services.statistics import Statistics
+from utils.output import suppressed_output
+from config.scenario import Scenario, default_scenario
+
+
+@dataclass(frozen=True)
+class PatientRecord:
+    """Пациент в граничном состоянии сегмента"""
+    id: int
+    source_id: int
+    name: str
+    arrival_time: float
+    service_time: Optional[float]
+    service_start_time: Optional[float] = None
+    patience: Optional[float] = None
+
+
+@dataclass(frozen=True)
+class ArrivalMark:
+    """Заранее разыгранное прибытие: время, источник, время приема и терпение"""
+    patient_id: int
+    time: float
+    source_id: int
+    service_time: Optional[float]
+    patience: Optional[float] = None
+
+
+@dataclass(frozen=True)
+class SegmentState:
+    """Состояние системы на границе сегмента: содержимое буфера, занятые врачи,
+    указатель кольцевого выбора врача (Д2П2) и запланированное прибытие.
+    Прибытие - часть состояния: интервалы равномерные, и остаток до следующего
+    прибытия переносится через границу (arrival=None - прибытий больше не будет)."""
+    time: float
+    buffer: Tuple[PatientRecord, ...]
+    doctors: Tuple[Optional[Tuple[PatientRecord, float]], ...]  # (пациент, время окончания) или None
+    next_doctor_index: int = 0
+    arrival: Optional[ArrivalMark] = None
+
+    def key(self) -> tuple:
+        """Ключ сравнения состояний. Врачи сравниваются по позициям: от того, какой врач
+        занят и куда указывает кольцо, зависят дальнейшие назначения и статистика по врачам."""
+        return self.buffer, self.doctors, self.next_doctor_index, self.arrival
+
+    @classmethod
+    def empty(cls, time: float, num_doctors: int) -> 'SegmentState':
+        """Пустая система без запланированного прибытия"""
+        return cls(time=time, buffer=(), doctors=(None,) * num_doctors)
+
+
+@dataclass
+class SegmentResult:
+    """Результат прогона одного сегмента"""
+    index: int
+    start_state: SegmentState
+    end_state: SegmentState
+    statistics: Statistics
+
+
+def capture_state(core) -> SegmentState:
+    """Снимает граничное состояние с ядра симуляции"""
+    end_times: Dict[int, float] = {}
+    arrival = None
+    for event in core.event_queue:
+        if event.kind == EVENT_KIND_SERVICE_END:
+            end_times[event.doctor_id] = event.time
+        elif event.kind == EVENT_KIND_PATIENT_ARRIVAL and not event.cancelled:
+            arrival = ArrivalMark(event.patient_id, event.time, event.source_id, event.service_time, event.patience)
+
+    buffer = tuple(
+        PatientRecord(patient.id, patient.source_id, patient.name, patient.arrival_time, patient.service_time,
+                      patience=patient.patience)
+        for patient in core.waiting_room.patients
+    )
+
+    doctors = []
+    for doctor in core.doctors:
+        patient = doctor.current_patient
+        if doctor.is_busy and patient is not None:
+            record = PatientRecord(patient.id, patient.source_id, patient.name, patient.arrival_time,
+                                   patient.service_time, patient.service_start_time)
+            doctors.append((record, end_times[doctor.id]))
+        else:
+            doctors.append(None)
+
+    return SegmentState(
+        time=core.current_time,
+        buffer=buffer,
+        doctors=tuple(doctors),
+        next_doctor_index=core.dispatcher.next_doctor_index,
+        arrival=arrival
+    )
+
+
+def restore_state(core, state: SegmentState) -> None:
+    """Переносит граничное состояние в только что инициализированное ядро"""
+    core.current_time = state.time
+    core.total_simulation_time = state.time
+
+    for record in state.buffer:
+        patient = _make_patient(record, core.scenario)
+        core.waiting_room.patients.append(patient)
+        core.waiting_room.size += 1
+        # Уход из очереди планируется заново от исходного времени прибытия
+        if patient.patience is not None:
+            core.schedule_abandonment(patient)
+
+    for doctor, slot in zip(core.doctors, state.doctors):
+        if slot is None:
+            continue
+        record, end_time = slot
+        patient = _make_patient(record, core.scenario)
+        patient.doctor_id = doctor.id
+        doctor.is_busy = True
+        doctor.current_patient = patient
+        core.schedule_event(core.event_pool.service_end(time=end_time, doctor_id=doctor.id, patient_id=patient.id))
+
+    core.dispatcher.next_doctor_index = state.next_doctor_index
+
+    # Поток прибытий продолжается с запланированного прибытия, а не запускается заново
+    if state.arrival is not None:
+        mark = state.arrival
+        core.schedule_event(core.event_pool.patient_arrival(time=mark.time, patient_id=mark.patient_id,
+                                                            source_id=mark.source_id,
+                                                            service_time=mark.service_time,
+                                                            patience=mark.patience))
+        core.patient_generator.started = True
+        core.patient_generator.next_patient_id = mark.patient_id + 1
+
+
+def _make_patient(record: PatientRecord, scenario: Scenario) -> Patient:
+    patient = Patient(
+        id=record.id,
+        source_id=record.source_id,
+        name=record.name,
+        arrival_time=record.arrival_time,
+        service_time=record.service_time,
+        priority=scenario.priorities_by_source_id[record.source_id],
+        patience=record.patience
+    )
+    patient.service_start_time = record.service_start_time
+    return patient
+
+
+def draw_arrival_marks(scenario: Scenario, params: Dict, horizon: float, seed: int) -> List[ArrivalMark]:
+    """Разыгрывает метки всех прибытий горизонта, включая первое прибытие после него.
+    Поток прибытий не зависит от состояния системы, поэтому его можно разыграть
+    заранее одним проходом и раздать сегментам"""
+    from core.simulation_core import SimulationCore
+
+    marks: List[ArrivalMark] = []
+    with suppressed_output():
+        core = SimulationCore(scenario)
+        core.initialize_system(**params)
+        random.seed(seed)
+        generator = core.patient_generator
+        # Законы обслуживания по врачам запрещены (TimeParallelSimulation), поэтому законы
+        # любого врача одинаковы и время приема можно разыграть до назначения врача
+        sample_service_time = core.doctors[0].generate_service_time
+
+        time = core.current_time
+        while time < horizon:
+            arrival = generator.draw_arrival(time)
+            if arrival is None:
+                break
+            time, source_id = arrival
+            patience_law = core.patience_laws[source_id]
+            marks.append(ArrivalMark(
+                patient_id=len(marks) + 1,
+                time=time,
+                source_id=source_id,
+                service_time=sample_service_time(scenario.priorities_by_source_id[source_id]),
+                patience=patience_law.sample() if patience_law is not None else None
+            ))
+        core.close()
+    return marks
+
+
+def _simulate_segment(task) -> SegmentResult:
+    """Прогоняет один сегмент горизонта (выполняется в рабочем процессе)"""
+    from core.simulation_core import SimulationCore
+
+    index, start_state, end_time, seed, scenario, params, marks = task
+    with suppressed_output():
+        core = SimulationCore(scenario)
+        core.initialize_system(**params)
+
+        # Прибытия, времена приема и терпение берутся из меток; случайными остаются
+        # только имена пациентов, и при каждом перезапуске сегмента они одни и те же
+        random.seed(seed)
+        core.patient_generator.arrival_marks = iter(marks)
+
+        # Первый сегмент начинается с пустой системы и запускает поток с первой метки.
+        # У остальных поток уже идет: без запланированного прибытия их больше не будет
+        if index > 0:
+            restore_state(core, start_state)
+            core.patient_generator.started = True
+        core.run_until(end_time)
+        core.close()
+
+    return SegmentResult(index, start_state, capture_state(core), core.statistics)
+
+
+class TimeParallelSimulation:
+    """Параллельный по времени прогон одного длинного горизонта.
+    Поток прибытий (с временами приема и терпением) разыгрывается заранее на весь
+    горизонт. Горизонт делится на сегменты, которые моделируются одновременно в рабочих
+    процессах, начиная с предполагаемого состояния (пустая система и истинное
+    запланированное прибытие). Затем сегменты,
+    чье начальное состояние не совпало с истинным конечным состоянием предшественника,
+    перезапускаются от него (итерации в духе parareal), пока все границы не сойдутся."""
+
+    def __init__(self, horizon: float,
+                 num_doctors: Optional[int] = None,
+                 buffer_capacity: Optional[int] = None,
+                 mean_service_time: Optional[float] = None,
+                 segments: Optional[int] = None,
+                 workers: Optional[int] = None,
+                 seed: Optional[int] = None,
+                 scenario: Optional[Scenario] = None):
+        self.horizon = horizon
+        self.scenario = scenario or default_scenario()
+        if self.scenario.service_time_by_doctor:
+            # Время приема разыгрывается при генерации пациента, когда врач еще неизвестен
+            raise ValueError("Параллельный по времени прогон не поддерживает законы обслуживания "
+                             "по врачам (service_time.by_doctor)")
+        self.params = {
+            'num_doctors': num_doctors if num_doctors is not None else self.scenario.num_doctors,
+            'buffer_capacity': buffer_capacity if buffer_capacity is not None else self.scenario.buffer_capacity,
+            'mean_service_time': (mean_service_time if mean_service_time is not None
+                                  else self.scenario.mean_service_time)
+        }
+        self.workers = workers or os.cpu_count() or 1
+        self.segments = segments or self.workers
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.iterations = 0
+        self.segment_runs = 0
+        self.reruns_by_segment: List[int] = [0] * self.segments
+        self.marks: List[ArrivalMark] = []
+        self.segment_marks: List[List[ArrivalMark]] = []
+
+    def _segment_bounds(self, index: int) -> Tuple[float, float]:
+        length = self.horizon / self.segments
+        end = self.horizon if index == self.segments - 1 else (index + 1) * length
+        return index * length, end
+
+    def initial_states(self) -> List[SegmentState]:
+        """Разыгрывает метки прибытий, делит их по сегментам и возвращает начальные
+        приближения: пустая система с первым прибытием, запланированным на сегмент.
+        Сегмент получает метки после своего запланированного прибытия до запланированного
+        прибытия следующего сегмента включительно (его планирует этот сегмент)."""
+        self.marks = draw_arrival_marks(self.scenario, self.params, self.horizon, self.seed)
+        times = [mark.time for mark in self.marks]
+        # Прибытие, запланированное на начало сегмента: первое с временем >= начала
+        firsts = [bisect_left(times, self._segment_bounds(i)[0]) for i in range(self.segments)]
+
+        states = []
+        self.segment_marks = []
+        for i in range(self.segments):
+            start, _ = self._segment_bounds(i)
+            arrival = self.marks[firsts[i]] if i > 0 and firsts[i] < len(self.marks) else None
+            states.append(replace(SegmentState.empty(start, self.params['num_doctors']), arrival=arrival))
+            low = 0 if i == 0 else firsts[i] + 1
+            high = firsts[i + 1] + 1 if i + 1 < self.segments else len(self.marks)
+            self.segment_marks.append(self.marks[low:high])
+        return states
+
+    def _task(self, index: int, start_state: SegmentState):
+        _, end_time = self._segment_bounds(index)
+        return (index, start_state, end_time, self.seed + index, self.scenario, self.params,
+                self.segment_marks[index])
+
+    def run(self) -> Dict:
+        """Выполняет прогон и возвращает объединенную статистику"""
+        start_states = self.initial_states()
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            results = list(executor.map(_simulate_segment,
+                                        [self._task(i, start_states[i]) for i in range(self.segments)]))
+            self.segment_runs = self.segments
+            self.iterations = 1
+
+            while True:
+                # Сегменты, начальное состояние которых не совпало с концом предшественника
+                stale = [i for i in range(1, self.segments)
+                         if results[i - 1].end_state.key() != start_states[i].key()]
+                if not stale:
+                    break
+
+                for i in stale:
+                    start_states[i] = results[i - 1].end_state
+                    self.reruns_by_segment[i] += 1
+
+                for result in executor.map(_simulate_segment, [self._task(i, start_states[i]) for i in stale]):
+                    results[result.index] = result
+
+                self.segment_runs += len(stale)
+                self.iterations += 1
+
+        return {
+            'statistics': combine_statistics([result.statistics for result in results]),
+            'total_simulation_time': self.horizon,
+            'segments': self.segments,
+            'iterations': self.iterations,
+            'segment_runs': self.segment_runs,
+            'reruns_by_segment': list(self.reruns_by_segment),
+            'final_state': results[-1].end_state
+        }
+
+
+def combine_statistics(parts: List[Statistics]) -> Statistics:
+    """Объединяет статистику последовательных сегментов одного прогона"""
+    combined = Statistics(parts[0].scenario if parts else None)
+    for part in parts:
+        combined.merge(part)
+    return combined
@@ -1,20 +1,38 @@
-import math
-import random
 from typing import Optional
 from entities.patient import Patient
+from entities.priority import Priority
 from utils.name_generator import NameGenerator
-from config.settings import DISPLAY_SETTINGS
+from config.scenario import Scenario, default_scenario
+from services.service_time import make_service_time_law
 
 
 class Doctor:
-    """Прибор - дежурный врач, экспоненциальный закон распределения времени обслуживания"""
+    """Прибор - дежурный врач. Закон распределения времени обслуживания задается
+    сценарием (по умолчанию экспоненциальный, П31), отдельно для врача или приоритета"""
     
-    def __init__(self, doctor_id: int, mean_service_time: float):
+    def __init__(self, doctor_id: int, mean_service_time: float, scenario: Optional[Scenario] = None):
         self.id = doctor_id
         self.name = NameGenerator.get_doctor_name(doctor_id)  # Фиксированное имя врача
         self.is_busy = False
         self.current_patient: Optional[Patient] = None
+        scenario = scenario or default_scenario()
+        self.min_service_time = scenario.min_service_time
+        self.configure_service_time(mean_service_time, scenario)
+
+    def configure_service_time(self, mean_service_time: float, scenario: Scenario) -> None:
+        """Строит законы времени приема для среднего mean_service_time (следующие приемы)"""
         self.mean_service_time = mean_service_time
+
+        # Закон врача и законы по приоритетам (индекс - priority.value, None - закон врача)
+        self.service_time_law = make_service_time_law(scenario.get_service_time_spec(doctor_id=self.id),
+                                                      mean_service_time)
+        max_value = max(priority.value for priority in scenario.source_priorities)
+        self.service_time_laws_by_priority = [None] * (max_value + 1)
+        keys = {key for key, _ in scenario.service_time_by_priority}
+        for priority in scenario.source_priorities:
+            if priority.name in keys:
+                self.service_time_laws_by_priority[priority.value] = make_service_time_law(
+                    scenario.get_service_time_spec(priority=priority), mean_service_time)
     
     def get_id(self) -> int:
         return self.id
@@ -22,12 +40,12 @@ class Doctor:
     def get_current_patient(self) -> Optional[Patient]:
         return self.current_patient
     
-    def generate_service_time(self) -> float:
-        """Генерирует время обслуживания по экспоненциальному закону"""
-        u = random.random()
-        u = max(0.000001, min(0.999999, u))  # Защита от 0 и 1
-        service_time = -self.mean_service_time * math.log(1 - u)
-        return max(service_time, DISPLAY_SETTINGS['min_service_time'])
+    def generate_service_time(self, priority: Optional[Priority] = None) -> float:
+        """Генерирует время обслуживания по закону приоритета пациента или врача"""
+        law = self.service_time_law
+        if priority is not None:
+            law = self.service_time_laws_by_priority[priority.value] or law
+        return max(law.sample(), self.min_service_time)
     
     def start_service(self, patient: Patient, current_time: float) -> float:
         """Начинает обслуживание пациента"""
@@ -37,8 +55,12 @@ class Doctor:
         self.is_busy = True
         self.current_patient = patient
         patient.service_start_time = current_time
+        patient.doctor_id = self.id
         
-        service_duration = self.generate_service_time()
+        if patient.service_time is not None:
+            service_duration = patient.service_time
+        else:
+            service_duration = self.generate_service_time(patient.priority)
         service_end_time = current_time + service_duration
         
         print(f"Врач {self.name} начал прием {patient.name} в {current_time:.2f}")
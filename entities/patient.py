@@ -1,6 +1,7 @@
 from dataclasses import dataclass, field
-from typing import Optional
+from typing import Any, Optional
 from entities.priority import Priority
+from config.scenario import default_scenario
 
 @dataclass
 class Patient:
@@ -10,16 +11,16 @@ class Patient:
     arrival_time: float
     service_start_time: Optional[float] = None
     service_end_time: Optional[float] = None
-    priority: Priority = field(init=False)  # Вычисляется автоматически
+    service_time: Optional[float] = None  # Заранее разыгранное время приема (если есть)
+    doctor_id: Optional[int] = None  # Врач, принявший пациента
+    priority: Optional[Priority] = None  # Приоритет источника по сценарию
+    patience: Optional[float] = None  # Сколько пациент готов ждать в буфере (None - сколько угодно)
+    abandonment_event: Any = field(default=None, repr=False, compare=False)  # Запланированный уход
 
     def __post_init__(self):
-        """Автоматически устанавливаем приоритет на основе source_id"""
-        if self.source_id == 1:
-            self.priority = Priority.EMERGENCY
-        elif self.source_id == 2:
-            self.priority = Priority.BY_APPOINTMENT
-        else:
-            self.priority = Priority.WITHOUT_APPOINTMENT
+        """Если приоритет не передан, берем его по source_id из сценария по умолчанию"""
+        if self.priority is None:
+            self.priority = default_scenario().priorities_by_source_id[self.source_id]
 
     def __str__(self):
         return f"Пациент {self.id}: {self.name} ({str(self.priority)})"
\ No newline at end of file
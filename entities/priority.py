@@ -1,19 +1,76 @@
-from enum import Enum
+from typing import Dict, Iterator, Optional
 
 
-class Priority(Enum):
-    EMERGENCY = 1
-    BY_APPOINTMENT = 2
-    WITHOUT_APPOINTMENT = 3
+class _PriorityRegistry(type):
+    """Метакласс реестра: Priority['EMERGENCY'], перебор и __members__, как у Enum"""
+
+    def __getitem__(cls, name: str) -> 'Priority':
+        return cls._members[name]
+
+    def __iter__(cls) -> Iterator['Priority']:
+        return iter(sorted(cls._members.values()))
+
+    def __len__(cls) -> int:
+        return len(cls._members)
+
+    @property
+    def __members__(cls) -> Dict[str, 'Priority']:
+        return dict(cls._members)
+
+
+class Priority(metaclass=_PriorityRegistry):
+    """Приоритет заявки (категория пациента). Меньшее значение - более высокий приоритет (Д2Б4).
+    В реестре только три стандартные категории (заданы ниже); приоритеты сценария -
+    собственные экземпляры скомпилированного сценария, поэтому разные сценарии в одном
+    процессе могут задавать одной категории разные значения и имена.
+    Приоритеты сравниваются по имени: Priority.EMERGENCY равен категории EMERGENCY любого сценария.
+    Значения уникальны в пределах сценария (проверяется при его компиляции)."""
+
+    __slots__ = ('value', 'name', 'description')
+    _members: Dict[str, 'Priority'] = {}
+
+    def __init__(self, name: str, value: int, description: str):
+        self.name = name
+        self.value = value
+        self.description = description
+
+    @classmethod
+    def define(cls, name: str, value: int, description: Optional[str] = None) -> 'Priority':
+        """Регистрирует стандартную категорию (сценарии реестр не меняют)"""
+        existing = cls._members.get(name)
+        if existing is not None:
+            if existing.value != value:
+                raise ValueError(f"Приоритет '{name}' уже определен со значением {existing.value}")
+            return existing
+        if value < 1:
+            raise ValueError(f"Значение приоритета '{name}' должно быть положительным")
+        priority = cls(name, int(value), description or name)
+        cls._members[name] = priority
+        return priority
+
+    def __reduce__(self):
+        return Priority, (self.name, self.value, self.description)
+
+    def __eq__(self, other):
+        if not isinstance(other, Priority):
+            return NotImplemented
+        return self.name == other.name
+
+    def __hash__(self):
+        return hash(self.name)
 
     def __lt__(self, other):
         return self.value < other.value
 
+    def __repr__(self):
+        return f"<Priority.{self.name}: {self.value}>"
+
     def __str__(self):
         """Возвращает понятное строковое представление"""
-        descriptions = {
-            1: "срочно",
-            2: "по записи",
-            3: "без записи"
-        }
-        return descriptions[self.value]
\ No newline at end of file
+        return self.description
+
+
+# Стандартные категории
+Priority.EMERGENCY = Priority.define('EMERGENCY', 1, "срочно")
+Priority.BY_APPOINTMENT = Priority.define('BY_APPOINTMENT', 2, "по записи")
+Priority.WITHOUT_APPOINTMENT = Priority.define('WITHOUT_APPOINTMENT', 3, "без записи")
@@ -5,9 +5,13 @@
 from .event import Event
 from .patient_arrival_event import PatientArrivalEvent
 from .service_end_event import ServiceEndEvent
+from .abandonment_event import AbandonmentEvent
+from .event_pool import EventPool
 
 __all__ = [
     'Event',
     'PatientArrivalEvent',
-    'ServiceEndEvent'
+    'ServiceEndEvent',
+    'AbandonmentEvent',
+    'EventPool'
 ]
\ No newline at end of file
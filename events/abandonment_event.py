@@ -0,0 +1,16 @@
+from events.event import Event, EVENT_KIND_ABANDONMENT
+
+
+class AbandonmentEvent(Event):
+    """Событие ухода пациента из очереди по истечении терпения.
+    Отменяется, если пациент раньше начал прием или был вытеснен."""
+
+    __slots__ = ('patient_id',)
+    kind = EVENT_KIND_ABANDONMENT
+
+    def __init__(self, time: float, patient_id: int):
+        super().__init__(time)
+        self.patient_id = patient_id
+
+    def __str__(self) -> str:
+        return f"AbandonmentEvent(time={self.time:.2f}, patient_id={self.patient_id})"
@@ -1,26 +1,36 @@
-from abc import ABC, abstractmethod
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
     from core.simulation_core import SimulationCore
 
+# Целочисленные коды типов событий - индексы таблицы обработчиков SimulationCore
+EVENT_KIND_PATIENT_ARRIVAL = 0
+EVENT_KIND_SERVICE_END = 1
+EVENT_KIND_ABANDONMENT = 2
 
-class Event(ABC):
+
+class Event:
     """Базовый класс для всех событий в системе.
-    Реализует сравнение для работы в приоритетной очереди."""
+    События - компактные записи со __slots__ и целочисленным типом kind;
+    обработка выполняется ядром по таблице обработчиков.
+    Отмененное событие (cancelled) остается в календаре до извлечения или уплотнения
+    и пропускается без обработки (ленивое удаление)."""
+
+    __slots__ = ('time', 'event_id', 'cancelled')
+    kind = -1
 
     def __init__(self, time: float):
         self.time = time
         self.event_id = 0  # Идентификатор для разрешения коллизий времени
+        self.cancelled = False
 
     def get_time(self) -> float:
         """Возвращает время события"""
         return self.time
 
-    @abstractmethod
     def process_event(self, core: 'SimulationCore') -> None:
-        """Обрабатывает событие - реализован в подклассах"""
-        pass
+        """Обрабатывает событие через таблицу обработчиков ядра"""
+        core.event_handlers[self.kind](self)
 
     def __lt__(self, other: 'Event') -> bool:
         """Сравнение событий по времени и ID для одинаковой по приоритету очереди.
@@ -34,4 +44,4 @@ class Event(ABC):
         return f"{self.__class__.__name__}(time={self.time:.2f}, id={self.event_id})"
 
     def __repr__(self) -> str:
-        return self.__str__()
\ No newline at end of file
+        return self.__str__()
@@ -0,0 +1,79 @@
+from typing import List, Optional
+from events.event import Event
+from events.patient_arrival_event import PatientArrivalEvent
+from events.service_end_event import ServiceEndEvent
+from events.abandonment_event import AbandonmentEvent
+
+
+class EventPool:
+    """Пул (free-list) объектов событий.
+    Обработанные события возвращаются в пул и переиспользуются при планировании
+    новых, поэтому в установившемся режиме события почти не создаются заново."""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._free_arrivals: List[PatientArrivalEvent] = []
+        self._free_service_ends: List[ServiceEndEvent] = []
+        self._free_abandonments: List[AbandonmentEvent] = []
+        self.allocated = 0  # Сколько объектов создано заново
+        self.reused = 0  # Сколько объектов взято из пула
+
+    def patient_arrival(self, time: float, patient_id: int, source_id: int,
+                        service_time: Optional[float] = None,
+                        patience: Optional[float] = None) -> PatientArrivalEvent:
+        """Возвращает событие прибытия (из пула или новое)"""
+        if self._free_arrivals:
+            event = self._free_arrivals.pop()
+            event.time = time
+            event.event_id = 0
+            event.cancelled = False
+            event.patient_id = patient_id
+            event.source_id = source_id
+            event.service_time = service_time
+            event.patience = patience
+            self.reused += 1
+            return event
+        self.allocated += 1
+        return PatientArrivalEvent(time, patient_id, source_id, service_time, patience)
+
+    def service_end(self, time: float, doctor_id: int, patient_id: int) -> ServiceEndEvent:
+        """Возвращает событие окончания обслуживания (из пула или новое)"""
+        if self._free_service_ends:
+            event = self._free_service_ends.pop()
+            event.time = time
+            event.event_id = 0
+            event.cancelled = False
+            event.doctor_id = doctor_id
+            event.patient_id = patient_id
+            self.reused += 1
+            return event
+        self.allocated += 1
+        return ServiceEndEvent(time, doctor_id, patient_id)
+
+    def abandonment(self, time: float, patient_id: int) -> AbandonmentEvent:
+        """Возвращает событие ухода из очереди (из пула или новое)"""
+        if self._free_abandonments:
+            event = self._free_abandonments.pop()
+            event.time = time
+            event.event_id = 0
+            event.cancelled = False
+            event.patient_id = patient_id
+            self.reused += 1
+            return event
+        self.allocated += 1
+        return AbandonmentEvent(time, patient_id)
+
+    def release(self, event: Event) -> None:
+        """Возвращает обработанное событие в пул"""
+        if type(event) is PatientArrivalEvent:
+            if len(self._free_arrivals) < self.max_size:
+                self._free_arrivals.append(event)
+        elif type(event) is ServiceEndEvent:
+            if len(self._free_service_ends) < self.max_size:
+                self._free_service_ends.append(event)
+        elif type(event) is AbandonmentEvent:
+            if len(self._free_abandonments) < self.max_size:
+                self._free_abandonments.append(event)
+
+    def __len__(self) -> int:
+        return len(self._free_arrivals) + len(self._free_service_ends) + len(self._free_abandonments)
@@ -1,45 +1,20 @@
-from typing import TYPE_CHECKING
-from events.event import Event
-
-if TYPE_CHECKING:
-    from core.simulation_core import SimulationCore
+from typing import Optional
+from events.event import Event, EVENT_KIND_PATIENT_ARRIVAL
 
 
 class PatientArrivalEvent(Event):
     """Событие прибытия нового пациента."""
 
-    def __init__(self, time: float, patient_id: int, source_id: int):
+    __slots__ = ('patient_id', 'source_id', 'service_time', 'patience')
+    kind = EVENT_KIND_PATIENT_ARRIVAL
+
+    def __init__(self, time: float, patient_id: int, source_id: int,
+                 service_time: Optional[float] = None, patience: Optional[float] = None):
         super().__init__(time)
         self.patient_id = patient_id
         self.source_id = source_id
-
-    def process_event(self, core: 'SimulationCore') -> None:
-        """Обрабатывает прибытие пациента"""
-        # Создаем пациента с использованием общего NameGenerator
-        from entities.patient import Patient
-        from utils.name_generator import NameGenerator
-
-        patient = Patient(
-            id=self.patient_id,
-            source_id=self.source_id,
-            arrival_time=self.time,
-            name=NameGenerator.generate_patient_name()
-        )
-
-        if not core.step_by_step:
-            print(f"Время {self.time:.2f}: Обработка прибытия пациента - {patient}")
-
-        # Регистрируем в статистике
-        core.statistics.record_patient_arrival(patient)
-
-        # Передаем диспетчеру
-        success = core.dispatcher.on_patient_arrival(patient, self.time)
-
-        if not success and not core.step_by_step:
-            print(f"Пациенту {patient.name} отказано в обслуживании")
-
-        # Планируем следующее прибытие
-        core.schedule_next_arrival()
+        self.service_time = service_time  # Заранее разыгранное время приема (если есть)
+        self.patience = patience  # Заранее разыгранное терпение (если есть)
 
     def __str__(self) -> str:
-        return f"PatientArrivalEvent(time={self.time:.2f}, patient_id={self.patient_id}, source_id={self.source_id})"
\ No newline at end of file
+        return f"PatientArrivalEvent(time={self.time:.2f}, patient_id={self.patient_id}, source_id={self.source_id})"
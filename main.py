@@ -1,6 +1,20 @@
 import sys
 import argparse
+from typing import Optional
 from core.simulation_core import SimulationCore
+from core.time_parallel import TimeParallelSimulation
+from core.splitting import SplittingEstimator
+from core.optimizer import StaffingOptimizer
+from utils.output import suppressed_output
+from config.scenario import Scenario, load_scenario
+from config.settings import TIME_PARALLEL_SETTINGS
+
+# Параметры командной строки по умолчанию (если не заданы ни в аргументах, ни в сценарии)
+CLI_DEFAULTS = {
+    'doctors': 3,
+    'buffer': 2,
+    'service_time': 35.0
+}
 
 
 def print_intro():
@@ -25,11 +39,15 @@ def print_intro():
 - ТОЛЬКО ПОШАГОВЫЙ РЕЖИМ: подробное отображение каждого события
 - Введите любой символ для перехода к следующему шагу
 - Введите 'q' для выхода и просмотра итоговой статистики
+- Перемотка без отображения: 'n N' (N событий), 't T' (до времени T),
+  'c' (до точки останова); точки останова: 'b full', 'b reject EMERGENCY', 'b patient N'
 """
     print(intro_text)
 
 
-def run_simulation(num_doctors: int, buffer_capacity: int, mean_service_time: float):
+def run_simulation(num_doctors: int, buffer_capacity: int, mean_service_time: float,
+                   state_port: Optional[int] = None, scenario: Optional[Scenario] = None,
+                   batch_events: bool = False):
     """Запускает симуляцию с заданными параметрами БЕЗ ограничения по времени"""
     print(f"ЗАПУСК СИМУЛЯЦИИ С ПАРАМЕТРАМИ:")
     print(f" - Количество врачей: {num_doctors}")
@@ -38,14 +56,18 @@ def run_simulation(num_doctors: int, buffer_capacity: int, mean_service_time: fl
     print(f" - Режим: ПОШАГОВЫЙ (без ограничения времени)")
     print()
 
+    simulation = None
     try:
         # Создаем и инициализируем систему
-        simulation = SimulationCore()
-        simulation.initialize_system(num_doctors=num_doctors, buffer_capacity=buffer_capacity)
+        simulation = SimulationCore(scenario)
+        simulation.initialize_system(num_doctors=num_doctors, buffer_capacity=buffer_capacity,
+                                     mean_service_time=mean_service_time)
+        if batch_events:
+            simulation.batch_same_time = True
 
-        # Настраиваем среднее время обслуживания врачей
-        for doctor in simulation.doctors:
-            doctor.mean_service_time = mean_service_time
+        # Эндпоинт состояния для внешних дашбордов
+        if state_port is not None:
+            simulation.enable_state_endpoint(port=state_port)
 
         # Запускаем симуляцию (БЕЗ ограничения по времени)
         simulation.run()
@@ -57,6 +79,157 @@ def run_simulation(num_doctors: int, buffer_capacity: int, mean_service_time: fl
         import traceback
         traceback.print_exc()
         return None
+    finally:
+        # Журнал поступлений и эндпоинт состояния; статистика остается доступной
+        if simulation is not None:
+            simulation.close()
+
+
+def run_time_parallel(num_doctors: int, buffer_capacity: int, mean_service_time: float,
+                      horizon: float, workers: Optional[int], scenario: Optional[Scenario] = None):
+    """Пакетный параллельный по времени прогон одного длинного горизонта"""
+    print(f"ПАРАЛЛЕЛЬНЫЙ ПО ВРЕМЕНИ ПРОГОН: горизонт {horizon:.0f} мин")
+
+    try:
+        result = TimeParallelSimulation(
+            horizon=horizon,
+            num_doctors=num_doctors,
+            buffer_capacity=buffer_capacity,
+            mean_service_time=mean_service_time,
+            workers=workers,
+            scenario=scenario
+        ).run()
+    except Exception as e:
+        print(f"!!! ОШИБКА ПРИ ЗАПУСКЕ СИМУЛЯЦИИ: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+    stats = result['statistics']
+    print(f" - Сегментов: {result['segments']}, итераций: {result['iterations']}, "
+          f"прогонов сегментов: {result['segment_runs']}")
+    print(f" - Прибыло: {stats.total_patients_arrived}, обслужено: {stats.total_patients_served}, "
+          f"отказов: {stats.total_patients_rejected} ({stats.get_rejection_rate():.2f}%)")
+    print(f" - Среднее время ожидания: {stats.get_average_wait_time():.2f} мин")
+    return result
+
+
+def run_splitting(num_doctors: int, buffer_capacity: int, mean_service_time: float,
+                  scenario: Optional[Scenario] = None):
+    """Оценка редкой вероятности отказа неотложным пациентам расщеплением траекторий"""
+    print("ОЦЕНКА ВЕРОЯТНОСТИ ОТКАЗА НЕОТЛОЖНЫМ (РАСЩЕПЛЕНИЕ ТРАЕКТОРИЙ)")
+
+    try:
+        result = SplittingEstimator(
+            num_doctors=num_doctors,
+            buffer_capacity=buffer_capacity,
+            mean_service_time=mean_service_time,
+            scenario=scenario
+        ).run()
+    except Exception as e:
+        print(f"!!! ОШИБКА ПРИ ЗАПУСКЕ СИМУЛЯЦИИ: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+    low, high = result['confidence_interval']
+    print(f" - Уровни важности: {result['levels']}")
+    print(f" - Вероятности перехода между уровнями: "
+          f"{', '.join(f'{p:.4f}' for p in result['level_probabilities'])}")
+    print(f" - P(отказа): {result['p_reject']:.3e}, доверительный интервал [{low:.3e}; {high:.3e}], "
+          f"относительная полуширина {result['relative_half_width'] * 100:.1f}%")
+    print(f" - Повторений: {result['replications']}, обработано событий: {result['events_processed']}")
+    return result
+
+
+def run_optimizer(max_emergency_reject: float, max_walkin_wait: float, mean_service_time: float,
+                  workers: Optional[int], scenario: Optional[Scenario] = None):
+    """Подбор минимального штата при ограничениях на отказы неотложным и ожидание без записи"""
+    print(f"ПОДБОР ШТАТА: отказов неотложным <= {max_emergency_reject}%, "
+          f"ожидание без записи <= {max_walkin_wait} мин")
+
+    try:
+        result = StaffingOptimizer(
+            max_emergency_reject=max_emergency_reject,
+            max_walkin_wait=max_walkin_wait,
+            mean_service_time=mean_service_time,
+            workers=workers,
+            scenario=scenario
+        ).run()
+    except Exception as e:
+        print(f"!!! ОШИБКА ПРИ ЗАПУСКЕ СИМУЛЯЦИИ: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+    print(f" - Репликаций: {result['total_replications']}, просмотрено конфигураций: "
+          f"{len(result['candidates'])} из {result['grid_size']}")
+    best = result['recommended']
+    if best is None:
+        print(" - Допустимая конфигурация не найдена")
+        return result
+
+    print(f" - Рекомендуется: врачей {best['num_doctors']}, мест в буфере {best['buffer_capacity']} "
+          f"(достоверность {result['confidence'] * 100:.1f}%)")
+    print(f" - Отказов неотложным: {best['emergency_reject_rate']:.2f} ± {best['emergency_reject_half_width']:.2f}%")
+    print(f" - Ожидание без записи: {best['walkin_wait_time']:.2f} ± {best['walkin_wait_half_width']:.2f} мин")
+    return result
+
+
+def run_memory_profile(num_doctors: int, buffer_capacity: int, mean_service_time: float,
+                       horizon: float, interval: float, scenario: Optional[Scenario] = None):
+    """Безэкранный длинный прогон с профилированием памяти"""
+    print(f"ПРОФИЛИРОВАНИЕ ПАМЯТИ: горизонт {horizon:.0f} мин, снимок каждые {interval:.0f} мин")
+
+    simulation = None
+    try:
+        with suppressed_output():
+            simulation = SimulationCore(scenario)
+            simulation.initialize_system(num_doctors=num_doctors, buffer_capacity=buffer_capacity,
+                                         mean_service_time=mean_service_time)
+        tracker = simulation.enable_memory_tracking(interval)
+        simulation.run_until(horizon)
+        tracker.take_snapshot(simulation)
+        tracker.stop()
+    except Exception as e:
+        print(f"!!! ОШИБКА ПРИ ЗАПУСКЕ СИМУЛЯЦИИ: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+    finally:
+        if simulation is not None:
+            simulation.close()
+
+    print(tracker.format_report())
+    return tracker.get_report()
+
+
+def run_sensitivity(num_doctors: int, buffer_capacity: int, mean_service_time: float,
+                    horizon: float, scenario: Optional[Scenario] = None):
+    """Безэкранный прогон с оценками чувствительности (IPA и LR) по тому же прогону"""
+    print(f"ОЦЕНКИ ЧУВСТВИТЕЛЬНОСТИ: горизонт {horizon:.0f} мин")
+
+    simulation = None
+    try:
+        with suppressed_output():
+            simulation = SimulationCore(scenario)
+            simulation.initialize_system(num_doctors=num_doctors, buffer_capacity=buffer_capacity,
+                                         mean_service_time=mean_service_time)
+        estimator = simulation.enable_sensitivity()
+        simulation.run_until(horizon)
+    except Exception as e:
+        print(f"!!! ОШИБКА ПРИ ЗАПУСКЕ СИМУЛЯЦИИ: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+    finally:
+        if simulation is not None:
+            simulation.close()
+
+    print(f"Среднее время ожидания: {simulation.statistics.get_average_wait_time():.2f} мин, "
+          f"отказов: {simulation.statistics.get_rejection_rate():.2f}%")
+    print(estimator)
+    return estimator.get_estimates()
 
 
 def main():
@@ -69,24 +242,95 @@ def main():
     parser.add_argument(
         '-d', '--doctors',
         type=int,
-        default=3,
+        default=None,
         help="Количество врачей"
     )
 
     parser.add_argument(
         '-b', '--buffer',
         type=int,
-        default=2,
+        default=None,
         help="Вместимость буфера ожидания"
     )
 
     parser.add_argument(
         '-s', '--service-time',
         type=float,
-        default=35.0,
+        default=None,
         help="Среднее время приема у врача в минутах"
     )
 
+    parser.add_argument(
+        '--scenario',
+        type=str,
+        default=None,
+        help="Файл сценария (JSON или TOML); аргументы командной строки имеют приоритет"
+    )
+
+    parser.add_argument(
+        '--state-port',
+        type=int,
+        default=None,
+        help="Порт локального HTTP/JSON эндпоинта состояния (/state, /delta?since=V)"
+    )
+
+    parser.add_argument(
+        '--batch-events',
+        action='store_true',
+        help="Обрабатывать события с одинаковым временем одним шагом (один проход диспетчера)"
+    )
+
+    parser.add_argument(
+        '--time-parallel',
+        type=float,
+        default=None,
+        metavar='HORIZON',
+        help="Пакетный параллельный по времени прогон на заданный горизонт (мин)"
+    )
+
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help="Количество рабочих процессов для параллельного прогона"
+    )
+
+    parser.add_argument(
+        '--splitting',
+        action='store_true',
+        help="Оценить вероятность отказа неотложным пациентам расщеплением траекторий"
+    )
+
+    parser.add_argument(
+        '--optimize',
+        type=float,
+        nargs=2,
+        default=None,
+        metavar=('MAX_EMERGENCY_REJECT', 'MAX_WALKIN_WAIT'),
+        help="Подобрать минимальный штат: допустимый %% отказов неотложным и ожидание без записи (мин)"
+    )
+
+    parser.add_argument(
+        '--memory-profile',
+        type=float,
+        default=None,
+        metavar='INTERVAL',
+        help="Безэкранный прогон с профилированием памяти: снимок каждые INTERVAL мин модельного времени"
+    )
+
+    parser.add_argument(
+        '--sensitivity',
+        action='store_true',
+        help="Безэкранный прогон на --horizon с производными ожидания и отказов по параметрам"
+    )
+
+    parser.add_argument(
+        '--horizon',
+        type=float,
+        default=TIME_PARALLEL_SETTINGS['default_horizon'],
+        help="Горизонт безэкранного прогона, мин"
+    )
+
     parser.add_argument(
         '--no-welcome',
         action='store_true',
@@ -96,6 +340,26 @@ def main():
     # Парсим аргументы командной строки
     args = parser.parse_args()
 
+    # Сценарий и недостающие параметры
+    scenario = None
+    if args.scenario:
+        try:
+            scenario = load_scenario(args.scenario)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ошибка: Не удалось загрузить сценарий {args.scenario}: {e}")
+            sys.exit(1)
+        scenario_values = {
+            'doctors': scenario.num_doctors,
+            'buffer': scenario.buffer_capacity,
+            'service_time': scenario.mean_service_time
+        }
+    else:
+        scenario_values = CLI_DEFAULTS
+
+    for name, value in scenario_values.items():
+        if getattr(args, name) is None:
+            setattr(args, name, value)
+
     # Проверяем валидность параметров
     if args.doctors <= 0:
         print("Ошибка: Количество врачей должно быть положительным числом")
@@ -110,6 +374,57 @@ def main():
         sys.exit(1)
 
 
+    if args.time_parallel is not None:
+        result = run_time_parallel(
+            num_doctors=args.doctors,
+            buffer_capacity=args.buffer,
+            mean_service_time=args.service_time,
+            horizon=args.time_parallel,
+            workers=args.workers,
+            scenario=scenario
+        )
+        sys.exit(0 if result else 1)
+
+    if args.memory_profile is not None:
+        result = run_memory_profile(
+            num_doctors=args.doctors,
+            buffer_capacity=args.buffer,
+            mean_service_time=args.service_time,
+            horizon=args.horizon,
+            interval=args.memory_profile,
+            scenario=scenario
+        )
+        sys.exit(0 if result else 1)
+
+    if args.sensitivity:
+        result = run_sensitivity(
+            num_doctors=args.doctors,
+            buffer_capacity=args.buffer,
+            mean_service_time=args.service_time,
+            horizon=args.horizon,
+            scenario=scenario
+        )
+        sys.exit(0 if result else 1)
+
+    if args.optimize is not None:
+        result = run_optimizer(
+            max_emergency_reject=args.optimize[0],
+            max_walkin_wait=args.optimize[1],
+            mean_service_time=args.service_time,
+            workers=args.workers,
+            scenario=scenario
+        )
+        sys.exit(0 if result else 1)
+
+    if args.splitting:
+        result = run_splitting(
+            num_doctors=args.doctors,
+            buffer_capacity=args.buffer,
+            mean_service_time=args.service_time,
+            scenario=scenario
+        )
+        sys.exit(0 if result else 1)
+
     if not args.no_welcome:
         print_intro()
 
@@ -117,7 +432,10 @@ def main():
     simulation = run_simulation(
         num_doctors=args.doctors,
         buffer_capacity=args.buffer,
-        mean_service_time=args.service_time
+        mean_service_time=args.service_time,
+        state_port=args.state_port,
+        scenario=scenario,
+        batch_events=args.batch_events
     )
 
     # Завершаем работу
@@ -2,7 +2,6 @@ from typing import List, Optional
 from entities.doctor import Doctor
 from entities.patient import Patient
 from services.waiting_room import WaitingRoom
-from events.service_end_event import ServiceEndEvent
 
 
 class Dispatcher:
@@ -13,6 +12,9 @@ class Dispatcher:
         self.waiting_room = waiting_room
         self.simulation_core = simulation_core
         self.next_doctor_index = 0  # для кольцевого выбора (Д2П2)
+        self.drain_all = simulation_core.scenario.drain_all
+        self.deferred = False  # Пакетная обработка событий: назначение откладывается до flush()
+        self.dispatch_pending = False
 
     def on_patient_arrival(self, patient: Patient, current_time: float) -> bool:
         """Обработка новоприбывшего пациента"""
@@ -28,10 +30,15 @@ class Dispatcher:
             else:
                 # Пациент добавлен с вытеснением - регистрируем отказ для вытесненного
                 print(f"!!! {patient.name} вытеснил {rejected_patient.name} из буфера")
-                self.simulation_core.statistics.record_patient_rejection(rejected_patient)
+                self._cancel_abandonment(rejected_patient)
+                self.simulation_core.statistics.record_patient_rejection(rejected_patient, displaced_by=patient)
 
             # После добавления в буфер пытаемся сразу назначить на обслуживание
-            self._try_assign_patient_from_buffer(current_time)
+            self.request_dispatch(current_time)
+
+            # Если пациент остался ждать, планируем его уход по истечении терпения
+            if patient.patience is not None and patient.service_start_time is None:
+                self.simulation_core.schedule_abandonment(patient)
             return True
         else:
             # Доп обработка - по логике не должно произойти
@@ -42,22 +49,51 @@ class Dispatcher:
     def on_doctor_became_free(self, doctor_id: int, current_time: float) -> None:
         """Вызывается когда врач освободился"""
         print(f"Время {current_time:.2f}: Врач {doctor_id} освободился")
-        self._try_assign_patient_from_buffer(current_time)
+        self.request_dispatch(current_time)
 
-    def _try_assign_patient_from_buffer(self, current_time: float) -> None:
+    def request_dispatch(self, current_time: float) -> None:
+        """Проход диспетчера сейчас или, при пакетной обработке, при следующем flush()"""
+        if self.deferred:
+            self.dispatch_pending = True
+        else:
+            self.dispatch(current_time)
+
+    def flush(self, current_time: float) -> int:
+        """Выполняет отложенный проход диспетчера, если он был запрошен"""
+        if not self.dispatch_pending:
+            return 0
+        self.dispatch_pending = False
+        return self.dispatch(current_time)
+
+    def dispatch(self, current_time: float) -> int:
+        """Проход диспетчера: назначает пациентов из буфера свободным врачам, пока не кончатся
+        свободные врачи или ожидающие пациенты (по одному назначению, если drain_all выключен).
+        Каждое назначение - по Д2Б4 и Д2П2, как и одиночное; указатель кольца сдвигается
+        так же, как при одиночном назначении. Возвращает число назначенных пациентов."""
+        assigned = 0
+        while self._try_assign_patient_from_buffer(current_time):
+            assigned += 1
+            if not self.drain_all or self.waiting_room.is_empty():
+                break
+        return assigned
+
+    def _try_assign_patient_from_buffer(self, current_time: float) -> bool:
         """Пытается назначить пациента из буфера свободному врачу.
-        Выбирает пациента по высшему приоритету и врача по Д2П2 (кольцевой)."""
+        Выбирает пациента по высшему приоритету и врача по Д2П2 (кольцевой).
+        Возвращает True, если пациент назначен."""
         # Ищем свободного врача
         free_doctor = self._find_free_doctor()
         if free_doctor is None:
             print("Нет свободных врачей - пациенты продолжают ждать")
-            return
+            return False
 
         # Выбираем пациента с высшим приоритетом из буфера
         next_patient = self.waiting_room.get_next_patient()
         if next_patient is None:
             print("В зоне ожидания нет пациентов")
-            return
+            return False
+
+        self._cancel_abandonment(next_patient)
 
         # Назначаем пациента врачу
         try:
@@ -67,7 +103,7 @@ class Dispatcher:
             self.simulation_core.statistics.record_service_start(next_patient)
 
             # Создаем событие окончания обслуживания
-            service_end_event = ServiceEndEvent(
+            service_end_event = self.simulation_core.event_pool.service_end(
                 time=service_end_time,
                 doctor_id=free_doctor.id,
                 patient_id=next_patient.id
@@ -75,11 +111,19 @@ class Dispatcher:
             self.simulation_core.schedule_event(service_end_event)
 
             print(f"Назначен {next_patient.name} врачу {free_doctor.name}")
+            return True
 
         except Exception as e:
             print(f"!!! Ошибка при назначении пациента: {e}")
             # Если не удалось назначить, возвращаем пациента в буфер
             self.waiting_room.add_patient(next_patient)
+            return False
+
+    def _cancel_abandonment(self, patient: Patient) -> None:
+        """Отменяет запланированный уход пациента, покинувшего буфер иначе"""
+        if patient.abandonment_event is not None:
+            self.simulation_core.cancel_event(patient.abandonment_event)
+            patient.abandonment_event = None
 
     def _find_free_doctor(self) -> Optional[Doctor]:
         """Находит свободного врача по кольцевому алгоритму"""
@@ -0,0 +1,153 @@
+import math
+import struct
+from array import array
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+from config.settings import HISTOGRAM_SETTINGS
+
+# Упаковка: параметры, число значений, сумма, min, max, число непустых интервалов;
+# затем пары (индекс интервала, счетчик)
+_HEADER_FORMAT = struct.Struct('<ddBqdddI')
+_BUCKET_FORMAT = struct.Struct('<Iq')
+
+
+class LogLinearHistogram:
+    """Гистограмма с лог-линейными интервалами (в духе HDR Histogram).
+    Значения переводятся в целые единицы unit; до 2^bits единиц интервалы линейные,
+    дальше на каждое удвоение приходится 2^(bits-1) равных подынтервалов.
+    Запись - O(1), память фиксирована, относительная погрешность процентилей
+    не больше 2 / 2^bits. Гистограммы с одинаковыми параметрами складываются."""
+
+    def __init__(self, unit: Optional[float] = None, max_value: Optional[float] = None,
+                 sub_bucket_bits: Optional[int] = None):
+        settings = HISTOGRAM_SETTINGS
+        self.unit = unit or settings['unit']
+        self.max_value = max_value or settings['max_value']
+        self.sub_bucket_bits = sub_bucket_bits or settings['sub_bucket_bits']
+
+        self._sub_buckets = 1 << self.sub_bucket_bits
+        self._half = self._sub_buckets >> 1
+        self._max_scaled = int(self.max_value / self.unit)
+        self.counts = array('q', bytes(8 * (self._index(self._max_scaled) + 1)))
+
+        self.total_count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def _index(self, scaled: int) -> int:
+        if scaled < self._sub_buckets:
+            return scaled
+        shift = scaled.bit_length() - self.sub_bucket_bits
+        return self._sub_buckets + (shift - 1) * self._half + (scaled >> shift) - self._half
+
+    def _bounds(self, index: int):
+        """Границы интервала [нижняя, верхняя) в единицах unit"""
+        if index < self._sub_buckets:
+            return index, index + 1
+        shift = (index - self._sub_buckets) // self._half + 1
+        mantissa = (index - self._sub_buckets) % self._half + self._half
+        return mantissa << shift, (mantissa + 1) << shift
+
+    def record(self, value: float) -> None:
+        """Добавляет значение (отрицательные считаются нулем)"""
+        if value < 0:
+            value = 0.0
+        scaled = int(value / self.unit)
+        if scaled > self._max_scaled:
+            scaled = self._max_scaled
+        self.counts[self._index(scaled)] += 1
+        self.total_count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def record_all(self, values: Iterable[float]) -> None:
+        for value in values:
+            self.record(value)
+
+    def get_mean(self) -> float:
+        return self.total / self.total_count if self.total_count else 0.0
+
+    def get_percentile(self, percentile: float) -> float:
+        """Значение процентиля (середина интервала, ограниченная наблюденными min и max;
+        для первого интервала - ноль)"""
+        return self.get_percentiles((percentile,))[percentile]
+
+    def get_percentiles(self, percentiles: Optional[Sequence[float]] = None) -> Dict[float, float]:
+        """Несколько процентилей за один проход"""
+        percentiles = sorted(percentiles or HISTOGRAM_SETTINGS['percentiles'])
+        result = {percentile: 0.0 for percentile in percentiles}
+        if self.total_count == 0:
+            return result
+
+        # Ранг процентиля - ближайший сверху (nearest rank)
+        targets = [min(self.total_count, max(1, math.ceil(p / 100.0 * self.total_count - 1e-9)))
+                   for p in percentiles]
+        running = 0
+        position = 0
+        for index, count in enumerate(self.counts):
+            if not count:
+                continue
+            running += count
+            while position < len(targets) and running >= targets[position]:
+                low, high = self._bounds(index)
+                value = (low + high) / 2 * self.unit if index else 0.0
+                result[percentiles[position]] = min(max(value, self.min), self.max)
+                position += 1
+            if position == len(targets):
+                break
+        return result
+
+    def merge(self, other: 'LogLinearHistogram') -> 'LogLinearHistogram':
+        """Добавляет к гистограмме другую с теми же параметрами (например, другой репликации)"""
+        if (other.unit, other._max_scaled, other.sub_bucket_bits) != (self.unit, self._max_scaled,
+                                                                      self.sub_bucket_bits):
+            raise ValueError("Нельзя объединить гистограммы с разными параметрами")
+        counts = self.counts
+        for index, count in enumerate(other.counts):
+            if count:
+                counts[index] += count
+        self.total_count += other.total_count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def __add__(self, other: 'LogLinearHistogram') -> 'LogLinearHistogram':
+        result = LogLinearHistogram(self.unit, self.max_value, self.sub_bucket_bits)
+        return result.merge(self).merge(other)
+
+    def pack(self) -> bytes:
+        """Компактный вид: только непустые интервалы (размер ограничен числом интервалов,
+        а не числом значений)"""
+        buckets = [(index, count) for index, count in enumerate(self.counts) if count]
+        parts = [_HEADER_FORMAT.pack(self.unit, self.max_value, self.sub_bucket_bits, self.total_count,
+                                     self.total, self.min, self.max, len(buckets))]
+        parts.extend(_BUCKET_FORMAT.pack(index, count) for index, count in buckets)
+        return b"".join(parts)
+
+    @classmethod
+    def unpack_from(cls, data: bytes, offset: int = 0) -> Tuple['LogLinearHistogram', int]:
+        """Восстанавливает гистограмму из pack(); возвращает ее и смещение за ней"""
+        unit, max_value, bits, total_count, total, low, high, buckets = _HEADER_FORMAT.unpack_from(data, offset)
+        offset += _HEADER_FORMAT.size
+        histogram = cls(unit, max_value, bits)
+        histogram.total_count = total_count
+        histogram.total = total
+        histogram.min = low
+        histogram.max = high
+        for _ in range(buckets):
+            index, count = _BUCKET_FORMAT.unpack_from(data, offset)
+            offset += _BUCKET_FORMAT.size
+            histogram.counts[index] = count
+        return histogram, offset
+
+    def __len__(self) -> int:
+        return self.total_count
+
+    def __str__(self) -> str:
+        percentiles = self.get_percentiles()
+        described = ", ".join(f"p{percentile:g}={value:.2f}" for percentile, value in percentiles.items())
+        return f"LogLinearHistogram(n={self.total_count}, {described})"
@@ -0,0 +1,150 @@
+import os
+import sys
+import tracemalloc
+from typing import Dict, List, Optional, Tuple
+from config.settings import MEMORY_PROFILE_SETTINGS
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def peak_rss() -> Optional[int]:
+    """Пиковый размер резидентной памяти процесса в байтах (None, если недоступен)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # В Linux - килобайты
+
+
+class MemoryTracker:
+    """Наблюдатель ядра для поиска роста памяти в длинных прогонах (включается явно).
+    Каждые interval_minutes модельного времени снимает снимок tracemalloc, раскладывает
+    выделенную память по подсистемам проекта и запоминает пиковый RSS и размеры
+    коллекций, подозреваемых в росте. В конце сравнивает последний снимок с первым
+    и выдает места наибольшего роста."""
+
+    def __init__(self, interval_minutes: Optional[float] = None, top_sites: Optional[int] = None,
+                 frames: Optional[int] = None):
+        settings = MEMORY_PROFILE_SETTINGS
+        self.interval = interval_minutes or settings['interval_minutes']
+        self.top_sites = top_sites or settings['top_sites']
+        self.frames = frames or settings['frames']
+        self.subsystems = [(name, os.path.join(PROJECT_ROOT, os.path.normpath(path)))
+                           for name, path in settings['subsystems']]
+        self.next_snapshot_time = 0.0
+        self.samples: List[Dict] = []
+        self._first: Optional[tracemalloc.Snapshot] = None
+        self._last: Optional[tracemalloc.Snapshot] = None
+        self._started_tracing = False
+
+    def start(self) -> None:
+        """Включает трассировку выделений (если она еще не включена)"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracing = True
+
+    def stop(self) -> None:
+        """Выключает трассировку, если ее включал этот наблюдатель"""
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def on_event(self, core) -> None:
+        """Вызывается ядром после каждого обработанного события"""
+        if core.current_time >= self.next_snapshot_time:
+            self.take_snapshot(core)
+            self.next_snapshot_time = core.current_time + self.interval
+
+    def _subsystem(self, filename: str) -> str:
+        for name, prefix in self.subsystems:
+            if filename.startswith(prefix):
+                return name
+        return 'project' if filename.startswith(PROJECT_ROOT) else 'other'
+
+    def take_snapshot(self, core) -> Dict:
+        """Снимок памяти и размеров коллекций в текущий момент модельного времени"""
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__)
+        ))
+        if self._first is None:
+            self._first = snapshot
+        self._last = snapshot
+
+        by_subsystem: Dict[str, int] = {}
+        for stat in snapshot.statistics('filename'):
+            name = self._subsystem(stat.traceback[0].filename)
+            by_subsystem[name] = by_subsystem.get(name, 0) + stat.size
+
+        current, peak = tracemalloc.get_traced_memory()
+        sample = {
+            'time': core.current_time,
+            'events_processed': core.processed_events,
+            'traced_bytes': current,
+            'traced_peak_bytes': peak,
+            'peak_rss_bytes': peak_rss(),
+            'by_subsystem': by_subsystem,
+            'objects': {
+                'event_queue': len(core.event_queue),
+                'event_pool': len(core.event_pool),
+                'waiting_room': len(core.waiting_room.patients)
+            }
+        }
+        self.samples.append(sample)
+        return sample
+
+    def top_growth(self) -> List[Tuple[str, int, int]]:
+        """Места наибольшего роста между первым и последним снимком: (место, рост байт, рост блоков)"""
+        if self._first is None or self._last is None or self._first is self._last:
+            return []
+        sites = []
+        for stat in self._last.compare_to(self._first, 'lineno')[:self.top_sites]:
+            frame = stat.traceback[0]
+            filename = os.path.relpath(frame.filename, PROJECT_ROOT) \
+                if frame.filename.startswith(PROJECT_ROOT) else frame.filename
+            sites.append((f"{filename}:{frame.lineno}", stat.size_diff, stat.count_diff))
+        return sites
+
+    def get_report(self) -> Dict:
+        """Итоговый отчет: ряд снимков, рост по подсистемам и места наибольшего роста"""
+        growth: Dict[str, int] = {}
+        if self.samples:
+            first, last = self.samples[0]['by_subsystem'], self.samples[-1]['by_subsystem']
+            for name in set(first) | set(last):
+                growth[name] = last.get(name, 0) - first.get(name, 0)
+        return {
+            'samples': self.samples,
+            'subsystem_growth': dict(sorted(growth.items(), key=lambda item: -item[1])),
+            'top_growth_sites': self.top_growth(),
+            'peak_rss_bytes': peak_rss()
+        }
+
+    def format_report(self) -> str:
+        """Текстовый отчет для вывода в консоль"""
+        report = self.get_report()
+        lines = ["=== ПРОФИЛЬ ПАМЯТИ ===",
+                 f"{'Время, мин':>12} {'Событий':>10} {'Отслежено, КБ':>14} {'Пик RSS, МБ':>12} "
+                 f"{'Календарь':>10} {'Пул событий':>12} {'Буфер':>6}"]
+        for sample in report['samples']:
+            rss = sample['peak_rss_bytes']
+            objects = sample['objects']
+            lines.append(f"{sample['time']:>12.0f} {sample['events_processed']:>10} "
+                         f"{sample['traced_bytes'] / 1024:>14.1f} "
+                         f"{(rss / 2 ** 20 if rss is not None else float('nan')):>12.1f} "
+                         f"{objects['event_queue']:>10} {objects['event_pool']:>12} "
+                         f"{objects['waiting_room']:>6}")
+
+        lines.append("")
+        lines.append("Рост по подсистемам (КБ):")
+        for name, size in report['subsystem_growth'].items():
+            lines.append(f" {name:<15} {size / 1024:>+12.1f}")
+
+        lines.append("")
+        lines.append("Места наибольшего роста:")
+        for site, size, count in report['top_growth_sites']:
+            lines.append(f" {site:<50} {size / 1024:>+10.1f} КБ {count:>+8} блоков")
+        return "\n".join(lines)
@@ -0,0 +1,70 @@
+import math
+import struct
+from typing import Iterable
+
+# Упаковка: число наблюдений, среднее, сумма квадратов отклонений
+_MOMENTS_FORMAT = struct.Struct('<qdd')
+
+
+class RunningMoments:
+    """Среднее и дисперсия потока значений за O(1) памяти (алгоритм Уэлфорда).
+    Два накопителя объединяются параллельной формулой Чана и др., поэтому
+    частичные результаты реплик или сегментов складываются в любом порядке."""
+
+    __slots__ = ('count', 'mean', 'm2')
+    size = _MOMENTS_FORMAT.size  # Байт в упакованном виде
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2  # Сумма квадратов отклонений от среднего
+
+    def record(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def record_all(self, values: Iterable[float]) -> None:
+        for value in values:
+            self.record(value)
+
+    @property
+    def variance(self) -> float:
+        """Несмещенная выборочная дисперсия"""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        variance = self.variance
+        return math.sqrt(variance) if variance > 0 else 0.0
+
+    def merge(self, other: 'RunningMoments') -> 'RunningMoments':
+        """Добавляет к накопителю другой (параллельная формула Уэлфорда)"""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        return self
+
+    def __add__(self, other: 'RunningMoments') -> 'RunningMoments':
+        return RunningMoments(self.count, self.mean, self.m2).merge(other)
+
+    def pack(self) -> bytes:
+        return _MOMENTS_FORMAT.pack(self.count, self.mean, self.m2)
+
+    @classmethod
+    def unpack_from(cls, data: bytes, offset: int) -> 'RunningMoments':
+        return cls(*_MOMENTS_FORMAT.unpack_from(data, offset))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __str__(self) -> str:
+        return f"RunningMoments(n={self.count}, mean={self.mean:.4f}, std={self.std:.4f})"
@@ -0,0 +1,177 @@
+import ast
+import csv
+import os
+import struct
+import sys
+import zipfile
+from array import array
+from typing import Optional
+from entities.patient import Patient
+from services.statistics import StatisticsListener
+from config.settings import PATIENT_EXPORT_SETTINGS
+
+# Коды исхода пациента
+OUTCOME_SERVED = 0
+OUTCOME_DISPLACED = 1  # Вытеснен из буфера (Д1О4)
+OUTCOME_REJECTED = 2  # Отказ без вытеснения
+OUTCOME_ABANDONED = 3  # Ушел из очереди, не дождавшись приема
+OUTCOME_BALKED = 4  # Не встал в очередь из-за ее длины
+
+OUTCOME_NAMES = {
+    OUTCOME_SERVED: 'served',
+    OUTCOME_DISPLACED: 'displaced',
+    OUTCOME_REJECTED: 'rejected',
+    OUTCOME_ABANDONED: 'abandoned',
+    OUTCOME_BALKED: 'balked'
+}
+
+# Колонки записи: имя, код типа array, dtype numpy для NPZ
+COLUMNS = (
+    ('patient_id', 'q', 'i8'),
+    ('source_id', 'i', 'i4'),
+    ('arrival_time', 'd', 'f8'),
+    ('service_start_time', 'd', 'f8'),
+    ('service_end_time', 'd', 'f8'),
+    ('doctor_id', 'i', 'i4'),
+    ('displaced_by', 'q', 'i8'),
+    ('outcome', 'b', 'i1')
+)
+
+NAN = float('nan')
+
+
+class PatientRecordExporter(StatisticsListener):
+    """Потоковая выгрузка исходов пациентов (прибытие, начало и конец приема, врач,
+    кем вытеснен, исход). Записи копятся в предвыделенных колонках фиксированного
+    размера и сбрасываются крупными блоками в CSV или сжатые NPZ-чанки,
+    поэтому расход памяти не зависит от длины прогона."""
+
+    def __init__(self, path: str, file_format: str = 'csv', buffer_size: Optional[int] = None):
+        if file_format not in ('csv', 'npz'):
+            raise ValueError(f"Неизвестный формат выгрузки: {file_format}")
+
+        self.path = path
+        self.file_format = file_format
+        self.buffer_size = buffer_size or PATIENT_EXPORT_SETTINGS['buffer_size']
+        self.columns = [array(typecode, bytes(array(typecode).itemsize * self.buffer_size))
+                        for _, typecode, _ in COLUMNS]
+        self.count = 0  # Заполнено записей в буфере
+        self.total_written = 0
+        self.chunks_written = 0
+        self._csv_file = None
+        self._csv_writer = None
+
+    def on_service_end(self, patient: Patient) -> None:
+        self._append(patient, OUTCOME_SERVED, None)
+
+    def on_patient_rejection(self, patient: Patient, displaced_by: Optional[Patient]) -> None:
+        outcome = OUTCOME_DISPLACED if displaced_by is not None else OUTCOME_REJECTED
+        self._append(patient, outcome, displaced_by)
+
+    def on_patient_abandonment(self, patient: Patient) -> None:
+        self._append(patient, OUTCOME_ABANDONED, None)
+
+    def on_patient_balking(self, patient: Patient) -> None:
+        self._append(patient, OUTCOME_BALKED, None)
+
+    def _append(self, patient: Patient, outcome: int, displaced_by: Optional[Patient]) -> None:
+        i = self.count
+        (ids, sources, arrivals, starts, ends, doctors, displaced, outcomes) = self.columns
+        ids[i] = patient.id
+        sources[i] = patient.source_id
+        arrivals[i] = patient.arrival_time
+        starts[i] = patient.service_start_time if patient.service_start_time is not None else NAN
+        ends[i] = patient.service_end_time if patient.service_end_time is not None else NAN
+        doctors[i] = patient.doctor_id if patient.doctor_id is not None else -1
+        displaced[i] = displaced_by.id if displaced_by is not None else -1
+        outcomes[i] = outcome
+
+        self.count = i + 1
+        if self.count == self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Сбрасывает накопленный блок записей на диск"""
+        if self.count == 0:
+            return
+        if self.file_format == 'csv':
+            self._flush_csv()
+        else:
+            self._flush_npz()
+        self.total_written += self.count
+        self.chunks_written += 1
+        self.count = 0
+
+    def _flush_csv(self) -> None:
+        if self._csv_file is None:
+            self._csv_file = open(self.path, 'w', newline='', encoding='utf-8')
+            self._csv_writer = csv.writer(self._csv_file)
+            self._csv_writer.writerow([name for name, _, _ in COLUMNS])
+
+        n = self.count
+        (ids, sources, arrivals, starts, ends, doctors, displaced, outcomes) = self.columns
+        self._csv_writer.writerows(
+            (ids[i], sources[i], arrivals[i],
+             '' if starts[i] != starts[i] else starts[i],  # NaN -> пустое поле
+             '' if ends[i] != ends[i] else ends[i],
+             '' if doctors[i] < 0 else doctors[i],
+             '' if displaced[i] < 0 else displaced[i],
+             OUTCOME_NAMES[outcomes[i]])
+            for i in range(n)
+        )
+        self._csv_file.flush()
+
+    def _flush_npz(self) -> None:
+        """Пишет блок как NPZ (zip из .npy), совместимый с numpy.load, без зависимости от numpy"""
+        base, _ = os.path.splitext(self.path)
+        chunk_path = f"{base}_{self.chunks_written:05d}.npz"
+        byte_order = '<' if sys.byteorder == 'little' else '>'
+
+        with zipfile.ZipFile(chunk_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for (name, _, dtype), column in zip(COLUMNS, self.columns):
+                descr = '|' + dtype if dtype == 'i1' else byte_order + dtype
+                header = repr({'descr': descr, 'fortran_order': False, 'shape': (self.count,)})
+                archive.writestr(f"{name}.npy", _npy_header(header) + column[:self.count].tobytes())
+
+    def close(self) -> None:
+        """Сбрасывает остаток буфера и закрывает файл"""
+        self.flush()
+        if self._csv_file is not None:
+            self._csv_file.close()
+            self._csv_file = None
+
+    def __enter__(self) -> 'PatientRecordExporter':
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self.close()
+
+    def __str__(self) -> str:
+        return (f"PatientRecordExporter({self.path}, {self.file_format}, "
+                f"written={self.total_written}, buffered={self.count})")
+
+
+def _npy_header(header: str) -> bytes:
+    """Заголовок формата .npy версии 1.0 с выравниванием данных на 64 байта"""
+    prefix_length = 10  # magic(6) + версия(2) + длина заголовка(2)
+    padding = 64 - (prefix_length + len(header) + 1) % 64
+    header_bytes = (header + ' ' * padding + '\n').encode('latin1')
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header_bytes)) + header_bytes
+
+
+def read_npz_chunk(path: str) -> dict:
+    """Читает NPZ-чанк выгрузки в словарь колонок array (без numpy)"""
+    typecodes = {name: typecode for name, typecode, _ in COLUMNS}
+    native_order = '<' if sys.byteorder == 'little' else '>'
+    result = {}
+    with zipfile.ZipFile(path) as archive:
+        for name, typecode in typecodes.items():
+            data = archive.read(f"{name}.npy")
+            header_length = struct.unpack('<H', data[8:10])[0]
+            header = ast.literal_eval(data[10:10 + header_length].decode('latin1'))
+            column = array(typecode)
+            column.frombytes(data[10 + header_length:])
+            if header['descr'][0] not in (native_order, '|'):
+                column.byteswap()
+            result[name] = column
+    return result
@@ -0,0 +1,201 @@
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+from entities.priority import Priority
+from config.settings import RESULTS_STORE_SETTINGS
+
+
+class ResultsStore:
+    """Хранилище результатов прогонов и репликаций в SQLite.
+    Прогоны копятся в памяти и записываются пачками в одной транзакции;
+    база работает в режиме WAL, поэтому много рабочих процессов могут
+    дописывать в один файл без постоянной борьбы за блокировку."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS runs (
+            run_id INTEGER PRIMARY KEY,
+            created_at REAL NOT NULL,
+            label TEXT,
+            scenario TEXT,
+            seed INTEGER,
+            replication INTEGER,
+            num_doctors INTEGER NOT NULL,
+            buffer_capacity INTEGER NOT NULL,
+            mean_service_time REAL NOT NULL,
+            total_simulation_time REAL NOT NULL,
+            total_arrived INTEGER NOT NULL,
+            total_served INTEGER NOT NULL,
+            total_rejected INTEGER NOT NULL,
+            reject_rate REAL NOT NULL,
+            emergency_reject_rate REAL NOT NULL,
+            avg_wait_time REAL NOT NULL,
+            avg_service_time REAL NOT NULL,
+            system_utilization REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS run_sources (
+            run_id INTEGER NOT NULL REFERENCES runs(run_id),
+            source_id INTEGER NOT NULL,
+            priority TEXT NOT NULL,
+            total_arrived INTEGER NOT NULL,
+            total_served INTEGER NOT NULL,
+            total_rejected INTEGER NOT NULL,
+            p_reject REAL NOT NULL,
+            avg_total_time REAL NOT NULL,
+            avg_wait_time REAL NOT NULL,
+            avg_service_time REAL NOT NULL,
+            variance_wait REAL NOT NULL,
+            variance_service REAL NOT NULL,
+            ci_low REAL NOT NULL,
+            ci_high REAL NOT NULL,
+            required_n INTEGER NOT NULL,
+            PRIMARY KEY (run_id, source_id)
+        );
+        CREATE TABLE IF NOT EXISTS run_doctors (
+            run_id INTEGER NOT NULL REFERENCES runs(run_id),
+            doctor_id INTEGER NOT NULL,
+            served_count INTEGER NOT NULL,
+            total_service_time REAL NOT NULL,
+            utilization_percent REAL NOT NULL,
+            PRIMARY KEY (run_id, doctor_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_runs_buffer_emergency
+            ON runs (buffer_capacity, emergency_reject_rate);
+        CREATE INDEX IF NOT EXISTS idx_runs_configuration
+            ON runs (num_doctors, buffer_capacity, mean_service_time);
+        CREATE INDEX IF NOT EXISTS idx_run_sources_reject
+            ON run_sources (source_id, p_reject);
+    """
+
+    RUN_COLUMNS = ('created_at', 'label', 'scenario', 'seed', 'replication',
+                   'num_doctors', 'buffer_capacity', 'mean_service_time', 'total_simulation_time',
+                   'total_arrived', 'total_served', 'total_rejected', 'reject_rate',
+                   'emergency_reject_rate', 'avg_wait_time', 'avg_service_time', 'system_utilization')
+
+    def __init__(self, path: str, batch_size: Optional[int] = None, busy_timeout: Optional[float] = None):
+        self.path = path
+        self.batch_size = batch_size or RESULTS_STORE_SETTINGS['batch_size']
+        timeout = busy_timeout if busy_timeout is not None else RESULTS_STORE_SETTINGS['busy_timeout']
+
+        # Транзакциями управляем сами (isolation_level=None)
+        self.connection = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(f"PRAGMA busy_timeout={int(timeout * 1000)}")
+        self.connection.executescript(self.SCHEMA)
+
+        self._pending: List[Tuple[tuple, List[tuple], List[tuple]]] = []
+
+    def add_run(self, core, seed: Optional[int] = None, replication: Optional[int] = None,
+                label: Optional[str] = None) -> None:
+        """Добавляет завершенный прогон SimulationCore в очередь на запись"""
+        report = core.statistics.generate_detailed_report(core.total_simulation_time, len(core.doctors))
+        mean_service_time = core.doctors[0].mean_service_time if core.doctors else 0.0
+        self.add_report(report,
+                        num_doctors=len(core.doctors),
+                        buffer_capacity=core.waiting_room.capacity,
+                        mean_service_time=mean_service_time,
+                        scenario=core.scenario.name,
+                        seed=seed, replication=replication, label=label)
+
+    def add_report(self, report: Dict, num_doctors: int, buffer_capacity: int, mean_service_time: float,
+                   scenario: Optional[str] = None, seed: Optional[int] = None,
+                   replication: Optional[int] = None, label: Optional[str] = None) -> None:
+        """Добавляет результат generate_detailed_report() в очередь на запись"""
+        system = report['system_characteristics']
+        sources = report['sources_characteristics']
+
+        emergency_reject_rate = 0.0
+        for source in sources:
+            if source['key'] == Priority.EMERGENCY.name:
+                emergency_reject_rate = source['p_reject_percent']
+
+        run_row = (time.time(), label, scenario, seed, replication,
+                   num_doctors, buffer_capacity, mean_service_time, system['total_simulation_time'],
+                   system['total_patients_arrived'], system['total_patients_served'],
+                   system['total_patients_rejected'], system['total_reject_rate'],
+                   emergency_reject_rate, system['avg_wait_time'], system['avg_service_time'],
+                   system['system_utilization'])
+
+        source_rows = [(source['source_id'], source['priority'], source['total_arrived'],
+                        source['total_served'], source['total_rejected'], source['p_reject'],
+                        source['avg_total_time'], source['avg_wait_time'], source['avg_service_time'],
+                        source['variance_wait'], source['variance_service'],
+                        source['confidence_interval'][0], source['confidence_interval'][1],
+                        source['required_n_for_accuracy'])
+                       for source in sources]
+
+        doctor_rows = [(doctor_id, doctor['served_count'], doctor['total_service_time'],
+                        doctor['utilization_percent'])
+                       for doctor_id, doctor in system['doctors_utilization'].items()]
+
+        self._pending.append((run_row, source_rows, doctor_rows))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Записывает накопленные прогоны одной транзакцией"""
+        if not self._pending:
+            return
+
+        run_sql = (f"INSERT INTO runs ({', '.join(self.RUN_COLUMNS)}) "
+                   f"VALUES ({', '.join('?' * len(self.RUN_COLUMNS))})")
+        source_sql = "INSERT INTO run_sources VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+        doctor_sql = "INSERT INTO run_doctors VALUES (?, ?, ?, ?, ?)"
+
+        cursor = self.connection.cursor()
+        # BEGIN IMMEDIATE сразу берет блокировку записи: ожидание идет в busy_timeout,
+        # а не откатом посреди транзакции
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            for run_row, source_rows, doctor_rows in self._pending:
+                cursor.execute(run_sql, run_row)
+                run_id = cursor.lastrowid
+                cursor.executemany(source_sql, [(run_id,) + row for row in source_rows])
+                cursor.executemany(doctor_sql, [(run_id,) + row for row in doctor_rows])
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        self._pending = []
+
+    def runs_by_buffer(self, buffer_capacity: int, limit: Optional[int] = None) -> List[Dict]:
+        """Все прогоны с заданной вместимостью буфера по убыванию доли отказов неотложных"""
+        sql = ("SELECT * FROM runs WHERE buffer_capacity = ? "
+               "ORDER BY emergency_reject_rate DESC")
+        params: tuple = (buffer_capacity,)
+        if limit is not None:
+            sql += " LIMIT ?"
+            params += (limit,)
+        return self.query(sql, params)
+
+    def runs_by_configuration(self, num_doctors: int, buffer_capacity: int) -> List[Dict]:
+        """Все прогоны (репликации) заданной конфигурации"""
+        return self.query("SELECT * FROM runs WHERE num_doctors = ? AND buffer_capacity = ? "
+                          "ORDER BY run_id", (num_doctors, buffer_capacity))
+
+    def get_run_sources(self, run_id: int) -> List[Dict]:
+        """Характеристики источников прогона"""
+        return self.query("SELECT * FROM run_sources WHERE run_id = ? ORDER BY source_id", (run_id,))
+
+    def get_run_doctors(self, run_id: int) -> List[Dict]:
+        """Загрузка врачей прогона"""
+        return self.query("SELECT * FROM run_doctors WHERE run_id = ? ORDER BY doctor_id", (run_id,))
+
+    def query(self, sql: str, params: tuple = ()) -> List[Dict]:
+        """Выполняет произвольный запрос на чтение"""
+        return [dict(row) for row in self.connection.execute(sql, params)]
+
+    def close(self) -> None:
+        """Дописывает очередь и закрывает соединение"""
+        self.flush()
+        self.connection.close()
+
+    def __enter__(self) -> 'ResultsStore':
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self.close()
+
+    def __str__(self) -> str:
+        return f"ResultsStore({self.path}, pending={len(self._pending)})"
@@ -0,0 +1,249 @@
+"""Оценки чувствительности по одному прогону: производные среднего времени ожидания
+(и вероятности отказа) по параметрам модели со стандартными ошибками.
+
+- Анализ бесконечно малых возмущений (IPA) - по среднему времени приема (масштаб
+  закона обслуживания) и по границам интервалов прибытия И32: производные моментов
+  прибытия, начала и окончания приема переносятся вдоль траектории.
+- Отношение правдоподобия (LR, функция вклада) - по вероятностям выбора источника:
+  ожидание и отказ взвешиваются накопленной функцией вклада розыгрышей источников.
+  Для границ равномерного закона LR неприменим (от них зависит носитель), поэтому для них IPA.
+
+Стандартные ошибки - по циклам регенерации: прибытие в пустую систему начинает новый
+цикл (интервалы И32 и выбор источника независимы от прошлого), функция вклада и производные
+прибытий в этот момент обнуляются. Для отношения сумм по циклам применяется дельта-метод,
+поэтому память не зависит от длины прогона."""
+
+import math
+from typing import Dict, List, Optional, Tuple
+from entities.patient import Patient
+from services.statistics import StatisticsListener
+
+# Законы, у которых среднее время приема - масштабный параметр (если среднее не задано явно)
+SCALED_LAWS = ('exponential', 'erlang', 'lognormal', 'hyperexponential')
+
+
+class _CycleRatio:
+    """Оценка (ΣA - c·ΣB) / ΣD по циклам регенерации и ее стандартная ошибка.
+    Константа c (оценка самого показателя) известна только в конце прогона,
+    поэтому копятся суммы значений и попарных произведений по циклам."""
+
+    __slots__ = ('a', 'b', 'd', 'aa', 'bb', 'dd', 'ab', 'ad', 'bd')
+
+    def __init__(self):
+        self.a = self.b = self.d = 0.0
+        self.aa = self.bb = self.dd = self.ab = self.ad = self.bd = 0.0
+
+    def add(self, a: float, b: float, d: float) -> None:
+        self.a += a
+        self.b += b
+        self.d += d
+        self.aa += a * a
+        self.bb += b * b
+        self.dd += d * d
+        self.ab += a * b
+        self.ad += a * d
+        self.bd += b * d
+
+    def estimate(self, c: float = 0.0) -> Tuple[float, float]:
+        """Производная и ее стандартная ошибка (дельта-метод по циклам)"""
+        if self.d <= 0:
+            return 0.0, 0.0
+        g = (self.a - c * self.b) / self.d
+        zz = self.aa - 2 * c * self.ab + c * c * self.bb
+        zd = self.ad - c * self.bd
+        variance = zz - 2 * g * zd + g * g * self.dd
+        return g, math.sqrt(max(variance, 0.0)) / self.d
+
+
+class SensitivityEstimator(StatisticsListener):
+    """Подписчик статистики, оценивающий производные по ходу обычного прогона"""
+
+    def __init__(self, core):
+        self.core = core
+        scenario = core.scenario
+        self.min_service_time = scenario.min_service_time
+
+        # IPA: индекс 0 - среднее время приема, далее границы интервалов по источникам
+        self.ipa_names: List[str] = ['mean_service_time']
+        self.interval_params: List[Optional[Tuple[int, int, float, float]]] = [None] * (max(scenario.source_ids) + 1)
+        # LR: вероятности источников; score_by_source[source_id] - вклад выбора этого источника
+        self.lr_names: List[str] = []
+        lr_sources = []
+        if not scenario.arrival_profile_path and not scenario.arrival_trace_path:
+            for source in scenario.sources:
+                low = len(self.ipa_names)
+                self.ipa_names.extend([f"min_interval[{source.key}]", f"max_interval[{source.key}]"])
+                self.interval_params[source.source_id] = (low, low + 1, source.min_interval,
+                                                          source.max_interval - source.min_interval)
+                if source.probability > 0:
+                    self.lr_names.append(f"probability[{source.key}]")
+                    lr_sources.append(source)
+        # d log p_i / d p_k = [i = k] / p_k - 1 (остальные веса неизменны, сумма весов 1)
+        self.score_by_source: List[List[float]] = [[0.0] * len(lr_sources)
+                                                   for _ in range(len(self.interval_params))]
+        for source in scenario.sources:
+            self.score_by_source[source.source_id] = [
+                (1.0 / other.probability if other is source else 0.0) - 1.0 for other in lr_sources
+            ]
+
+        # Масштабируется ли время приема врача doctor_id у пациента source_id средним временем приема
+        self.mean_service_time = {doctor.id: doctor.mean_service_time for doctor in core.doctors}
+        self.scaled: Dict[int, List[bool]] = {}
+        for doctor in core.doctors:
+            row = [False] * len(self.interval_params)
+            for source in scenario.sources:
+                spec = scenario.get_service_time_spec(doctor_id=doctor.id, priority=source.priority)
+                law = spec.get('law', 'exponential')
+                row[source.source_id] = (law in SCALED_LAWS and 'mean' not in spec and
+                                         not (law == 'hyperexponential' and 'means' in spec))
+            self.scaled[doctor.id] = row
+
+        # Состояние траектории: производные прибытий, начала и окончания приема врачей
+        ipa_count = len(self.ipa_names)
+        self.last_arrival_time = core.current_time
+        self.arrival_derivative = [0.0] * ipa_count
+        self.patient_derivatives: Dict[int, List[float]] = {}
+        self.start_derivatives: Dict[int, List[float]] = {}
+        self.end_derivatives: Dict[int, List[float]] = {doctor.id: [0.0] * ipa_count for doctor in core.doctors}
+        self.score = [0.0] * len(self.lr_names)
+
+        # Суммы текущего цикла
+        self._reset_cycle()
+        self.cycles = 0
+        self.total_served = 0
+        self.total_wait = 0.0
+        self.total_arrived = 0
+        self.total_rejected = 0
+
+        # Суммы по циклам
+        self.ipa_wait = [_CycleRatio() for _ in self.ipa_names]
+        self.lr_wait = [_CycleRatio() for _ in self.lr_names]
+        self.lr_reject = [_CycleRatio() for _ in self.lr_names]
+
+    def _reset_cycle(self) -> None:
+        self.cycle_served = 0
+        self.cycle_arrived = 0
+        self.cycle_wait_derivative = [0.0] * len(self.ipa_names)
+        self.cycle_wait_score = [0.0] * len(self.lr_names)
+        self.cycle_served_score = [0.0] * len(self.lr_names)
+        self.cycle_rejected_score = [0.0] * len(self.lr_names)
+        self.cycle_arrived_score = [0.0] * len(self.lr_names)
+
+    def _close_cycle(self) -> None:
+        """Переносит суммы завершенного цикла в оценки"""
+        if self.cycle_arrived == 0:
+            return
+        self.cycles += 1
+        served = self.cycle_served
+        for ratio, derivative in zip(self.ipa_wait, self.cycle_wait_derivative):
+            ratio.add(derivative, 0.0, served)
+        for index in range(len(self.lr_names)):
+            self.lr_wait[index].add(self.cycle_wait_score[index], self.cycle_served_score[index], served)
+            self.lr_reject[index].add(self.cycle_rejected_score[index], self.cycle_arrived_score[index],
+                                      self.cycle_arrived)
+        self._reset_cycle()
+
+    def _system_empty(self) -> bool:
+        core = self.core
+        if not core.waiting_room.is_empty():
+            return False
+        return not any(doctor.is_busy for doctor in core.doctors)
+
+    def on_patient_arrival(self, patient: Patient) -> None:
+        # Прибытие в пустую систему - регенерация: новый цикл, вклад и производные с нуля
+        if self._system_empty():
+            self._close_cycle()
+            self.arrival_derivative = [0.0] * len(self.ipa_names)
+            self.score = [0.0] * len(self.lr_names)
+        else:
+            # IPA: интервал X = min + ширина * U источника пациента
+            params = self.interval_params[patient.source_id]
+            if params is not None:
+                low_index, high_index, low, width = params
+                fraction = (patient.arrival_time - self.last_arrival_time - low) / width if width > 0 else 0.0
+                self.arrival_derivative[low_index] += 1.0 - fraction
+                self.arrival_derivative[high_index] += fraction
+        self.last_arrival_time = patient.arrival_time
+        self.patient_derivatives[patient.id] = list(self.arrival_derivative)
+
+        # LR: вклад выбора источника
+        score = self.score
+        for index, value in enumerate(self.score_by_source[patient.source_id]):
+            score[index] += value
+        self.cycle_arrived += 1
+        self.total_arrived += 1
+        for index, value in enumerate(score):
+            self.cycle_arrived_score[index] += value
+
+    def on_service_start(self, patient: Patient) -> None:
+        arrival_derivative = self.patient_derivatives.pop(patient.id, None)
+        if arrival_derivative is None:
+            return
+        # Сразу к врачу - начало сдвигается вместе с прибытием, иначе - с окончанием приема врача
+        if patient.service_start_time == patient.arrival_time:
+            start_derivative = arrival_derivative
+        else:
+            start_derivative = self.end_derivatives[patient.doctor_id]
+        self.start_derivatives[patient.doctor_id] = start_derivative
+
+        wait = patient.service_start_time - patient.arrival_time
+        self.cycle_served += 1
+        self.total_served += 1
+        self.total_wait += wait
+        derivative = self.cycle_wait_derivative
+        for index, (start, arrival) in enumerate(zip(start_derivative, arrival_derivative)):
+            derivative[index] += start - arrival
+        for index, value in enumerate(self.score):
+            self.cycle_wait_score[index] += wait * value
+            self.cycle_served_score[index] += value
+
+    def on_service_end(self, patient: Patient) -> None:
+        doctor_id = patient.doctor_id
+        end_derivative = list(self.start_derivatives.pop(doctor_id, self.end_derivatives[doctor_id]))
+        duration = patient.service_end_time - patient.service_start_time
+        if self.scaled[doctor_id][patient.source_id] and duration > self.min_service_time:
+            end_derivative[0] += duration / self.mean_service_time[doctor_id]
+        self.end_derivatives[doctor_id] = end_derivative
+
+    def on_patient_rejection(self, patient: Patient, displaced_by: Optional[Patient]) -> None:
+        self.patient_derivatives.pop(patient.id, None)
+        self.total_rejected += 1
+        for index, value in enumerate(self.score):
+            self.cycle_rejected_score[index] += value
+
+    def on_patient_abandonment(self, patient: Patient) -> None:
+        self.patient_derivatives.pop(patient.id, None)
+
+    def on_patient_balking(self, patient: Patient) -> None:
+        self.patient_derivatives.pop(patient.id, None)
+
+    def get_estimates(self) -> List[Dict]:
+        """Оценки: параметр, метод, показатель и его значение, производная и стандартная ошибка.
+        Незавершенный последний цикл учитывается как полный."""
+        self._close_cycle()
+        mean_wait = self.total_wait / self.total_served if self.total_served else 0.0
+        p_reject = self.total_rejected / self.total_arrived if self.total_arrived else 0.0
+
+        rows = []
+        for name, ratio in zip(self.ipa_names, self.ipa_wait):
+            derivative, error = ratio.estimate()
+            rows.append(self._row(name, 'IPA', 'avg_wait_time', mean_wait, derivative, error))
+        for name, wait, reject in zip(self.lr_names, self.lr_wait, self.lr_reject):
+            derivative, error = wait.estimate(mean_wait)
+            rows.append(self._row(name, 'LR', 'avg_wait_time', mean_wait, derivative, error))
+            derivative, error = reject.estimate(p_reject)
+            rows.append(self._row(name, 'LR', 'p_reject', p_reject, derivative, error))
+        return rows
+
+    def _row(self, parameter: str, method: str, metric: str, value: float,
+             derivative: float, error: float) -> Dict:
+        return {'parameter': parameter, 'method': method, 'metric': metric, 'value': value,
+                'derivative': derivative, 'std_error': error, 'cycles': self.cycles}
+
+    def __str__(self) -> str:
+        lines = [f"{'Параметр':<36} {'Метод':<6} {'Показатель':<15} {'Производная':>12} {'Ст. ошибка':>12}"]
+        for row in self.get_estimates():
+            lines.append(f"{row['parameter']:<36} {row['method']:<6} {row['metric']:<15} "
+                         f"{row['derivative']:>12.4f} {row['std_error']:>12.4f}")
+        lines.append(f"Циклов регенерации: {self.cycles}")
+        return "\n".join(lines)
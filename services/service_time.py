@@ -0,0 +1,193 @@
+"""Законы распределения времени обслуживания (приема у врача).
+Закон задается словарем вида {'law': 'lognormal', 'mean': 15.0, 'cv': 0.8};
+если среднее не указано, берется среднее время приема врача.
+Дискретные и эмпирические законы разыгрываются за O(1) по заранее
+построенным таблицам (alias-таблица Уолкера, таблица обратной функции распределения)."""
+
+import csv
+import math
+import random
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Sequence, Tuple
+from config.settings import SERVICE_TIME_SETTINGS
+from utils.alias_table import AliasTable
+
+
+class ServiceTimeLaw(ABC):
+    """Закон распределения времени обслуживания"""
+    name = ''
+
+    def __init__(self, mean: float):
+        if mean <= 0:
+            raise ValueError(f"Среднее время закона '{self.name}' должно быть положительным")
+        self.mean = mean
+
+    @abstractmethod
+    def sample(self) -> float:
+        """Разыгрывает одно время обслуживания"""
+
+    def __str__(self) -> str:
+        return f"{self.name}(mean={self.mean:.2f})"
+
+
+class ExponentialLaw(ServiceTimeLaw):
+    """Экспоненциальный закон (П31) - тот же розыгрыш, что и прежде у врача"""
+    name = 'exponential'
+
+    def sample(self) -> float:
+        u = random.random()
+        u = max(0.000001, min(0.999999, u))  # Защита от 0 и 1
+        return -self.mean * math.log(1 - u)
+
+
+class ErlangLaw(ServiceTimeLaw):
+    """Закон Эрланга порядка k: сумма k экспоненциальных фаз (один логарифм на розыгрыш)"""
+    name = 'erlang'
+
+    def __init__(self, mean: float, k: int = 2):
+        super().__init__(mean)
+        if int(k) < 1:
+            raise ValueError("Порядок закона Эрланга k должен быть не меньше 1")
+        self.k = int(k)
+
+    def sample(self) -> float:
+        product = 1.0
+        for _ in range(self.k):
+            product *= 1.0 - random.random()
+        return -self.mean / self.k * math.log(max(product, 1e-300))
+
+    def __str__(self) -> str:
+        return f"{self.name}(mean={self.mean:.2f}, k={self.k})"
+
+
+class LognormalLaw(ServiceTimeLaw):
+    """Логнормальный закон, задается средним и коэффициентом вариации cv"""
+    name = 'lognormal'
+
+    def __init__(self, mean: float, cv: float = 1.0):
+        super().__init__(mean)
+        if cv <= 0:
+            raise ValueError("Коэффициент вариации логнормального закона должен быть положительным")
+        self.cv = cv
+        self.sigma = math.sqrt(math.log(1.0 + cv * cv))
+        self.mu = math.log(mean) - self.sigma * self.sigma / 2
+
+    def sample(self) -> float:
+        return random.lognormvariate(self.mu, self.sigma)
+
+    def __str__(self) -> str:
+        return f"{self.name}(mean={self.mean:.2f}, cv={self.cv:.2f})"
+
+
+class HyperexponentialLaw(ServiceTimeLaw):
+    """Гиперэкспоненциальный закон: смесь экспонент, ветвь выбирается по alias-таблице.
+    probabilities - веса ветвей (нормируются к единице);
+    means - средние ветвей; если не заданы, ветви с долями средних ratios от общего среднего"""
+    name = 'hyperexponential'
+
+    def __init__(self, mean: float, probabilities: Sequence[float] = (0.5, 0.5),
+                 means: Optional[Sequence[float]] = None, ratios: Sequence[float] = (0.5, 1.5)):
+        if not probabilities or min(probabilities) < 0 or sum(probabilities) <= 0:
+            raise ValueError("Веса ветвей должны быть неотрицательными с положительной суммой")
+        total = float(sum(probabilities))
+        probabilities = [p / total for p in probabilities]
+        if means is None:
+            if len(ratios) != len(probabilities):
+                raise ValueError("Число ratios должно совпадать с числом ветвей")
+            scale = mean / sum(p * r for p, r in zip(probabilities, ratios))
+            means = [ratio * scale for ratio in ratios]
+        if len(means) != len(probabilities) or min(means) <= 0:
+            raise ValueError("Средние ветвей должны быть положительными, по одному на ветвь")
+        super().__init__(sum(p * m for p, m in zip(probabilities, means)))
+        self.branches = AliasTable(probabilities)
+        self.means = tuple(float(value) for value in means)
+
+    def sample(self) -> float:
+        return -self.means[self.branches.sample()] * math.log(1.0 - random.random())
+
+    def __str__(self) -> str:
+        return f"{self.name}(mean={self.mean:.2f}, branches={len(self.means)})"
+
+
+class DiscreteLaw(ServiceTimeLaw):
+    """Дискретный закон: значения values с весами weights (alias-таблица)"""
+    name = 'discrete'
+
+    def __init__(self, mean: float, values: Sequence[float] = (), weights: Optional[Sequence[float]] = None):
+        if not values:
+            raise ValueError("Для дискретного закона нужны значения values")
+        weights = list(weights) if weights is not None else [1.0] * len(values)
+        if len(weights) != len(values):
+            raise ValueError("Число весов должно совпадать с числом значений")
+        self.values = tuple(float(value) for value in values)
+        self.table = AliasTable(weights)
+        super().__init__(sum(v * w for v, w in zip(self.values, weights)) / sum(weights))
+
+    def sample(self) -> float:
+        return self.values[self.table.sample()]
+
+
+class EmpiricalLaw(ServiceTimeLaw):
+    """Эмпирический закон по наблюденным длительностям (values или CSV path, колонка column).
+    Разыгрывается обращением кусочно-линейной эмпирической функции распределения
+    по отсортированной выборке: индекс и доля из одного розыгрыша, без поиска"""
+    name = 'empirical'
+
+    def __init__(self, mean: float, values: Sequence[float] = (), path: Optional[str] = None,
+                 column: Optional[str] = None):
+        if path:
+            values = load_durations(path, column or SERVICE_TIME_SETTINGS['empirical_column'])
+        if len(values) < 2:
+            raise ValueError("Для эмпирического закона нужно не меньше двух наблюдений")
+        self.quantiles = tuple(sorted(float(value) for value in values))
+        if self.quantiles[0] < 0:
+            raise ValueError("Наблюденные длительности не могут быть отрицательными")
+        self.steps = len(self.quantiles) - 1
+        # Среднее кусочно-линейного распределения - среднее соседних пар
+        quantiles = self.quantiles
+        super().__init__(sum(quantiles[i] + quantiles[i + 1] for i in range(self.steps)) / (2 * self.steps))
+
+    def sample(self) -> float:
+        u = random.random() * self.steps
+        index = int(u)
+        low = self.quantiles[index]
+        return low + (self.quantiles[index + 1] - low) * (u - index)
+
+    def __str__(self) -> str:
+        return f"{self.name}(mean={self.mean:.2f}, n={len(self.quantiles)})"
+
+
+# Реестр законов: имя -> класс (конструктор принимает среднее и параметры закона)
+SERVICE_TIME_LAWS: Dict[str, Callable[..., ServiceTimeLaw]] = {
+    law.name: law for law in (ExponentialLaw, ErlangLaw, LognormalLaw,
+                              HyperexponentialLaw, DiscreteLaw, EmpiricalLaw)
+}
+
+
+def register_service_time_law(name: str, factory: Callable[..., ServiceTimeLaw]) -> None:
+    """Добавляет закон в реестр (factory(mean, **параметры) -> ServiceTimeLaw)"""
+    SERVICE_TIME_LAWS[name] = factory
+
+
+@lru_cache(maxsize=None)
+def load_durations(path: str, column: str) -> Tuple[float, ...]:
+    """Читает наблюденные длительности из CSV (колонка column); файл читается один раз"""
+    with open(path, newline='', encoding='utf-8') as table:
+        return tuple(float(row[column]) for row in csv.DictReader(table) if row.get(column, '').strip())
+
+
+def make_service_time_law(spec: Optional[Dict], mean_service_time: float) -> ServiceTimeLaw:
+    """Строит закон по описанию {'law': имя, 'mean': ..., параметры}.
+    Пустое описание - экспоненциальный закон со средним mean_service_time"""
+    params = dict(spec or {})
+    name = params.pop('law', 'exponential')
+    factory = SERVICE_TIME_LAWS.get(name)
+    if factory is None:
+        raise ValueError(f"Неизвестный закон времени обслуживания '{name}'. "
+                         f"Доступны: {', '.join(sorted(SERVICE_TIME_LAWS))}")
+    mean = float(params.pop('mean', mean_service_time))
+    try:
+        return factory(mean, **params)
+    except TypeError as error:
+        raise ValueError(f"Неверные параметры закона '{name}': {error}") from None
@@ -0,0 +1,182 @@
+import json
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import urlparse, parse_qs
+
+
+class StateSnapshotCache:
+    """Кэш снимков состояния системы для внешних наблюдателей (дашбордов).
+    Снимок перестраивается не чаще одного раза за rebuild_every событий,
+    готовый JSON хранится в памяти и отдается клиентам без участия цикла симуляции."""
+
+    def __init__(self, rebuild_every: int, history_size: int):
+        self.rebuild_every = max(1, rebuild_every)
+        self.version = 0
+        self._events_since_rebuild = 0
+        self._snapshot: Dict = {}
+        self._payload = b"{}"
+        self._history = deque(maxlen=max(1, history_size))  # (версия, снимок)
+        self._delta_cache: Dict[int, bytes] = {}  # Только версии из истории, не больше history_size
+        self._lock = threading.Lock()
+
+    def on_event(self, core) -> None:
+        """Вызывается ядром после каждого обработанного события"""
+        self._events_since_rebuild += 1
+        if self._events_since_rebuild >= self.rebuild_every:
+            self.rebuild(core)
+
+    def rebuild(self, core) -> None:
+        """Перестраивает снимок и публикует новую версию"""
+        self._events_since_rebuild = 0
+        snapshot = self._build_snapshot(core)
+        snapshot['version'] = self.version + 1
+        payload = json.dumps(snapshot, ensure_ascii=False).encode('utf-8')
+
+        # Публикация - одна короткая критическая секция, остальное делают потоки сервера
+        with self._lock:
+            self.version += 1
+            self._snapshot = snapshot
+            self._payload = payload
+            self._history.append((self.version, snapshot))
+            self._delta_cache = {}
+
+    def _build_snapshot(self, core) -> Dict:
+        """Собирает компактный снимок состояния без текстовых описаний"""
+        stats = core.statistics
+        waiting_room = core.waiting_room
+
+        doctors = []
+        for doctor in core.doctors:
+            patient = doctor.current_patient
+            doctors.append({
+                'id': doctor.id,
+                'busy': doctor.is_busy,
+                'patient_id': patient.id if patient is not None else None
+            })
+
+        buffer = [{'patient_id': patient.id,
+                   'source_id': patient.source_id,
+                   'arrival_time': patient.arrival_time}
+                  for patient in waiting_room.patients]
+
+        by_priority = {}
+        for source in core.scenario.sources:
+            by_priority[source.key] = {
+                'arrived': stats.arrived_by_source[source.source_id],
+                'served': stats.served_by_source[source.source_id],
+                'rejected': stats.rejected_by_source[source.source_id],
+                'abandoned': stats.abandoned_by_source[source.source_id],
+                'balked': stats.balked_by_source[source.source_id]
+            }
+
+        return {
+            'current_time': core.current_time,
+            'events_processed': core.processed_events,
+            'events_in_queue': len(core.event_queue) - core.cancelled_events,
+            'next_doctor_index': core.dispatcher.next_doctor_index,
+            'doctors': doctors,
+            'buffer': buffer,
+            'buffer_capacity': waiting_room.capacity,
+            'statistics': {
+                'total_arrived': stats.total_patients_arrived,
+                'total_served': stats.total_patients_served,
+                'total_rejected': stats.total_patients_rejected,
+                'total_abandoned': stats.total_patients_abandoned,
+                'total_balked': stats.total_patients_balked,
+                'by_priority': by_priority
+            }
+        }
+
+    def get_payload(self) -> bytes:
+        """Возвращает JSON последнего снимка"""
+        return self._payload
+
+    def get_delta_payload(self, since_version: int) -> bytes:
+        """Возвращает JSON изменений с версии since_version.
+        Если версия уже вытеснена из истории - отдается полный снимок."""
+        with self._lock:
+            cached = self._delta_cache.get(since_version)
+            if cached is not None:
+                return cached
+            version = self.version
+            snapshot = self._snapshot
+            base = None
+            for history_version, history_snapshot in self._history:
+                if history_version == since_version:
+                    base = history_snapshot
+                    break
+
+        if base is None:
+            delta = {'version': version, 'since': since_version, 'full': True, 'changes': snapshot}
+        else:
+            changes = {key: value for key, value in snapshot.items()
+                       if key != 'version' and base.get(key) != value}
+            delta = {'version': version, 'since': since_version, 'full': False, 'changes': changes}
+
+        payload = json.dumps(delta, ensure_ascii=False).encode('utf-8')
+        # Кэшируются только изменения от версий истории: произвольные since от клиентов кэш не раздувают
+        if base is not None:
+            with self._lock:
+                if self.version == version:
+                    self._delta_cache[since_version] = payload
+        return payload
+
+
+class StateServer:
+    """Локальный HTTP/JSON сервер состояния (только чтение).
+    GET /state - последний снимок, GET /delta?since=V - изменения с версии V."""
+
+    def __init__(self, cache: StateSnapshotCache, host: str, port: int):
+        self.cache = cache
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Запускает сервер в фоновом потоке"""
+        cache = self.cache
+
+        class StateRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == '/state':
+                    payload = cache.get_payload()
+                elif url.path == '/delta':
+                    try:
+                        since = int(parse_qs(url.query).get('since', ['0'])[0])
+                    except ValueError:
+                        self.send_error(400, "since должен быть целым числом")
+                        return
+                    payload = cache.get_delta_payload(since)
+                else:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                # Не засоряем вывод пошагового режима
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), StateRequestHandler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Останавливает сервер"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __str__(self) -> str:
+        return f"StateServer(http://{self.host}:{self.port}, version={self.cache.version})"
@@ -1,64 +1,146 @@
 import math
+import struct
 from typing import Dict, List, Tuple, Optional
 from entities.patient import Patient
 from entities.priority import Priority
-from config.settings import STATISTICS_SETTINGS
+from config.scenario import Scenario, default_scenario
+from services.histogram import LogLinearHistogram
+from services.moments import RunningMoments
+
+# Упакованная статистика (Statistics.to_bytes): заголовок, итоги, счетчики источника, врач
+_STATISTICS_MAGIC = b'HSST'
+_STATISTICS_VERSION = 1
+_HEADER_FORMAT = struct.Struct('<4sHHI')
+_TOTALS_FORMAT = struct.Struct('<5q2d')
+_SOURCE_FORMAT = struct.Struct('<6q?')
+_DOCTOR_FORMAT = struct.Struct('<qq2d')
+
+
+class StatisticsListener:
+    """Подписчик на регистрируемые статистикой события пациентов.
+    Переопределяются только нужные методы."""
+
+    def on_patient_arrival(self, patient: Patient) -> None:
+        pass
+
+    def on_service_start(self, patient: Patient) -> None:
+        pass
+
+    def on_service_end(self, patient: Patient) -> None:
+        pass
+
+    def on_patient_rejection(self, patient: Patient, displaced_by: Optional[Patient]) -> None:
+        pass
+
+    def on_patient_abandonment(self, patient: Patient) -> None:
+        pass
+
+    def on_patient_balking(self, patient: Patient) -> None:
+        pass
 
 
 class Statistics:
     """Сбор и анализ статистики работы системы."""
 
-    def __init__(self):
+    def __init__(self, scenario: Optional[Scenario] = None):
+        self.scenario = scenario or default_scenario()
+        self.listeners: List[StatisticsListener] = []
+
         # Основная статистика
         self.total_patients_arrived = 0
         self.total_patients_served = 0
         self.total_patients_rejected = 0
+        self.total_patients_abandoned = 0  # Ушли из очереди, не дождавшись приема
+        self.total_patients_balked = 0  # Не встали в очередь из-за ее длины
         self.total_wait_time = 0.0
         self.total_service_time = 0.0
 
         # Статистика по врачам
         self.doctors_stats: Dict[int, Dict] = {}  # doctor_id -> {served_count, total_service_time}
 
-        # Статистика по приоритетам
-        self.patients_by_priority: Dict[Priority, int] = {
-            Priority.EMERGENCY: 0,
-            Priority.BY_APPOINTMENT: 0,
-            Priority.WITHOUT_APPOINTMENT: 0
-        }
-
-        self.served_by_priority: Dict[Priority, int] = {
-            Priority.EMERGENCY: 0,
-            Priority.BY_APPOINTMENT: 0,
-            Priority.WITHOUT_APPOINTMENT: 0
-        }
-
-        self.rejected_by_priority: Dict[Priority, int] = {
-            Priority.EMERGENCY: 0,
-            Priority.BY_APPOINTMENT: 0,
-            Priority.WITHOUT_APPOINTMENT: 0
-        }
-
-        self.wait_times_by_priority: Dict[Priority, List[float]] = {
-            Priority.EMERGENCY: [],
-            Priority.BY_APPOINTMENT: [],
-            Priority.WITHOUT_APPOINTMENT: []
-        }
-
-        self.service_times_by_priority: Dict[Priority, List[float]] = {
-            Priority.EMERGENCY: [],
-            Priority.BY_APPOINTMENT: [],
-            Priority.WITHOUT_APPOINTMENT: []
-        }
+        # Счетчики по источникам: списки с индексом source_id (у каждого источника свой приоритет)
+        size = max(self.scenario.source_ids) + 1
+        self.arrived_by_source: List[int] = [0] * size
+        self.served_by_source: List[int] = [0] * size
+        self.rejected_by_source: List[int] = [0] * size
+        self.abandoned_by_source: List[int] = [0] * size
+        self.balked_by_source: List[int] = [0] * size
+        self.generated_by_source: List[int] = [0] * size
+        # Моменты ожидания и приема (Уэлфорд) вместо списков всех значений: память не растет
+        # с длиной прогона, а объединенная или распакованная статистика дает те же отчеты
+        self.wait_moments: List[RunningMoments] = [RunningMoments() for _ in range(size)]
+        self.service_moments: List[RunningMoments] = [RunningMoments() for _ in range(size)]
+
+        # Гистограммы для процентилей: ожидание, обслуживание, пребывание (ожидание + прием)
+        configured = set(self.scenario.source_ids)
+        self.wait_histograms: List[Optional[LogLinearHistogram]] = [
+            LogLinearHistogram() if source_id in configured else None for source_id in range(size)
+        ]
+        self.service_histograms: List[Optional[LogLinearHistogram]] = [
+            LogLinearHistogram() if source_id in configured else None for source_id in range(size)
+        ]
+        self.sojourn_histograms: List[Optional[LogLinearHistogram]] = [
+            LogLinearHistogram() if source_id in configured else None for source_id in range(size)
+        ]
 
-        self.generation_stats = {
-            Priority.EMERGENCY: 0,
-            Priority.BY_APPOINTMENT: 0,
-            Priority.WITHOUT_APPOINTMENT: 0
-        }
+        # Счетчик изменений и кэш производных отчетов для этой версии
+        self.version = 0
+        self._cache: Dict = {}
+        self._cache_version = -1
+
+    def _by_priority(self, values: List) -> Dict[Priority, object]:
+        return {source.priority: values[source.source_id] for source in self.scenario.sources}
+
+    # Представления счетчиков по приоритетам (только для чтения)
+    @property
+    def patients_by_priority(self) -> Dict[Priority, int]:
+        return self._by_priority(self.arrived_by_source)
+
+    @property
+    def served_by_priority(self) -> Dict[Priority, int]:
+        return self._by_priority(self.served_by_source)
+
+    @property
+    def rejected_by_priority(self) -> Dict[Priority, int]:
+        return self._by_priority(self.rejected_by_source)
+
+    @property
+    def generation_stats(self) -> Dict[Priority, int]:
+        return self._by_priority(self.generated_by_source)
+
+    # Времена ожидания и приема по приоритетам - моменты (len - число значений, mean, variance),
+    # распределения - гистограммы wait_histograms / service_histograms
+    @property
+    def wait_times_by_priority(self) -> Dict[Priority, RunningMoments]:
+        return self._by_priority(self.wait_moments)
+
+    @property
+    def service_times_by_priority(self) -> Dict[Priority, RunningMoments]:
+        return self._by_priority(self.service_moments)
+
+    def add_listener(self, listener: StatisticsListener) -> None:
+        """Подписывает слушателя на события пациентов"""
+        self.listeners.append(listener)
+
+    def mark_changed(self) -> None:
+        """Отмечает изменение статистики (для прямых изменений полей извне)"""
+        self.version += 1
+
+    def _cached(self, key, builder):
+        """Возвращает значение из кэша текущей версии или строит его"""
+        if self._cache_version != self.version:
+            self._cache = {}
+            self._cache_version = self.version
+        value = self._cache.get(key)
+        if value is None:
+            value = builder()
+            self._cache[key] = value
+        return value
 
     def initialize_doctor_stats(self, doctor_id: int):
         """Инициализирует статистику для врача"""
         if doctor_id not in self.doctors_stats:
+            self.version += 1
             self.doctors_stats[doctor_id] = {
                 'served_count': 0,
                 'total_service_time': 0.0,
@@ -68,6 +150,7 @@ class Statistics:
     def record_service_end_by_doctor(self, doctor_id: int, service_time: float):
         """Записывает статистику обслуживания для врача"""
         self.initialize_doctor_stats(doctor_id)
+        self.version += 1
         self.doctors_stats[doctor_id]['served_count'] += 1
         self.doctors_stats[doctor_id]['total_service_time'] += service_time
         self.doctors_stats[doctor_id]['busy_time'] += service_time
@@ -77,59 +160,89 @@ class Statistics:
         self.initialize_doctor_stats(doctor_id)
         return self.doctors_stats[doctor_id]
 
-    def record_patient_generation(self, priority: Priority):
-        """Регистрирует генерацию пациента"""
-        self.generation_stats[priority] += 1
+    def record_patient_generation(self, source_id: int):
+        """Регистрирует генерацию пациента источником source_id"""
+        self.generated_by_source[source_id] += 1
+        self.version += 1
 
     def record_patient_arrival(self, patient: Patient) -> None:
         """Регистрирует прибытие пациента"""
         self.total_patients_arrived += 1
-        self.patients_by_priority[patient.priority] += 1
+        self.arrived_by_source[patient.source_id] += 1
+        self.version += 1
         print(f"Статистика: Прибыл пациент {patient.id} ({str(patient.priority)})")
 
+        for listener in self.listeners:
+            listener.on_patient_arrival(patient)
+
     def record_service_start(self, patient: Patient) -> None:
         """Регистрирует начало обслуживания"""
         if patient.service_start_time is not None and patient.arrival_time is not None:
             wait_time = patient.service_start_time - patient.arrival_time
             self.total_wait_time += wait_time
-            self.wait_times_by_priority[patient.priority].append(wait_time)
+            self.wait_moments[patient.source_id].record(wait_time)
+            self.wait_histograms[patient.source_id].record(wait_time)
+            self.version += 1
             print(f" Статистика: Начало обслуживания пациента {patient.id}, "
                   f"время ожидания: {wait_time:.2f}")
 
+        for listener in self.listeners:
+            listener.on_service_start(patient)
+
     def record_service_end(self, patient: Patient) -> None:
         """Регистрирует окончание обслуживания"""
         self.total_patients_served += 1
-        self.served_by_priority[patient.priority] += 1
+        self.served_by_source[patient.source_id] += 1
+        self.version += 1
 
         if patient.service_start_time is not None and patient.service_end_time is not None:
             service_time = patient.service_end_time - patient.service_start_time
             self.total_service_time += service_time
-            self.service_times_by_priority[patient.priority].append(service_time)
+            self.service_moments[patient.source_id].record(service_time)
+            self.service_histograms[patient.source_id].record(service_time)
+            if patient.arrival_time is not None:
+                self.sojourn_histograms[patient.source_id].record(patient.service_end_time - patient.arrival_time)
 
         print(f" Статистика: Обслужен пациент {patient.id} ({str(patient.priority)})")
 
-    def record_patient_rejection(self, patient: Patient) -> None:
-        """Регистрирует отказ пациенту"""
+        for listener in self.listeners:
+            listener.on_service_end(patient)
+
+    def record_patient_rejection(self, patient: Patient, displaced_by: Optional[Patient] = None) -> None:
+        """Регистрирует отказ пациенту (displaced_by - вытеснивший его пациент, Д1О4)"""
         self.total_patients_rejected += 1
-        self.rejected_by_priority[patient.priority] += 1
+        self.rejected_by_source[patient.source_id] += 1
+        self.version += 1
         print(f"Статистика: Отказ пациенту {patient.id} ({str(patient.priority)}), "
               f"время прибытия: {patient.arrival_time:.2f}")
 
+        for listener in self.listeners:
+            listener.on_patient_rejection(patient, displaced_by)
+
+    def record_patient_abandonment(self, patient: Patient, current_time: float) -> None:
+        """Регистрирует уход пациента из очереди по истечении терпения (не отказ Д1О4)"""
+        self.total_patients_abandoned += 1
+        self.abandoned_by_source[patient.source_id] += 1
+        self.version += 1
+        print(f"Статистика: Пациент {patient.id} ({str(patient.priority)}) ушел из очереди, "
+              f"прождав {current_time - patient.arrival_time:.2f}")
+
+        for listener in self.listeners:
+            listener.on_patient_abandonment(patient)
+
+    def record_patient_balking(self, patient: Patient) -> None:
+        """Регистрирует пациента, не вставшего в слишком длинную очередь"""
+        self.total_patients_balked += 1
+        self.balked_by_source[patient.source_id] += 1
+        self.version += 1
+        print(f"Статистика: Пациент {patient.id} ({str(patient.priority)}) не встал в очередь")
+
+        for listener in self.listeners:
+            listener.on_patient_balking(patient)
+
     def get_generation_stats(self) -> Dict:
         """Возвращает статистику генерации"""
-        total = sum(self.generation_stats.values())
-        if total == 0:
-            return {}
-
-        return {
-            'total_generated': total,
-            'emergency_count': self.generation_stats[Priority.EMERGENCY],
-            'appointment_count': self.generation_stats[Priority.BY_APPOINTMENT],
-            'walkin_count': self.generation_stats[Priority.WITHOUT_APPOINTMENT],
-            'emergency_percent': (self.generation_stats[Priority.EMERGENCY] / total) * 100,
-            'appointment_percent': (self.generation_stats[Priority.BY_APPOINTMENT] / total) * 100,
-            'walkin_percent': (self.generation_stats[Priority.WITHOUT_APPOINTMENT] / total) * 100
-        }
+        return self.get_aggregate()['generation']
 
     def calculate_variance(self, data: List[float]) -> float:
         """Вычисляет дисперсию"""
@@ -149,97 +262,174 @@ class Statistics:
         if n == 0:
             return (0.0, 0.0)
 
-        t_alpha = STATISTICS_SETTINGS['confidence_t_alpha']
+        t_alpha = self.scenario.confidence_t_alpha
         margin = t_alpha * math.sqrt(probability * (1 - probability) / n)
         return (max(0, probability - margin), min(1, probability + margin))
 
     def calculate_required_n(self, current_probability: float) -> int:
         """Вычисляет необходимое количество заявок для заданной точности"""
         if current_probability == 0:
-            return STATISTICS_SETTINGS['min_patients_for_accuracy']
+            return self.scenario.min_patients_for_accuracy
 
-        t_alpha = STATISTICS_SETTINGS['confidence_t_alpha']
-        delta = STATISTICS_SETTINGS['relative_accuracy_delta']
+        t_alpha = self.scenario.confidence_t_alpha
+        delta = self.scenario.relative_accuracy_delta
 
         n = (t_alpha ** 2 * (1 - current_probability)) / (current_probability * delta ** 2)
-        return max(STATISTICS_SETTINGS['min_patients_for_accuracy'], int(n))
+        return max(self.scenario.min_patients_for_accuracy, int(n))
+
+    def get_aggregate(self) -> Dict:
+        """Сводный снимок статистики для текущей версии.
+        Строится заново только после изменений, иначе возвращается готовый;
+        все отчеты строятся из него. Возвращаемые словари не изменять."""
+        return self._cached('aggregate', self._build_aggregate)
+
+    def _build_aggregate(self) -> Dict:
+        priorities = {}
+        for source in self.scenario.sources:
+            source_id = source.source_id
+            arrived = self.arrived_by_source[source_id]
+            rejected = self.rejected_by_source[source_id]
+            abandoned = self.abandoned_by_source[source_id]
+            balked = self.balked_by_source[source_id]
+            wait_moments = self.wait_moments[source_id]
+            service_moments = self.service_moments[source_id]
+            p_reject = rejected / arrived if arrived > 0 else 0
+            var_wait = wait_moments.variance
+            var_service = service_moments.variance
+
+            priorities[source.priority] = {
+                'source_id': source_id,
+                'arrived': arrived,
+                'served': self.served_by_source[source_id],
+                'rejected': rejected,
+                'p_reject': p_reject,
+                'rejection_rate': p_reject * 100,
+                'abandoned': abandoned,
+                'balked': balked,
+                'abandonment_rate': abandoned / arrived * 100 if arrived > 0 else 0.0,
+                'balking_rate': balked / arrived * 100 if arrived > 0 else 0.0,
+                'avg_wait_time': wait_moments.mean,
+                'avg_service_time': service_moments.mean,
+                'variance_wait': var_wait,
+                'variance_service': var_service,
+                'std_wait': math.sqrt(var_wait) if var_wait > 0 else 0.0,
+                'std_service': math.sqrt(var_service) if var_service > 0 else 0.0,
+                'wait_percentiles': self.wait_histograms[source_id].get_percentiles(),
+                'service_percentiles': self.service_histograms[source_id].get_percentiles(),
+                'sojourn_percentiles': self.sojourn_histograms[source_id].get_percentiles()
+            }
+
+        served = self.total_patients_served
+        arrived = self.total_patients_arrived
+        total_reject_rate = self.total_patients_rejected / arrived if arrived > 0 else 0
+
+        total_generated = sum(self.generated_by_source)
+        generation = {}
+        if total_generated > 0:
+            generation = {
+                'total_generated': total_generated,
+                'counts': {source_id: self.generated_by_source[source_id]
+                           for source_id in self.scenario.source_ids},
+                'percents': {source_id: self.generated_by_source[source_id] / total_generated * 100
+                             for source_id in self.scenario.source_ids}
+            }
+
+        return {
+            'version': self.version,
+            'total_arrived': arrived,
+            'total_served': served,
+            'total_rejected': self.total_patients_rejected,
+            'p_reject': total_reject_rate,
+            'rejection_rate': total_reject_rate * 100,
+            'total_abandoned': self.total_patients_abandoned,
+            'total_balked': self.total_patients_balked,
+            'abandonment_rate': self.total_patients_abandoned / arrived * 100 if arrived > 0 else 0.0,
+            'balking_rate': self.total_patients_balked / arrived * 100 if arrived > 0 else 0.0,
+            'avg_wait_time': self.total_wait_time / served if served > 0 else 0.0,
+            'avg_service_time': self.total_service_time / served if served > 0 else 0.0,
+            'priorities': priorities,
+            'wait_percentiles': self._merged(self.wait_histograms).get_percentiles(),
+            'service_percentiles': self._merged(self.service_histograms).get_percentiles(),
+            'sojourn_percentiles': self._merged(self.sojourn_histograms).get_percentiles(),
+            'generation': generation
+        }
+
+    @staticmethod
+    def _merged(histograms: List[Optional[LogLinearHistogram]]) -> LogLinearHistogram:
+        """Гистограмма по всем источникам"""
+        merged = LogLinearHistogram()
+        for histogram in histograms:
+            if histogram is not None:
+                merged.merge(histogram)
+        return merged
 
     def get_average_wait_time(self, priority: Optional[Priority] = None) -> float:
         """Возвращает среднее время ожидания"""
+        aggregate = self.get_aggregate()
         if priority:
-            wait_times = self.wait_times_by_priority[priority]
-            return sum(wait_times) / len(wait_times) if wait_times else 0.0
-        else:
-            return self.total_wait_time / self.total_patients_served if self.total_patients_served > 0 else 0.0
+            return aggregate['priorities'][priority]['avg_wait_time']
+        return aggregate['avg_wait_time']
 
     def get_average_service_time(self, priority: Optional[Priority] = None) -> float:
         """Возвращает среднее время обслуживания"""
+        aggregate = self.get_aggregate()
         if priority:
-            service_times = self.service_times_by_priority[priority]
-            return sum(service_times) / len(service_times) if service_times else 0.0
-        else:
-            return self.total_service_time / self.total_patients_served if self.total_patients_served > 0 else 0.0
+            return aggregate['priorities'][priority]['avg_service_time']
+        return aggregate['avg_service_time']
 
     def get_rejection_rate(self, priority: Optional[Priority] = None) -> float:
         """Возвращает процент отказов"""
+        aggregate = self.get_aggregate()
         if priority:
-            arrived = self.patients_by_priority[priority]
-            rejected = self.rejected_by_priority[priority]
-            return (rejected / arrived * 100) if arrived > 0 else 0.0
-        else:
-            return (
-                        self.total_patients_rejected / self.total_patients_arrived * 100) if self.total_patients_arrived > 0 else 0.0
+            return aggregate['priorities'][priority]['rejection_rate']
+        return aggregate['rejection_rate']
 
     def generate_detailed_report(self, total_simulation_time: float, doctors_count: int) -> Dict:
         """Генерирует детальный отчет согласно требованиям"""
+        return self._cached(('detailed_report', total_simulation_time, doctors_count),
+                            lambda: self._build_detailed_report(total_simulation_time))
+
+    def _build_detailed_report(self, total_simulation_time: float) -> Dict:
+        aggregate = self.get_aggregate()
 
         # Таблица 1: Характеристики источников ВС
         sources_table = []
-        for priority in [Priority.EMERGENCY, Priority.BY_APPOINTMENT, Priority.WITHOUT_APPOINTMENT]:
-            arrived = self.patients_by_priority[priority]
-            served = self.served_by_priority[priority]
-            rejected = self.rejected_by_priority[priority]
-
-            # Вероятность отказа
-            p_reject = rejected / arrived if arrived > 0 else 0
-
-            # Среднее время пребывания
-            wait_times = self.wait_times_by_priority[priority]
-            service_times = self.service_times_by_priority[priority]
-
-            avg_wait = sum(wait_times) / len(wait_times) if wait_times else 0
-            avg_service = sum(service_times) / len(service_times) if service_times else 0
-            avg_total = avg_wait + avg_service
-
-            # Дисперсии
-            var_wait = self.calculate_variance(wait_times)
-            var_service = self.calculate_variance(service_times)
+        for priority, stats in aggregate['priorities'].items():
+            arrived = stats['arrived']
+            p_reject = stats['p_reject']
 
             # Доверительный интервал для вероятности отказа
             conf_interval = self.calculate_confidence_interval(p_reject, arrived) if arrived > 0 else (0, 0)
 
             sources_table.append({
-                'source_id': priority.value,
+                'source_id': stats['source_id'],
+                'key': priority.name,
                 'priority': str(priority),
                 'total_arrived': arrived,
-                'total_served': served,
-                'total_rejected': rejected,
+                'total_served': stats['served'],
+                'total_rejected': stats['rejected'],
                 'p_reject': p_reject,
-                'p_reject_percent': p_reject * 100,
-                'avg_total_time': avg_total,
-                'avg_wait_time': avg_wait,
-                'avg_service_time': avg_service,
-                'variance_wait': var_wait,
-                'variance_service': var_service,
-                'std_wait': self.calculate_standard_deviation(wait_times),
-                'std_service': self.calculate_standard_deviation(service_times),
+                'p_reject_percent': stats['rejection_rate'],
+                'total_abandoned': stats['abandoned'],
+                'total_balked': stats['balked'],
+                'abandonment_rate': stats['abandonment_rate'],
+                'balking_rate': stats['balking_rate'],
+                'avg_total_time': stats['avg_wait_time'] + stats['avg_service_time'],
+                'avg_wait_time': stats['avg_wait_time'],
+                'avg_service_time': stats['avg_service_time'],
+                'variance_wait': stats['variance_wait'],
+                'variance_service': stats['variance_service'],
+                'std_wait': stats['std_wait'],
+                'std_service': stats['std_service'],
+                'wait_percentiles': stats['wait_percentiles'],
+                'service_percentiles': stats['service_percentiles'],
+                'sojourn_percentiles': stats['sojourn_percentiles'],
                 'confidence_interval': conf_interval,
                 'required_n_for_accuracy': self.calculate_required_n(p_reject) if arrived > 0 else 0
             })
 
         # Общая статистика системы
-        total_reject_rate = self.total_patients_rejected / self.total_patients_arrived if self.total_patients_arrived > 0 else 0
-        total_conf_interval = self.calculate_confidence_interval(total_reject_rate, self.total_patients_arrived)
+        total_conf_interval = self.calculate_confidence_interval(aggregate['p_reject'], aggregate['total_arrived'])
 
         # Статистика использования системы
         system_utilization = {}
@@ -261,54 +451,58 @@ class Statistics:
             'sources_characteristics': sources_table,
             'system_characteristics': {
                 'total_simulation_time': total_simulation_time,
-                'total_patients_arrived': self.total_patients_arrived,
-                'total_patients_served': self.total_patients_served,
-                'total_patients_rejected': self.total_patients_rejected,
-                'total_reject_rate': total_reject_rate * 100,
+                'total_patients_arrived': aggregate['total_arrived'],
+                'total_patients_served': aggregate['total_served'],
+                'total_patients_rejected': aggregate['total_rejected'],
+                'total_reject_rate': aggregate['rejection_rate'],
+                'total_patients_abandoned': aggregate['total_abandoned'],
+                'total_patients_balked': aggregate['total_balked'],
+                'abandonment_rate': aggregate['abandonment_rate'],
+                'balking_rate': aggregate['balking_rate'],
                 'confidence_interval': total_conf_interval,
-                'avg_wait_time': self.get_average_wait_time(),
-                'avg_service_time': self.get_average_service_time(),
+                'avg_wait_time': aggregate['avg_wait_time'],
+                'avg_service_time': aggregate['avg_service_time'],
+                'wait_percentiles': aggregate['wait_percentiles'],
+                'service_percentiles': aggregate['service_percentiles'],
+                'sojourn_percentiles': aggregate['sojourn_percentiles'],
                 'system_utilization': avg_system_utilization,
                 'doctors_utilization': system_utilization
             },
-            'generation_stats': self.get_generation_stats()
+            'generation_stats': aggregate['generation']
         }
 
     def generate_report(self) -> Dict:
         """Генерирует сводный отчет (ОР1)"""
-        if self.total_patients_arrived == 0:
-            return {"message": "Нет данных для отчета"}
+        return self._cached('report', self._build_report)
 
-        avg_wait_time = self.get_average_wait_time()
-        avg_service_time = self.get_average_service_time()
-        total_reject_rate = self.get_rejection_rate()
+    def _build_report(self) -> Dict:
+        aggregate = self.get_aggregate()
+        if aggregate['total_arrived'] == 0:
+            return {"message": "Нет данных для отчета"}
 
         # Подробная статистика по приоритетам
         priority_details = {}
-        for priority in [Priority.EMERGENCY, Priority.BY_APPOINTMENT, Priority.WITHOUT_APPOINTMENT]:
-            arrived = self.patients_by_priority[priority]
-            served = self.served_by_priority[priority]
-            rejected = self.rejected_by_priority[priority]
-            avg_wait = self.get_average_wait_time(priority)
-            avg_service = self.get_average_service_time(priority)
-            reject_rate = self.get_rejection_rate(priority)
-
+        for priority, stats in aggregate['priorities'].items():
             priority_details[str(priority)] = {
-                "прибыло": arrived,
-                "обслужено": served,
-                "отказано": rejected,
-                "среднее_время_ожидания": avg_wait,
-                "среднее_время_обслуживания": avg_service,
-                "процент_отказов": reject_rate
+                "прибыло": stats['arrived'],
+                "обслужено": stats['served'],
+                "отказано": stats['rejected'],
+                "ушли_из_очереди": stats['abandoned'],
+                "не_встали_в_очередь": stats['balked'],
+                "среднее_время_ожидания": stats['avg_wait_time'],
+                "среднее_время_обслуживания": stats['avg_service_time'],
+                "процент_отказов": stats['rejection_rate']
             }
 
         report = {
-            "Общее_количество_пациентов": self.total_patients_arrived,
-            "Обслужено_пациентов": self.total_patients_served,
-            "Отказано_пациентов": self.total_patients_rejected,
-            "Процент_отказов": total_reject_rate,
-            "Среднее_время_ожидания": avg_wait_time,
-            "Среднее_время_обслуживания": avg_service_time,
+            "Общее_количество_пациентов": aggregate['total_arrived'],
+            "Обслужено_пациентов": aggregate['total_served'],
+            "Отказано_пациентов": aggregate['total_rejected'],
+            "Процент_отказов": aggregate['rejection_rate'],
+            "Ушли_из_очереди": aggregate['total_abandoned'],
+            "Не_встали_в_очередь": aggregate['total_balked'],
+            "Среднее_время_ожидания": aggregate['avg_wait_time'],
+            "Среднее_время_обслуживания": aggregate['avg_service_time'],
             "Общее_время_ожидания": self.total_wait_time,
             "Общее_время_обслуживания": self.total_service_time,
             "Распределение_по_приоритетам": priority_details
@@ -318,68 +512,191 @@ class Statistics:
 
     def get_current_state(self) -> str:
         """Возвращает текущее состояние системы (ОД2)"""
+        return self._cached('current_state', self._build_current_state)
+
+    def _build_current_state(self) -> str:
+        aggregate = self.get_aggregate()
+        priorities = aggregate['priorities']
+        waiting = (aggregate['total_arrived'] - aggregate['total_served'] - aggregate['total_rejected']
+                   - aggregate['total_abandoned'] - aggregate['total_balked'])
+
         state = [
             "=== ТЕКУЩЕЕ СОСТОЯНИЕ СИСТЕМЫ ===",
-            f"Всего пациентов: {self.total_patients_arrived}",
-            f"Обслужено: {self.total_patients_served}",
-            f"Отказано: {self.total_patients_rejected}",
-            f"В ожидании: {self.total_patients_arrived - self.total_patients_served - self.total_patients_rejected}",
+            f"Всего пациентов: {aggregate['total_arrived']}",
+            f"Обслужено: {aggregate['total_served']}",
+            f"Отказано: {aggregate['total_rejected']}",
+            f"Ушли из очереди: {aggregate['total_abandoned']}",
+            f"Не встали в очередь: {aggregate['total_balked']}",
+            f"В ожидании: {waiting}",
             "",
-            "По приоритетам:",
-            f" Неотложная помощь: прибыло {self.patients_by_priority[Priority.EMERGENCY]}, "
-            f"обслужено {self.served_by_priority[Priority.EMERGENCY]}, "
-            f"отказано {self.rejected_by_priority[Priority.EMERGENCY]}",
-            f" По записи: прибыло {self.patients_by_priority[Priority.BY_APPOINTMENT]}, "
-            f"обслужено {self.served_by_priority[Priority.BY_APPOINTMENT]}, "
-            f"отказано {self.rejected_by_priority[Priority.BY_APPOINTMENT]}",
-            f" Без записи: прибыло {self.patients_by_priority[Priority.WITHOUT_APPOINTMENT]}, "
-            f"обслужено {self.served_by_priority[Priority.WITHOUT_APPOINTMENT]}, "
-            f"отказано {self.rejected_by_priority[Priority.WITHOUT_APPOINTMENT]}"
+            "По приоритетам:"
         ]
+        for source in self.scenario.sources:
+            stats = priorities[source.priority]
+            state.append(f" {source.description}: прибыло {stats['arrived']}, "
+                         f"обслужено {stats['served']}, "
+                         f"отказано {stats['rejected']}, "
+                         f"ушли {stats['abandoned']}, "
+                         f"не встали {stats['balked']}")
 
         # Добавляем статистику по времени, если есть данные
-        if self.total_patients_served > 0:
+        if aggregate['total_served'] > 0:
             state.extend([
                 "",
                 "Статистика времени:",
-                f" Среднее время ожидания: {self.get_average_wait_time():.2f} мин",
-                f" Среднее время обслуживания: {self.get_average_service_time():.2f} мин"
+                f" Среднее время ожидания: {aggregate['avg_wait_time']:.2f} мин",
+                f" Среднее время обслуживания: {aggregate['avg_service_time']:.2f} мин"
             ])
 
         return "\n".join(state)
 
+    def merge(self, other: 'Statistics') -> 'Statistics':
+        """Добавляет к статистике другую с тем же набором источников (реплика, сегмент, процесс).
+        Счетчики и накопленные времена складываются, моменты - по параллельной формуле
+        Уэлфорда, гистограммы - по интервалам; операция ассоциативна. Слушатели не переносятся."""
+        if len(other.arrived_by_source) != len(self.arrived_by_source):
+            raise ValueError("Нельзя объединить статистику с разными источниками")
+        self.total_patients_arrived += other.total_patients_arrived
+        self.total_patients_served += other.total_patients_served
+        self.total_patients_rejected += other.total_patients_rejected
+        self.total_patients_abandoned += other.total_patients_abandoned
+        self.total_patients_balked += other.total_patients_balked
+        self.total_wait_time += other.total_wait_time
+        self.total_service_time += other.total_service_time
+
+        for source_id in range(len(self.arrived_by_source)):
+            self.arrived_by_source[source_id] += other.arrived_by_source[source_id]
+            self.served_by_source[source_id] += other.served_by_source[source_id]
+            self.rejected_by_source[source_id] += other.rejected_by_source[source_id]
+            self.abandoned_by_source[source_id] += other.abandoned_by_source[source_id]
+            self.balked_by_source[source_id] += other.balked_by_source[source_id]
+            self.generated_by_source[source_id] += other.generated_by_source[source_id]
+            self.wait_moments[source_id].merge(other.wait_moments[source_id])
+            self.service_moments[source_id].merge(other.service_moments[source_id])
+            for own, histograms in ((self.wait_histograms, other.wait_histograms),
+                                    (self.service_histograms, other.service_histograms),
+                                    (self.sojourn_histograms, other.sojourn_histograms)):
+                if histograms[source_id] is not None:
+                    if own[source_id] is None:
+                        own[source_id] = LogLinearHistogram()
+                    own[source_id].merge(histograms[source_id])
+
+        for doctor_id, doctor_stats in other.doctors_stats.items():
+            self.initialize_doctor_stats(doctor_id)
+            for key, value in doctor_stats.items():
+                self.doctors_stats[doctor_id][key] += value
+
+        self.mark_changed()
+        return self
+
+    def __add__(self, other: 'Statistics') -> 'Statistics':
+        return Statistics(self.scenario).merge(self).merge(other)
+
+    def to_bytes(self) -> bytes:
+        """Компактный вид для передачи частичных результатов между процессами.
+        Сохраняются счетчики, моменты, непустые интервалы гистограмм и статистика врачей,
+        поэтому размер ограничен числом интервалов и врачей, а не числом пациентов."""
+        size = len(self.arrived_by_source)
+        parts = [_HEADER_FORMAT.pack(_STATISTICS_MAGIC, _STATISTICS_VERSION, size, len(self.doctors_stats)),
+                 _TOTALS_FORMAT.pack(self.total_patients_arrived, self.total_patients_served,
+                                     self.total_patients_rejected, self.total_patients_abandoned,
+                                     self.total_patients_balked, self.total_wait_time, self.total_service_time)]
+        for source_id in range(size):
+            has_histograms = self.wait_histograms[source_id] is not None
+            parts.append(_SOURCE_FORMAT.pack(self.arrived_by_source[source_id], self.served_by_source[source_id],
+                                             self.rejected_by_source[source_id],
+                                             self.abandoned_by_source[source_id],
+                                             self.balked_by_source[source_id],
+                                             self.generated_by_source[source_id], has_histograms))
+            parts.append(self.wait_moments[source_id].pack())
+            parts.append(self.service_moments[source_id].pack())
+            if has_histograms:
+                parts.append(self.wait_histograms[source_id].pack())
+                parts.append(self.service_histograms[source_id].pack())
+                parts.append(self.sojourn_histograms[source_id].pack())
+        for doctor_id, doctor_stats in sorted(self.doctors_stats.items()):
+            parts.append(_DOCTOR_FORMAT.pack(doctor_id, doctor_stats['served_count'],
+                                             doctor_stats['total_service_time'], doctor_stats['busy_time']))
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, scenario: Optional[Scenario] = None) -> 'Statistics':
+        """Восстанавливает статистику из to_bytes() для сценария с тем же набором источников"""
+        magic, version, size, doctors = _HEADER_FORMAT.unpack_from(data, 0)
+        if magic != _STATISTICS_MAGIC or version != _STATISTICS_VERSION:
+            raise ValueError("Неизвестный формат упакованной статистики")
+        statistics = cls(scenario)
+        if size != len(statistics.arrived_by_source):
+            raise ValueError("Упакованная статистика относится к сценарию с другими источниками")
+        offset = _HEADER_FORMAT.size
+
+        (statistics.total_patients_arrived, statistics.total_patients_served, statistics.total_patients_rejected,
+         statistics.total_patients_abandoned, statistics.total_patients_balked, statistics.total_wait_time,
+         statistics.total_service_time) = _TOTALS_FORMAT.unpack_from(data, offset)
+        offset += _TOTALS_FORMAT.size
+
+        for source_id in range(size):
+            (statistics.arrived_by_source[source_id], statistics.served_by_source[source_id],
+             statistics.rejected_by_source[source_id], statistics.abandoned_by_source[source_id],
+             statistics.balked_by_source[source_id], statistics.generated_by_source[source_id],
+             has_histograms) = _SOURCE_FORMAT.unpack_from(data, offset)
+            offset += _SOURCE_FORMAT.size
+            statistics.wait_moments[source_id] = RunningMoments.unpack_from(data, offset)
+            offset += RunningMoments.size
+            statistics.service_moments[source_id] = RunningMoments.unpack_from(data, offset)
+            offset += RunningMoments.size
+            if has_histograms:
+                statistics.wait_histograms[source_id], offset = LogLinearHistogram.unpack_from(data, offset)
+                statistics.service_histograms[source_id], offset = LogLinearHistogram.unpack_from(data, offset)
+                statistics.sojourn_histograms[source_id], offset = LogLinearHistogram.unpack_from(data, offset)
+
+        for _ in range(doctors):
+            doctor_id, served_count, total_service_time, busy_time = _DOCTOR_FORMAT.unpack_from(data, offset)
+            offset += _DOCTOR_FORMAT.size
+            statistics.doctors_stats[doctor_id] = {
+                'served_count': served_count,
+                'total_service_time': total_service_time,
+                'busy_time': busy_time
+            }
+
+        statistics.mark_changed()
+        return statistics
+
     def reset_statistics(self):
         """Сбрасывает всю статистику"""
-        self.__init__()
+        listeners = self.listeners
+        version = self.version
+        self.__init__(self.scenario)
+        self.listeners = listeners
+        self.version = version + 1
 
     def get_summary(self) -> Dict:
         """Возвращает краткую сводку статистики"""
+        return self._cached('summary', self._build_summary)
+
+    def _build_summary(self) -> Dict:
+        aggregate = self.get_aggregate()
+
         return {
-            'total_arrived': self.total_patients_arrived,
-            'total_served': self.total_patients_served,
-            'total_rejected': self.total_patients_rejected,
-            'rejection_rate': self.get_rejection_rate(),
-            'avg_wait_time': self.get_average_wait_time(),
-            'avg_service_time': self.get_average_service_time(),
-            'emergency_stats': {
-                'arrived': self.patients_by_priority[Priority.EMERGENCY],
-                'served': self.served_by_priority[Priority.EMERGENCY],
-                'rejected': self.rejected_by_priority[Priority.EMERGENCY],
-                'rejection_rate': self.get_rejection_rate(Priority.EMERGENCY)
-            },
-            'appointment_stats': {
-                'arrived': self.patients_by_priority[Priority.BY_APPOINTMENT],
-                'served': self.served_by_priority[Priority.BY_APPOINTMENT],
-                'rejected': self.rejected_by_priority[Priority.BY_APPOINTMENT],
-                'rejection_rate': self.get_rejection_rate(Priority.BY_APPOINTMENT)
-            },
-            'walkin_stats': {
-                'arrived': self.patients_by_priority[Priority.WITHOUT_APPOINTMENT],
-                'served': self.served_by_priority[Priority.WITHOUT_APPOINTMENT],
-                'rejected': self.rejected_by_priority[Priority.WITHOUT_APPOINTMENT],
-                'rejection_rate': self.get_rejection_rate(Priority.WITHOUT_APPOINTMENT)
+            'total_arrived': aggregate['total_arrived'],
+            'total_served': aggregate['total_served'],
+            'total_rejected': aggregate['total_rejected'],
+            'rejection_rate': aggregate['rejection_rate'],
+            'total_abandoned': aggregate['total_abandoned'],
+            'total_balked': aggregate['total_balked'],
+            'avg_wait_time': aggregate['avg_wait_time'],
+            'avg_service_time': aggregate['avg_service_time'],
+            'by_priority': {
+                priority.name: {
+                    'arrived': stats['arrived'],
+                    'served': stats['served'],
+                    'rejected': stats['rejected'],
+                    'rejection_rate': stats['rejection_rate'],
+                    'abandoned': stats['abandoned'],
+                    'balked': stats['balked']
+                } for priority, stats in aggregate['priorities'].items()
             }
         }
 
     def __str__(self) -> str:
-        return self.get_current_state()
\ No newline at end of file
+        return self.get_current_state()
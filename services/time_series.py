@@ -0,0 +1,133 @@
+import csv
+from array import array
+from typing import Dict, List, Optional, Tuple
+from config.settings import TIME_SERIES_SETTINGS
+
+# Показатели ряда
+CHANNELS = ('buffer_size', 'busy_doctors', 'rejections', 'mean_wait')
+
+
+class TimeSeriesSampler:
+    """Временной ряд состояния системы фиксированного объема.
+    Наблюдатель ядра опрашивает состояние с шагом interval модельного времени
+    (значение на момент опроса - состояние после последнего события до него).
+    Отсчеты копятся в интервалах предвыделенных массивов: для каждого показателя
+    минимум, максимум и сумма (для среднего). Когда интервалы заканчиваются,
+    соседние сливаются попарно и длина интервала удваивается, поэтому память
+    не зависит от горизонта прогона. Опросы идут с момента start_time включения ряда."""
+
+    def __init__(self, interval: Optional[float] = None, capacity: Optional[int] = None,
+                 start_time: float = 0.0):
+        self.interval = interval or TIME_SERIES_SETTINGS['interval']
+        self.capacity = max(2, capacity or TIME_SERIES_SETTINGS['capacity'])
+        self.samples_per_bucket = 1  # Отсчетов в полном интервале
+        self.size = 0  # Занято интервалов
+        self.total_samples = 0
+        self.start_time = start_time
+        self.next_sample_time = start_time
+
+        zeros = bytes(8 * self.capacity)
+        self.counts = array('q', zeros)
+        self.minimums = [array('d', zeros) for _ in CHANNELS]
+        self.maximums = [array('d', zeros) for _ in CHANNELS]
+        self.sums = [array('d', zeros) for _ in CHANNELS]
+
+        # Состояние после последнего события - действует до следующего события
+        self._state: Tuple[float, ...] = (0.0,) * len(CHANNELS)
+
+    def on_event(self, core) -> None:
+        """Вызывается ядром после каждого обработанного события"""
+        # Моменты опроса до текущего события видят состояние до него
+        while self.next_sample_time < core.current_time:
+            self.add(self._state)
+            self.next_sample_time += self.interval
+        self._state = self._read_state(core)
+
+    @staticmethod
+    def _read_state(core) -> Tuple[float, ...]:
+        statistics = core.statistics
+        busy = 0
+        for doctor in core.doctors:
+            if doctor.is_busy:
+                busy += 1
+        served = statistics.total_patients_served
+        mean_wait = statistics.total_wait_time / served if served > 0 else 0.0
+        return (float(core.waiting_room.size), float(busy),
+                float(statistics.total_patients_rejected), mean_wait)
+
+    def add(self, values: Tuple[float, ...]) -> None:
+        """Добавляет отсчет в текущий интервал или открывает новый"""
+        last = self.size - 1
+        if self.size == 0 or self.counts[last] >= self.samples_per_bucket:
+            if self.size == self.capacity:
+                self._downsample()
+            index = self.size
+            self.size += 1
+            self.counts[index] = 1
+            for channel, value in enumerate(values):
+                self.minimums[channel][index] = value
+                self.maximums[channel][index] = value
+                self.sums[channel][index] = value
+        else:
+            self.counts[last] += 1
+            for channel, value in enumerate(values):
+                if value < self.minimums[channel][last]:
+                    self.minimums[channel][last] = value
+                if value > self.maximums[channel][last]:
+                    self.maximums[channel][last] = value
+                self.sums[channel][last] += value
+        self.total_samples += 1
+
+    def _downsample(self) -> None:
+        """Сливает интервалы попарно на месте: вдвое меньше интервалов вдвое большей длины"""
+        counts = self.counts
+        merged = 0
+        for i in range(0, self.size, 2):
+            j = i + 1
+            if j < self.size:
+                counts[merged] = counts[i] + counts[j]
+                for channel in range(len(CHANNELS)):
+                    minimums, maximums, sums = self.minimums[channel], self.maximums[channel], self.sums[channel]
+                    minimums[merged] = min(minimums[i], minimums[j])
+                    maximums[merged] = max(maximums[i], maximums[j])
+                    sums[merged] = sums[i] + sums[j]
+            else:
+                counts[merged] = counts[i]
+                for channel in range(len(CHANNELS)):
+                    self.minimums[channel][merged] = self.minimums[channel][i]
+                    self.maximums[channel][merged] = self.maximums[channel][i]
+                    self.sums[channel][merged] = self.sums[channel][i]
+            merged += 1
+        self.size = merged
+        self.samples_per_bucket *= 2
+
+    def get_series(self) -> Dict[str, List[float]]:
+        """Ряд по интервалам: начало интервала и минимум, максимум, среднее каждого показателя"""
+        series: Dict[str, List[float]] = {'time': []}
+        for name in CHANNELS:
+            series[f"{name}_min"] = []
+            series[f"{name}_max"] = []
+            series[f"{name}_mean"] = []
+
+        bucket_length = self.samples_per_bucket * self.interval
+        for index in range(self.size):
+            series['time'].append(self.start_time + index * bucket_length)
+            count = self.counts[index]
+            for channel, name in enumerate(CHANNELS):
+                series[f"{name}_min"].append(self.minimums[channel][index])
+                series[f"{name}_max"].append(self.maximums[channel][index])
+                series[f"{name}_mean"].append(self.sums[channel][index] / count)
+        return series
+
+    def write_csv(self, path: str) -> None:
+        """Сохраняет ряд в CSV (одна строка на интервал)"""
+        series = self.get_series()
+        columns = list(series)
+        with open(path, 'w', newline='', encoding='utf-8') as output:
+            writer = csv.writer(output)
+            writer.writerow(columns)
+            writer.writerows(zip(*(series[column] for column in columns)))
+
+    def __str__(self) -> str:
+        return (f"TimeSeriesSampler(interval={self.interval}, buckets={self.size}/{self.capacity}, "
+                f"bucket_length={self.samples_per_bucket * self.interval}, samples={self.total_samples})")
@@ -1,6 +1,5 @@
 from typing import Optional, List
 from entities.patient import Patient
-from entities.priority import Priority
 
 
 class WaitingRoom:
@@ -91,9 +90,11 @@ class WaitingRoom:
             return None
 
         # Ищем пациента с максимальным приоритетом (минимальное значение Enum)
-        selected_patient = None
-        selected_index = -1
-        highest_priority = Priority.WITHOUT_APPOINTMENT  # Начинаем с низшего
+        # Начинаем с первого пациента в буфере, иначе пациенты низшего
+        # приоритета никогда не были бы выбраны
+        selected_patient = self.patients[0]
+        selected_index = 0
+        highest_priority = selected_patient.priority
 
         for i, patient in enumerate(self.patients):
             # Сравниваем приоритеты (меньшее значение = высший приоритет)
@@ -103,7 +104,6 @@ class WaitingRoom:
                 selected_index = i
             # Если приоритеты равны, выбираем того, кто раньше пришел
             elif (patient.priority == highest_priority and
-                  selected_patient is not None and
                   patient.arrival_time < selected_patient.arrival_time):
                 selected_patient = patient
                 selected_index = i
@@ -117,6 +117,14 @@ class WaitingRoom:
 
         return None
 
+    def remove_patient_by_id(self, patient_id: int) -> Optional[Patient]:
+        """Удаляет пациента, покинувшего очередь, и возвращает его (None, если его нет в буфере)"""
+        for i, patient in enumerate(self.patients):
+            if patient.id == patient_id:
+                self._remove_patient(i)
+                return patient
+        return None
+
     def _remove_patient(self, index: int) -> None:
         """Удаляет пациента по индексу"""
         if 0 <= index < len(self.patients):
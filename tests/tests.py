@@ -0,0 +1,1040 @@
+import csv
+import json
+import math
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+from config.scenario import compile_scenario
+from core.arrival_profile import ArrivalProfile
+from core.arrival_trace import ArrivalTrace, convert_arrival_trace
+from core.fast_kernel import run_fast
+from core.optimizer import Candidate, StaffingOptimizer
+from core.splitting import SplittingEstimator
+from core.surrogate import GaussianProcess, latin_hypercube
+from core.simulation_core import SimulationCore
+from core.breakpoints import parse_breakpoint
+from core.time_parallel import (PatientRecord, SegmentState, TimeParallelSimulation, _simulate_segment,
+                                capture_state, combine_statistics, draw_arrival_marks, restore_state)
+from entities.patient import Patient
+from entities.priority import Priority
+from services.histogram import LogLinearHistogram
+from services.moments import RunningMoments
+from services.patient_export import PatientRecordExporter, read_npz_chunk
+from services.results_store import ResultsStore
+from services.service_time import make_service_time_law
+from services.state_publisher import StateSnapshotCache
+from services.statistics import Statistics
+from services.time_series import CHANNELS, TimeSeriesSampler
+from services.waiting_room import WaitingRoom
+from utils.output import suppressed_output
+
+
+def _object_engine_run(horizon, num_doctors, buffer_capacity, mean_service_time, seed, scenario=None):
+    random.seed(seed)
+    with suppressed_output():
+        core = SimulationCore(scenario)
+        core.initialize_system(num_doctors=num_doctors, buffer_capacity=buffer_capacity,
+                               mean_service_time=mean_service_time)
+    core.run_until(horizon)
+    core.close()
+    return core.statistics
+
+
+def _metrics(statistics, horizon, num_doctors):
+    report = statistics.generate_detailed_report(horizon, num_doctors)
+    system = report['system_characteristics']
+    arrived = statistics.total_patients_arrived
+    return {
+        'total_reject_rate': system['total_reject_rate'],
+        'abandonment_rate': system['abandonment_rate'],
+        'balking_rate': system['balking_rate'],
+        'avg_wait_time': system['avg_wait_time'],
+        'avg_service_time': system['avg_service_time'],
+        'system_utilization': system['system_utilization'],
+        'arrival_rate': arrived / horizon,
+        'emergency_share': statistics.patients_by_priority[Priority.EMERGENCY] / arrived
+    }
+
+
+def _welch_t(a, b):
+    mean_a, mean_b = sum(a) / len(a), sum(b) / len(b)
+    var_a = sum((x - mean_a) ** 2 for x in a) / (len(a) - 1)
+    var_b = sum((x - mean_b) ** 2 for x in b) / (len(b) - 1)
+    standard_error = math.sqrt(var_a / len(a) + var_b / len(b))
+    return (mean_a - mean_b) / standard_error if standard_error > 0 else 0.0
+
+
+class FastKernelEquivalenceTest(unittest.TestCase):
+    """Компактное ядро и объектная модель должны давать статистически одинаковые результаты"""
+
+    HORIZON = 20000.0
+    REPLICATIONS = 30
+
+    def _compare(self, num_doctors, buffer_capacity, mean_service_time, scenario=None):
+        fast, engine = [], []
+        for seed in range(self.REPLICATIONS):
+            fast.append(_metrics(run_fast(self.HORIZON, num_doctors, buffer_capacity, mean_service_time,
+                                          scenario=scenario, seed=seed), self.HORIZON, num_doctors))
+            engine.append(_metrics(_object_engine_run(self.HORIZON, num_doctors, buffer_capacity,
+                                                      mean_service_time, seed=10_000 + seed, scenario=scenario),
+                                   self.HORIZON, num_doctors))
+
+        for metric in fast[0]:
+            t = _welch_t([m[metric] for m in fast], [m[metric] for m in engine])
+            self.assertLess(abs(t), 4.0, f"{metric}: t = {t:.2f}")
+
+    def test_heavy_load(self):
+        self._compare(num_doctors=3, buffer_capacity=2, mean_service_time=35.0)
+
+    def test_light_load(self):
+        self._compare(num_doctors=3, buffer_capacity=5, mean_service_time=15.0)
+
+    def test_service_time_laws(self):
+        scenario = compile_scenario({'service_time': {
+            'default': {'law': 'lognormal', 'cv': 1.5},
+            'by_doctor': {2: {'law': 'erlang', 'k': 2, 'mean': 40.0}},
+            'by_priority': {'EMERGENCY': {'law': 'empirical', 'path': 'config/service_times_example.csv'}}
+        }})
+        self._compare(num_doctors=3, buffer_capacity=2, mean_service_time=30.0, scenario=scenario)
+
+    def test_patience(self):
+        scenario = compile_scenario({'patience': {
+            'by_priority': {'WITHOUT_APPOINTMENT': {'law': 'exponential', 'mean': 20.0},
+                            'BY_APPOINTMENT': {'law': 'erlang', 'k': 3, 'mean': 45.0}},
+            'balk_threshold': {'WITHOUT_APPOINTMENT': 2}
+        }})
+        self._compare(num_doctors=3, buffer_capacity=4, mean_service_time=60.0, scenario=scenario)
+
+    def test_conservation(self):
+        statistics = run_fast(self.HORIZON, 2, 3, 30.0, seed=1)
+        in_system = (statistics.total_patients_arrived - statistics.total_patients_served -
+                     statistics.total_patients_rejected)
+        self.assertGreaterEqual(in_system, 0)
+        self.assertLessEqual(in_system, 2 + 3)
+        self.assertEqual(sum(stats['served_count'] for stats in statistics.doctors_stats.values()),
+                         statistics.total_patients_served)
+
+    def test_reproducible(self):
+        first = run_fast(self.HORIZON, seed=7).get_summary()
+        second = run_fast(self.HORIZON, seed=7).get_summary()
+        self.assertEqual(first, second)
+
+
+class ServiceTimeLawTest(unittest.TestCase):
+    """Выборочное среднее законов обслуживания совпадает с заявленным средним"""
+
+    def _check_mean(self, spec, mean, n=40000):
+        law = make_service_time_law(spec, 30.0)
+        self.assertAlmostEqual(law.mean, mean)
+        random.seed(5)
+        moments = RunningMoments()
+        moments.record_all(law.sample() for _ in range(n))
+        # Допуск - четыре стандартные ошибки выборочного среднего
+        self.assertLess(abs(moments.mean - mean), 4 * moments.std / math.sqrt(n), msg=spec['law'])
+
+    def test_sample_means(self):
+        self._check_mean({'law': 'erlang', 'k': 3}, 30.0)
+        self._check_mean({'law': 'lognormal', 'mean': 20.0, 'cv': 0.8}, 20.0)
+        self._check_mean({'law': 'hyperexponential', 'mean': 40.0, 'probabilities': (0.2, 0.8)}, 40.0)
+        values = [5.0, 12.0, 20.0, 31.0, 60.0]
+        self._check_mean({'law': 'empirical', 'values': values},
+                         sum(values[i] + values[i + 1] for i in range(4)) / 8)
+
+    def test_hyperexponential_weights_normalised(self):
+        self._check_mean({'law': 'hyperexponential', 'mean': 40.0, 'probabilities': (1, 1)}, 40.0)
+        with self.assertRaises(ValueError):
+            make_service_time_law({'law': 'hyperexponential', 'probabilities': (1, -1)}, 30.0)
+
+
+class TimeParallelTest(unittest.TestCase):
+    """Сошедшийся параллельный по времени прогон совпадает с последовательным прогоном
+    сегментов, каждый из которых начинается с истинного конца предыдущего"""
+
+    def test_matches_sequential(self):
+        simulation = TimeParallelSimulation(4000.0, num_doctors=2, buffer_capacity=3, mean_service_time=40.0,
+                                            segments=4, workers=2, seed=11)
+        result = simulation.run()
+
+        state = simulation.initial_states()[0]
+        parts = []
+        for index in range(simulation.segments):
+            segment = _simulate_segment(simulation._task(index, state))
+            parts.append(segment.statistics)
+            state = segment.end_state
+        sequential = combine_statistics(parts)
+
+        self.assertEqual(result['statistics'].get_summary(), sequential.get_summary())
+        self.assertEqual(result['statistics'].doctors_stats, sequential.doctors_stats)
+        self.assertEqual(result['final_state'].key(), state.key())
+        self.assertGreater(sequential.total_patients_rejected, 0)
+        self.assertGreater(result['iterations'], 1)  # Начальные приближения были неверны
+
+    def test_matches_single_run(self):
+        # Один обычный прогон всего горизонта на тех же метках прибытий
+        simulation = TimeParallelSimulation(4000.0, num_doctors=2, buffer_capacity=3, mean_service_time=40.0,
+                                            segments=4, workers=2, seed=11)
+        result = simulation.run()
+
+        with suppressed_output():
+            core = SimulationCore(simulation.scenario)
+            core.initialize_system(**simulation.params)
+            core.patient_generator.arrival_marks = iter(simulation.marks)
+            core.run_until(simulation.horizon)
+            core.close()
+
+        parallel = result['statistics']
+        self.assertEqual(sum(parallel.generated_by_source), len(simulation.marks))
+        for key, value in core.statistics.get_summary().items():
+            if isinstance(value, float):
+                self.assertAlmostEqual(parallel.get_summary()[key], value, places=6, msg=key)
+            else:
+                self.assertEqual(parallel.get_summary()[key], value, msg=key)
+        for doctor_id, stats in core.statistics.doctors_stats.items():
+            self.assertEqual(parallel.doctors_stats[doctor_id]['served_count'], stats['served_count'])
+            self.assertAlmostEqual(parallel.doctors_stats[doctor_id]['busy_time'], stats['busy_time'], places=6)
+        self.assertEqual(result['final_state'].arrival, capture_state(core).arrival)
+
+    def test_rejects_doctor_laws(self):
+        scenario = compile_scenario({'service_time': {'by_doctor': {'1': {'law': 'erlang', 'k': 2}}}})
+        with self.assertRaises(ValueError):
+            TimeParallelSimulation(1000.0, scenario=scenario)
+
+
+class EventBatchingTest(unittest.TestCase):
+    """Пакеты событий с одинаковым временем не меняют исходов пациентов"""
+
+    HORIZON = 5000.0
+
+    def _run(self, batch_same_time, seed):
+        # Постоянное время приема и полный буфер в начале смены - врачи освобождаются одновременно
+        scenario = compile_scenario({'system': {'batch_same_time': batch_same_time},
+                                     'service_time': {'default': {'law': 'discrete', 'values': [30.0]}}})
+        random.seed(seed)
+        with suppressed_output():
+            core = SimulationCore(scenario)
+            core.initialize_system(num_doctors=3, buffer_capacity=6, mean_service_time=30.0)
+            buffer = tuple(PatientRecord(1_000_000 + i, 1 + i % 3, f"P{i}", 0.0, None) for i in range(6))
+            restore_state(core, SegmentState(time=0.0, buffer=buffer, doctors=(None,) * 3))
+            core.dispatcher.dispatch(0.0)
+        core.run_until(self.HORIZON)
+        return core
+
+    def test_same_outcomes(self):
+        for seed in range(5):
+            sequential = self._run(False, seed)
+            batched = self._run(True, seed)
+            self.assertEqual(sequential.statistics.get_summary(), batched.statistics.get_summary())
+            self.assertEqual(sequential.processed_events, batched.processed_events)
+
+    def test_peek_step_batch(self):
+        random.seed(17)
+        with suppressed_output():
+            core = SimulationCore(compile_scenario({'system': {'batch_same_time': True}}))
+            core.initialize_system(num_doctors=3, buffer_capacity=6, mean_service_time=30.0)
+        events = []
+        for patient_id in range(200):
+            time = 10.0 if patient_id % 4 == 0 else random.choice([10.0, random.uniform(10.0, 50.0)])
+            event = core.event_pool.service_end(time=time, doctor_id=1, patient_id=patient_id)
+            core.schedule_event(event)
+            events.append(event)
+        for event in events[::7]:
+            core.cancel_event(event)
+
+        batch = core.peek_step()
+        expected = sorted(event for event in core.event_queue if event.time == 10.0 and not event.cancelled)
+        self.assertGreater(len(expected), 50)
+        self.assertEqual([event.patient_id for event in batch], [event.patient_id for event in expected])
+
+class DispatcherTest(unittest.TestCase):
+    """Один проход диспетчера: свободные врачи по кольцу (Д2П2), пациенты по приоритету (Д2Б4)"""
+
+    def _dispatch(self, drain_all):
+        scenario = compile_scenario({'system': {'drain_all': drain_all}})
+        # (id, источник, время прибытия): неотложный 3, затем по записи 2 и 5, затем без записи 1 и 4
+        buffer = tuple(PatientRecord(patient_id, source_id, f"P{patient_id}", arrival_time, None)
+                       for patient_id, source_id, arrival_time in
+                       ((1, 3, 1.0), (2, 2, 2.0), (3, 1, 3.0), (4, 3, 4.0), (5, 2, 5.0)))
+        random.seed(16)
+        with suppressed_output():
+            core = SimulationCore(scenario)
+            core.initialize_system(num_doctors=3, buffer_capacity=5, mean_service_time=30.0)
+            restore_state(core, SegmentState(time=6.0, buffer=buffer, doctors=(None,) * 3, next_doctor_index=1))
+            assigned = core.dispatcher.dispatch(6.0)
+        patients = [doctor.current_patient.id if doctor.is_busy else None for doctor in core.doctors]
+        waiting = [patient.id for patient in core.waiting_room.patients]
+        return assigned, patients, waiting, core.dispatcher.next_doctor_index
+
+    def test_drain_all(self):
+        assigned, patients, waiting, next_index = self._dispatch(True)
+        self.assertEqual(assigned, 3)
+        # Кольцо с врача 1: врачи 1, 2, 0 получают пациентов 3, 2, 5
+        self.assertEqual(patients, [5, 3, 2])
+        self.assertEqual(sorted(waiting), [1, 4])
+        self.assertEqual(next_index, 1)
+
+    def test_single_assignment(self):
+        assigned, patients, waiting, next_index = self._dispatch(False)
+        self.assertEqual(assigned, 1)
+        self.assertEqual(patients, [None, 3, None])
+        self.assertEqual(sorted(waiting), [1, 2, 4, 5])
+        self.assertEqual(next_index, 2)
+
+
+class FastForwardTest(unittest.TestCase):
+    """Перемотка пошагового режима останавливается по числу шагов, времени и точкам останова"""
+
+    def _core(self):
+        random.seed(3)
+        with suppressed_output():
+            core = SimulationCore()
+            core.initialize_system(num_doctors=2, buffer_capacity=2, mean_service_time=40.0)
+            core.patient_generator.start_generation()
+        core.running = True
+        return core
+
+    def test_steps_and_time(self):
+        core = self._core()
+        steps, hits = core.fast_forward(max_steps=50)
+        self.assertEqual((steps, hits), (50, []))
+        self.assertEqual(core.processed_events, 50)
+
+        core.fast_forward(until_time=2000.0)
+        self.assertLess(core.current_time, 2000.0)
+        self.assertGreaterEqual(core.peek_step()[0].time, 2000.0)
+
+    def test_breakpoints(self):
+        core = self._core()
+        core.breakpoints.append(parse_breakpoint('patient 25', core.scenario))
+        core.fast_forward()
+        self.assertEqual(core.peek_step()[0].patient_id, 25)
+
+        core.breakpoints[:] = [parse_breakpoint('reject emergency', core.scenario)]
+        rejected = core.statistics.rejected_by_source[1]
+        core.fast_forward()
+        self.assertEqual(core.statistics.rejected_by_source[1], rejected + 1)
+        self.assertIsNone(parse_breakpoint('reject nobody', core.scenario))
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), "ветвление требует os.fork")
+class BranchTest(unittest.TestCase):
+    """Ветви "что если" продолжают текущее состояние, не меняя его"""
+
+    def _core(self):
+        random.seed(5)
+        with suppressed_output():
+            core = SimulationCore()
+            core.initialize_system(num_doctors=2, buffer_capacity=3, mean_service_time=40.0)
+        core.run_until(300.0)
+        return core
+
+    def test_branches(self):
+        core = self._core()
+        processed = core.processed_events
+        same, more = core.branch([{}, {'num_doctors': 4}], horizon=600.0)
+        self.assertEqual(core.processed_events, processed)
+        self.assertEqual(core.current_time, 300.0)
+        self.assertLess(more['summary']['avg_wait_time'], same['summary']['avg_wait_time'])
+
+        # Ветвь без изменений совпадает с обычным продолжением (тот же генератор случайных чисел)
+        core.statistics.reset_statistics()
+        core.run_until(900.0)
+        self.assertEqual(same['summary'], core.statistics.get_summary())
+
+
+class StatisticsMergeTest(unittest.TestCase):
+    """Объединение статистики ассоциативно и совпадает с расчетом по всем значениям;
+    упакованный вид восстанавливает те же отчеты"""
+
+    def _parts(self):
+        return [run_fast(3000.0 * (seed + 1), 3, 4, 30.0, seed=seed) for seed in range(3)]
+
+    def test_merge(self):
+        # Параллельная формула Уэлфорда совпадает с расчетом по всем значениям
+        generator = random.Random(1)
+        values = [generator.expovariate(0.1) for _ in range(3000)]
+        chunks = [RunningMoments() for _ in range(3)]
+        for index, value in enumerate(values):
+            chunks[index % 3].record(value)
+        for moments in ((chunks[0] + chunks[1]) + chunks[2], chunks[0] + (chunks[1] + chunks[2])):
+            self.assertEqual(moments.count, len(values))
+            self.assertAlmostEqual(moments.mean, sum(values) / len(values), places=9)
+            self.assertAlmostEqual(moments.variance, Statistics().calculate_variance(values), places=6)
+
+        a, b, c = self._parts()
+        left, right = (a + b) + c, a + (b + c)
+        for source_id in left.scenario.source_ids:
+            self.assertEqual(left.wait_moments[source_id].count,
+                             sum(part.wait_moments[source_id].count for part in (a, b, c)))
+        self.assertEqual(left.get_summary()['total_arrived'],
+                         sum(part.total_patients_arrived for part in (a, b, c)))
+        # Порядок объединения меняет результат только в пределах округления
+        for metric, value in _metrics(left, 9000.0, 3).items():
+            self.assertAlmostEqual(value, _metrics(right, 9000.0, 3)[metric], places=9)
+
+    def test_bytes(self):
+        parts = self._parts()
+        merged = sum(parts[1:], parts[0])
+        restored = Statistics.from_bytes(merged.to_bytes())
+        self.assertEqual(restored.generate_detailed_report(9000.0, 3), merged.generate_detailed_report(9000.0, 3))
+        for source in restored.scenario.sources:
+            self.assertEqual(len(restored.wait_times_by_priority[source.priority]),
+                             len(merged.wait_histograms[source.source_id]))
+        # Свертка упакованных частей дает то же, что объединение исходных
+        folded = Statistics()
+        for part in parts:
+            folded.merge(Statistics.from_bytes(part.to_bytes()))
+        self.assertEqual(folded.get_summary(), merged.get_summary())
+
+
+class ArrivalTraceTest(unittest.TestCase):
+    """Журнал поступлений воспроизводится обеими моделями одинаково, в CSV и двоичном виде"""
+
+    TRACE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config', 'arrival_trace_example.csv')
+
+    def _arrived(self, scenario):
+        fast = run_fast(10000.0, 2, 3, 15.0, scenario=scenario, seed=1)
+        engine = _object_engine_run(10000.0, 2, 3, 15.0, seed=1, scenario=scenario)
+        self.assertEqual(fast.arrived_by_source, engine.arrived_by_source)
+        return fast.arrived_by_source
+
+    def test_replay(self):
+        scenario = compile_scenario({'arrival_trace': {'path': self.TRACE}})
+        with ArrivalTrace(self.TRACE, scenario) as trace:
+            expected = [0] * (max(scenario.source_ids) + 1)
+            previous = 0.0
+            for arrival_time, source_id in iter(trace.next_arrival, None):
+                self.assertGreaterEqual(arrival_time, previous)
+                previous = arrival_time
+                expected[source_id] += 1
+        self.assertEqual(self._arrived(scenario), expected)
+
+        with tempfile.TemporaryDirectory() as directory:
+            binary_path = os.path.join(directory, 'trace.bin')
+            self.assertEqual(convert_arrival_trace(self.TRACE, binary_path, scenario), sum(expected))
+            binary = compile_scenario({'arrival_trace': {'path': binary_path}})
+            self.assertEqual(self._arrived(binary), expected)
+
+    def test_shift_and_scale(self):
+        scenario = compile_scenario({'arrival_trace': {'path': self.TRACE, 'start': '2023-01-09 10:00',
+                                                       'scale': 0.5}})
+        with ArrivalTrace(self.TRACE, scenario, start=scenario.arrival_trace_start, scale=0.5) as trace:
+            self.assertEqual(trace.next_arrival(), (2.75, 2))  # 10:05:30, вдвое быстрее
+        # Запись, переставленная дальше окна упорядочивания, - ошибка
+        with ArrivalTrace(self.TRACE, scenario, lookahead=1) as trace:
+            with self.assertRaises(ValueError):
+                while trace.next_arrival() is not None:
+                    pass
+
+    def test_trace_closed(self):
+        scenario = compile_scenario({'arrival_trace': {'path': self.TRACE}})
+        with suppressed_output():
+            # Исчерпанный журнал закрывается сам
+            core = SimulationCore(scenario)
+            core.initialize_system(num_doctors=2, buffer_capacity=3, mean_service_time=15.0)
+            core.run_until(10 ** 7)
+            self.assertTrue(core.patient_generator.arrival_trace.closed)
+
+            with SimulationCore(scenario) as core:
+                core.initialize_system(num_doctors=2, buffer_capacity=3, mean_service_time=15.0)
+                core.run_until(60.0)
+                trace = core.patient_generator.arrival_trace
+                self.assertFalse(trace.closed)
+        self.assertTrue(trace.closed)
+
+
+class SplittingTest(unittest.TestCase):
+    """Расщепление на маленькой системе (уровни часто перескакиваются) согласуется
+    с прямым долгим прогоном"""
+
+    def test_matches_crude(self):
+        crude = run_fast(3_000_000.0, 2, 2, 40.0, seed=3)
+        source_id = crude.scenario.get_source(Priority.EMERGENCY).source_id
+        arrived = crude.arrived_by_source[source_id]
+        p_crude = crude.rejected_by_source[source_id] / arrived
+        crude_error = math.sqrt(p_crude * (1 - p_crude) / arrived)
+
+        result = SplittingEstimator(2, 2, 40.0, effort=300, replications=6, seed=5).run()
+        split_error = (result['confidence_interval'][1] - result['p_reject']) / crude.scenario.confidence_t_alpha
+        self.assertGreater(split_error, 0)
+        self.assertLess(abs(result['p_reject'] - p_crude), 4 * math.hypot(crude_error, split_error))
+
+
+class PatientExportTest(unittest.TestCase):
+    """Выгрузка исходов пациентов"""
+
+    def _run(self, exporter, scenario=None, horizon=3000.0):
+        random.seed(4)
+        with suppressed_output():
+            core = SimulationCore(scenario)
+            core.initialize_system(num_doctors=2, buffer_capacity=3, mean_service_time=40.0)
+        core.statistics.add_listener(exporter)
+        core.run_until(horizon)
+        exporter.close()
+        return core.statistics
+
+    def _outcomes(self, path):
+        with open(path, newline='', encoding='utf-8') as table:
+            return [row['outcome'] for row in csv.DictReader(table)]
+
+    def test_csv_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'patients.csv')
+            exporter = PatientRecordExporter(path, buffer_size=16)
+            statistics = self._run(exporter)
+            outcomes = self._outcomes(path)
+        total = statistics.total_patients_served + statistics.total_patients_rejected
+        self.assertGreater(statistics.total_patients_rejected, 0)
+        self.assertEqual(len(outcomes), total)
+        self.assertEqual(exporter.total_written, total)
+        self.assertGreater(exporter.chunks_written, 1)
+        self.assertEqual(outcomes.count('served'), statistics.total_patients_served)
+
+    def test_npz_chunks(self):
+        with tempfile.TemporaryDirectory() as directory:
+            exporter = PatientRecordExporter(os.path.join(directory, 'patients.npz'), 'npz', buffer_size=16)
+            statistics = self._run(exporter)
+            chunks = sorted(name for name in os.listdir(directory) if name.endswith('.npz'))
+            columns = [read_npz_chunk(os.path.join(directory, name)) for name in chunks]
+        self.assertEqual(len(chunks), exporter.chunks_written)
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk['patient_id']) == 16 for chunk in columns[:-1]))
+        patient_ids = [patient_id for chunk in columns for patient_id in chunk['patient_id']]
+        self.assertEqual(len(patient_ids), statistics.total_patients_served + statistics.total_patients_rejected)
+        self.assertEqual(len(set(patient_ids)), len(patient_ids))
+        served = sum(chunk['outcome'].count(0) for chunk in columns)
+        self.assertEqual(served, statistics.total_patients_served)
+
+    def test_patience_outcomes(self):
+        scenario = compile_scenario({'patience': {
+            'by_priority': {'WITHOUT_APPOINTMENT': {'law': 'exponential', 'mean': 10.0}},
+            'balk_threshold': {'BY_APPOINTMENT': 2}
+        }})
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'patients.csv')
+            statistics = self._run(PatientRecordExporter(path), scenario)
+            outcomes = self._outcomes(path)
+        self.assertGreater(statistics.total_patients_abandoned, 0)
+        self.assertGreater(statistics.total_patients_balked, 0)
+        self.assertEqual(outcomes.count('abandoned'), statistics.total_patients_abandoned)
+        self.assertEqual(outcomes.count('balked'), statistics.total_patients_balked)
+
+
+class ScenarioPriorityTest(unittest.TestCase):
+    """Приоритеты принадлежат сценарию: реестр стандартных категорий не меняется"""
+
+    @staticmethod
+    def _sources(emergency_value, display_name, extra_key='TRIAGE'):
+        return {'sources': [
+            {'source_id': 1, 'key': 'EMERGENCY', 'priority': emergency_value, 'min_interval': 45.0,
+             'max_interval': 120.0, 'probability': 0.5, 'description': "Неотложная помощь",
+             'display_name': display_name},
+            {'source_id': 2, 'key': extra_key, 'priority': 2, 'min_interval': 10.0,
+             'max_interval': 25.0, 'probability': 0.5, 'description': "Сортировка", 'display_name': "Сортировка"}
+        ]}
+
+    def test_conflicting_scenarios(self):
+        first = compile_scenario(self._sources(1, "Скорая"))
+        second = compile_scenario(self._sources(5, "Реанимация"))
+        self.assertEqual(first.get_source(Priority.EMERGENCY).priority.value, 1)
+        self.assertEqual(second.get_source(Priority.EMERGENCY).priority.value, 5)
+        self.assertEqual(str(second.get_source(Priority.EMERGENCY).priority), "Реанимация")
+        self.assertEqual(Priority.EMERGENCY.value, 1)
+        self.assertEqual(str(Priority.EMERGENCY), "срочно")
+        self.assertNotIn('TRIAGE', Priority.__members__)
+
+        # Более важная категория второго сценария - TRIAGE (2 < 5)
+        self.assertLess(second.sources[1].priority, second.get_source(Priority.EMERGENCY).priority)
+
+    def test_failed_validation_leaves_registry(self):
+        members = Priority.__members__
+        with self.assertRaises(ValueError):
+            compile_scenario({'sources': [
+                {'source_id': 1, 'key': 'NIGHT', 'priority': 1, 'min_interval': 45.0, 'max_interval': 120.0,
+                 'probability': 0.5, 'description': "Ночь", 'display_name': "Ночь"},
+                {'source_id': 2, 'key': 'WEEKEND', 'priority': 1, 'min_interval': 10.0, 'max_interval': 25.0,
+                 'probability': 0.5, 'description': "Выходные", 'display_name': "Выходные"}
+            ]})
+        self.assertEqual(Priority.__members__, members)
+
+
+class ScenarioLoadTest(unittest.TestCase):
+    """Загрузка сценария из JSON и TOML и ошибки проверки"""
+
+    EXAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config', 'scenario_example.json')
+
+    def test_load_json_and_toml(self):
+        from config.scenario import load_scenario
+
+        scenario = load_scenario(self.EXAMPLE)
+        self.assertEqual(scenario.name, 'example')
+        self.assertEqual((scenario.num_doctors, scenario.buffer_capacity), (3, 5))
+        self.assertEqual(scenario.mean_service_time, 15.0)
+        self.assertEqual([source.probability for source in scenario.sources], [0.15, 0.45, 0.40])
+
+        toml = """name = "toml"
+
+[system]
+num_doctors = 4
+buffer_capacity = 2
+
+[service_time.by_priority.EMERGENCY]
+law = "erlang"
+k = 3
+"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'scenario.toml')
+            with open(path, 'w', encoding='utf-8') as scenario_file:
+                scenario_file.write(toml)
+            scenario = load_scenario(path)
+        self.assertEqual(scenario.name, 'toml')
+        self.assertEqual((scenario.num_doctors, scenario.buffer_capacity), (4, 2))
+        self.assertEqual(scenario.get_service_time_spec(priority=Priority.EMERGENCY)['k'], 3)
+
+    def test_validation_errors(self):
+        source = {'source_id': 1, 'key': 'EMERGENCY', 'min_interval': 5.0, 'max_interval': 10.0,
+                  'probability': 1.0}
+        invalid = [
+            {'num_doctors': 4},  # Ключ раздела на верхнем уровне
+            {'system': {'num_doctor': 4}},
+            {'system': {'bufer_capacity': 9}},
+            {'service_time': {'by_priorty': {}}},
+            {'sources': [dict(source, probabilty=1.0)]},
+            {'sources': [dict(source, probability=0.5)]},  # Сумма вероятностей не 1
+            {'sources': [dict(source, min_interval=20.0)]},
+            {'system': {'num_doctors': 0}},
+            {'service_time': {'by_priority': {'TRIAGE': {'law': 'erlang'}}}},
+        ]
+        for data in invalid:
+            with self.assertRaises(ValueError, msg=data):
+                compile_scenario(data)
+        self.assertEqual(compile_scenario({'sources': [source]}).num_doctors, compile_scenario({}).num_doctors)
+
+
+class SensitivityTest(unittest.TestCase):
+    """IPA-производные согласованы с масштабированием времени: при умножении среднего времени
+    приема и всех границ интервалов на k ожидания умножаются на k, поэтому
+    сумма параметр * производная равна среднему ожиданию.
+    Производные по границам интервалов (IPA) и вероятностям источников (LR) совпадают
+    с конечными разностями на общих случайных числах: прибытия и времена приема
+    разыгрываются заранее одной последовательностью (draw_arrival_marks)"""
+
+    PARAMS = {'num_doctors': 3, 'buffer_capacity': 2, 'mean_service_time': 35.0}
+    HORIZON = 20000.0
+
+    def _run(self, sources, seed, sensitivity=False):
+        # sources=None - источники сценария по умолчанию
+        scenario = compile_scenario({'sources': sources} if sources is not None else {})
+        marks = draw_arrival_marks(scenario, self.PARAMS, self.HORIZON, seed)
+        with suppressed_output():
+            core = SimulationCore(scenario)
+            core.initialize_system(**self.PARAMS)
+            estimator = core.enable_sensitivity() if sensitivity else None
+            core.patient_generator.arrival_marks = iter(marks)
+            core.run_until(self.HORIZON)
+        statistics = core.statistics
+        return statistics.get_average_wait_time(), statistics.get_rejection_rate() / 100, estimator
+
+    @staticmethod
+    def _sources(key, field, shift):
+        sources = compile_scenario({}).to_dict()['sources']
+        for source in sources:
+            if source['key'] == key:
+                source[field] += shift
+        if field == 'probability':
+            # Вес источника key меняется, остальные - нет; вероятности нормируются
+            total = sum(source['probability'] for source in sources)
+            for source in sources:
+                source['probability'] /= total
+        return sources
+
+    def test_interval_bounds_match_finite_differences(self):
+        h = 1e-3
+        for seed in range(2):
+            _, _, estimator = self._run(None, seed, sensitivity=True)
+            rows = {row['parameter']: row for row in estimator.get_estimates() if row['method'] == 'IPA'}
+            for source in compile_scenario({}).sources:
+                for field in ('min_interval', 'max_interval'):
+                    row = rows[f"{field}[{source.key}]"]
+                    plus = self._run(self._sources(source.key, field, h), seed)[0]
+                    minus = self._run(self._sources(source.key, field, -h), seed)[0]
+                    # На одной траектории IPA - точная производная: расхождение много меньше шума оценки
+                    self.assertAlmostEqual(row['derivative'], (plus - minus) / (2 * h),
+                                           delta=0.1 * row['std_error'], msg=(seed, row['parameter']))
+
+    def test_source_probability_matches_finite_differences(self):
+        h, replications = 0.03, 8
+        key = Priority.EMERGENCY.name
+        derivatives = {'avg_wait_time': [], 'p_reject': []}
+        errors = {'avg_wait_time': [], 'p_reject': []}
+        differences = {'avg_wait_time': [], 'p_reject': []}
+        for seed in range(replications):
+            _, _, estimator = self._run(None, seed, sensitivity=True)
+            plus = self._run(self._sources(key, 'probability', h), seed)
+            minus = self._run(self._sources(key, 'probability', -h), seed)
+            for row in estimator.get_estimates():
+                if row['parameter'] == f"probability[{key}]":
+                    index = 0 if row['metric'] == 'avg_wait_time' else 1
+                    derivatives[row['metric']].append(row['derivative'])
+                    errors[row['metric']].append(row['std_error'])
+                    differences[row['metric']].append((plus[index] - minus[index]) / (2 * h))
+
+        for metric in derivatives:
+            lr = sum(derivatives[metric]) / replications
+            lr_error = math.sqrt(sum(error * error for error in errors[metric])) / replications
+            fd = sum(differences[metric]) / replications
+            fd_moments = RunningMoments()
+            fd_moments.record_all(differences[metric])
+            fd_error = fd_moments.std / math.sqrt(replications)
+            self.assertGreater(abs(lr), 3 * lr_error, msg=metric)  # Производная заметно отлична от нуля
+            self.assertAlmostEqual(lr, fd, delta=3 * math.hypot(lr_error, fd_error), msg=metric)
+
+    def test_time_scaling_identity(self):
+        random.seed(2)
+        with suppressed_output():
+            core = SimulationCore(compile_scenario({'system': {'min_service_time': 1e-9}}))
+            core.initialize_system(num_doctors=3, buffer_capacity=5, mean_service_time=35.0)
+            estimator = core.enable_sensitivity()
+        core.run_until(20000.0)
+
+        rows = {row['parameter']: row for row in estimator.get_estimates() if row['method'] == 'IPA'}
+        total = 35.0 * rows['mean_service_time']['derivative']
+        for source in core.scenario.sources:
+            total += source.min_interval * rows[f"min_interval[{source.key}]"]['derivative']
+            total += source.max_interval * rows[f"max_interval[{source.key}]"]['derivative']
+        mean_wait = rows['mean_service_time']['value']
+        self.assertGreater(mean_wait, 0.0)
+        self.assertAlmostEqual(total, mean_wait, delta=1e-6 * mean_wait)
+        self.assertTrue(all(row['std_error'] > 0 for row in estimator.get_estimates()))
+
+
+class OptimizerTest(unittest.TestCase):
+    """Одинаковые значения во всех репликациях не делают допустимость достоверной:
+    разброс ограничен снизу границей Уилсона по счетчикам"""
+
+    def test_zero_variance_floor(self):
+        optimizer = StaffingOptimizer(5.0, 30.0, seed=1)
+        few = Candidate(3, 3, [0.0] * 5, [0.0] * 5, emergency_arrived=10, walkin_served=20,
+                        walkin_wait_errors=[0.0] * 5)
+        self.assertTrue(all(math.isfinite(t) for t, _, _ in optimizer._z_scores(few)))
+        self.assertLess(optimizer._feasibility(few), 1.0)
+        self.assertFalse(optimizer._is_resolved(few))
+
+        many = Candidate(3, 3, [0.0] * 5, [0.0] * 5, emergency_arrived=5000, walkin_served=20000,
+                         walkin_wait_errors=[0.0] * 5)
+        self.assertTrue(optimizer._is_resolved(many))
+
+
+class StateSnapshotCacheTest(unittest.TestCase):
+    """Снимок, версии и изменения между версиями; кэш изменений ограничен историей"""
+
+    def test_snapshot_and_delta(self):
+        random.seed(6)
+        with suppressed_output():
+            core = SimulationCore()
+            core.initialize_system(num_doctors=2, buffer_capacity=3, mean_service_time=40.0)
+        cache = StateSnapshotCache(rebuild_every=5, history_size=3)
+        cache.rebuild(core)
+        self.assertEqual(cache.version, 1)
+        first = json.loads(cache.get_payload())
+        self.assertEqual(first['version'], 1)
+        self.assertEqual(first['buffer_capacity'], 3)
+
+        core.add_observer(cache)
+        with suppressed_output():
+            core.run_until(2000.0)
+        self.assertGreater(cache.version, 4)
+        cache.rebuild(core)  # Снимок отстает от ядра не больше чем на rebuild_every событий
+        latest = json.loads(cache.get_payload())
+        self.assertEqual(latest['version'], cache.version)
+        self.assertEqual(latest['statistics']['total_arrived'], core.statistics.total_patients_arrived)
+
+        # Версия из истории - только изменившиеся поля
+        delta = json.loads(cache.get_delta_payload(cache.version - 1))
+        self.assertFalse(delta['full'])
+        self.assertEqual(delta['version'], cache.version)
+        self.assertIn('current_time', delta['changes'])
+        self.assertNotIn('buffer_capacity', delta['changes'])
+        self.assertEqual(json.loads(cache.get_delta_payload(cache.version))['changes'], {})
+
+        # Вытесненная или выдуманная версия - полный снимок, в кэш не попадает
+        for since in (1, -7, 10 ** 9):
+            delta = json.loads(cache.get_delta_payload(since))
+            self.assertTrue(delta['full'])
+            self.assertEqual(delta['changes']['version'], cache.version)
+        self.assertLessEqual(len(cache._delta_cache), 3)
+
+
+class ResultsStoreTest(unittest.TestCase):
+    """Запись пачками в WAL-базе и выборки прогонов"""
+
+    def test_batches_and_queries(self):
+        reports = []
+        for buffer_capacity, seed in ((1, 1), (1, 2), (3, 3), (1, 4)):
+            statistics = run_fast(3000.0, 1, buffer_capacity, 40.0, seed=seed)
+            reports.append((buffer_capacity, statistics.generate_detailed_report(3000.0, 1)))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.sqlite')
+            store = ResultsStore(path, batch_size=3)
+            mode = store.query("PRAGMA journal_mode")[0]['journal_mode']
+            self.assertEqual(mode, 'wal')
+
+            for index, (buffer_capacity, report) in enumerate(reports[:2]):
+                store.add_report(report, num_doctors=1, buffer_capacity=buffer_capacity,
+                                 mean_service_time=40.0, seed=index, label='test')
+            self.assertEqual(store.query("SELECT COUNT(*) AS n FROM runs")[0]['n'], 0)  # Ждут пачки
+            buffer_capacity, report = reports[2]
+            store.add_report(report, num_doctors=1, buffer_capacity=buffer_capacity, mean_service_time=40.0)
+            self.assertEqual(store.query("SELECT COUNT(*) AS n FROM runs")[0]['n'], 3)
+            buffer_capacity, report = reports[3]
+            store.add_report(report, num_doctors=1, buffer_capacity=buffer_capacity, mean_service_time=40.0)
+            store.close()
+
+            with ResultsStore(path) as reopened:
+                runs = reopened.runs_by_buffer(1)
+                self.assertEqual(len(runs), 3)
+                rates = [run['emergency_reject_rate'] for run in runs]
+                self.assertEqual(rates, sorted(rates, reverse=True))
+                self.assertEqual(len(reopened.runs_by_buffer(1, limit=2)), 2)
+                self.assertEqual([run['buffer_capacity'] for run in reopened.runs_by_buffer(3)], [3])
+                sources = reopened.get_run_sources(runs[0]['run_id'])
+                self.assertEqual(len(sources), len(reports[0][1]['sources_characteristics']))
+                self.assertEqual(sum(source['total_arrived'] for source in sources), runs[0]['total_arrived'])
+                self.assertEqual(len(reopened.get_run_doctors(runs[0]['run_id'])), 1)
+
+
+class ArrivalProfileTest(unittest.TestCase):
+    """Неоднородный поток по профилю времени суток"""
+
+    def test_hourly_rates(self):
+        rates = {1: [(0.0, 6.0), (600.0, 30.0), (1200.0, 0.0)], 2: [(300.0, 12.0)]}
+        profile = ArrivalProfile(rates)
+        random.seed(8)
+        days = 200
+        counts = {source_id: [0] * 24 for source_id in rates}
+        time = 0.0
+        while True:
+            time, source_id = profile.sample_next(time)
+            if time >= days * 1440.0:
+                break
+            counts[source_id][int(time % 1440.0 // 60.0)] += 1
+
+        for hour in range(24):
+            start = hour * 60.0
+            for source_id in rates:
+                expected = ArrivalProfile._rate_at(sorted(rates[source_id]), start) * days
+                tolerance = 5.0 * math.sqrt(expected) + 1e-9
+                self.assertLessEqual(abs(counts[source_id][hour] - expected), tolerance,
+                                     f"источник {source_id}, час {hour}")
+        self.assertAlmostEqual(profile.get_mean_rate(1), (6.0 * 10 + 30.0 * 10) / 24)
+
+    def test_period_wrap(self):
+        # Прибытия только в первый час периода (60 в час - одно в минуту)
+        profile = ArrivalProfile({1: [(0.0, 60.0), (60.0, 0.0)]})
+        self.assertEqual(profile.total_per_period, 60.0)
+
+        # Экспоненциальная добавка 3: накопленная 60 + 3 - третья минута следующего периода
+        with mock.patch('random.random', side_effect=[1.0 - math.exp(-3.0), 0.5]):
+            arrival_time, source_id = profile.sample_next(100.0)
+        self.assertAlmostEqual(arrival_time, 1440.0 + 3.0, places=9)
+        self.assertEqual(source_id, 1)
+
+        random.seed(9)
+        for current_time in (59.5, 100.0, 1439.9, 3 * 1440.0 + 61.0):
+            for _ in range(200):
+                arrival_time, _ = profile.sample_next(current_time)
+                self.assertGreater(arrival_time, current_time)
+                self.assertLess(arrival_time % 1440.0, 60.0)
+                self.assertLess(arrival_time - current_time, 1440.0 + 60.0)
+
+
+class HistogramTest(unittest.TestCase):
+    """Процентили лог-линейной гистограммы и интервал переполнения"""
+
+    def test_percentile_error(self):
+        random.seed(10)
+        values = [math.exp(random.uniform(0.0, 8.5)) for _ in range(20000)]  # От 1 до ~5000 мин
+        histogram = LogLinearHistogram()
+        histogram.record_all(values)
+        values.sort()
+        percentiles = (1.0, 10.0, 50.0, 90.0, 95.0, 99.0, 99.9, 100.0)
+        estimates = histogram.get_percentiles(percentiles)
+        for percentile in percentiles:
+            exact = values[max(1, math.ceil(percentile / 100.0 * len(values) - 1e-9)) - 1]
+            self.assertLessEqual(abs(estimates[percentile] - exact), 2.0 / 128 * exact, f"p{percentile:g}")
+
+    def test_overflow_bucket(self):
+        histogram = LogLinearHistogram(unit=0.01, max_value=100.0)
+        for value in (5.0, 150.0, 1e6):
+            histogram.record(value)
+        self.assertEqual(histogram.counts[-1], 2)
+        self.assertEqual(sum(histogram.counts), 3)
+        self.assertEqual(histogram.max, 1e6)
+        self.assertEqual(histogram.get_mean(), (5.0 + 150.0 + 1e6) / 3)
+        # Процентили переполнения - не меньше границы отслеживания
+        self.assertGreaterEqual(histogram.get_percentile(90.0), 100.0)
+
+
+class StatisticsCacheTest(unittest.TestCase):
+    """Кэш сводных показателей сбрасывается при каждом изменении статистики"""
+
+    def test_invalidation(self):
+        statistics = Statistics()
+        summary = statistics.get_summary()
+        self.assertIs(statistics.get_summary(), summary)  # Без изменений - тот же объект
+        self.assertEqual(summary['total_arrived'], 0)
+
+        patient = Patient(id=1, source_id=1, name='', arrival_time=0.0)
+        with suppressed_output():
+            version = statistics.version
+            statistics.record_patient_arrival(patient)
+            self.assertGreater(statistics.version, version)
+            self.assertEqual(statistics.get_summary()['total_arrived'], 1)
+
+            patient.service_start_time = 4.0
+            version = statistics.version
+            statistics.record_service_start(patient)
+            self.assertGreater(statistics.version, version)
+            patient.service_end_time = 10.0
+            statistics.record_service_end(patient)
+            self.assertEqual(statistics.get_summary()['total_served'], 1)
+            self.assertEqual(statistics.get_summary()['avg_wait_time'], 4.0)
+            statistics.record_patient_rejection(Patient(id=2, source_id=2, name='', arrival_time=1.0))
+            self.assertEqual(statistics.get_summary()['total_rejected'], 1)
+
+        report = statistics.generate_detailed_report(10.0, 1)
+        self.assertIs(statistics.generate_detailed_report(10.0, 1), report)
+        version = statistics.version
+        statistics.merge(statistics + Statistics())
+        self.assertGreater(statistics.version, version)
+        self.assertEqual(statistics.get_summary()['total_arrived'], 2)
+        self.assertIsNot(statistics.generate_detailed_report(10.0, 1), report)
+
+        # Прямое изменение полей видно только после mark_changed
+        statistics.total_patients_arrived = 7
+        self.assertEqual(statistics.get_summary()['total_arrived'], 2)
+        statistics.mark_changed()
+        self.assertEqual(statistics.get_summary()['total_arrived'], 7)
+        self.assertEqual(statistics._cache_version, statistics.version)
+
+
+class SurrogateTest(unittest.TestCase):
+    """Латинский гиперкуб и интерполяция гауссовского процесса"""
+
+    def test_latin_hypercube(self):
+        n = 17
+        points = latin_hypercube(n, 3, random.Random(11))
+        self.assertEqual(len(points), n)
+        for dimension in range(3):
+            column = [point[dimension] for point in points]
+            self.assertTrue(all(0.0 <= value < 1.0 for value in column))
+            # По каждой координате ровно одна точка в каждом из n интервалов
+            self.assertEqual(sorted(int(value * n) for value in column), list(range(n)))
+
+    def test_gp_interpolates(self):
+        x = latin_hypercube(20, 2, random.Random(12))
+        y = [math.sin(3.0 * a) + b * b for a, b in x]
+        model = GaussianProcess().fit(x, y)
+        for point, value in zip(x, y):
+            mean, variance = model.predict_with_variance(point)
+            self.assertAlmostEqual(model.predict(point), mean, places=9)
+            self.assertLess(abs(mean - value), 0.05 * model.y_std)
+            self.assertLess(variance, 0.05 * model.y_std ** 2)
+        # Вдали от обучающих точек - априорная дисперсия
+        _, far_variance = model.predict_with_variance([4.0, 4.0])
+        self.assertAlmostEqual(far_variance, model.y_std ** 2, delta=1e-6 * model.y_std ** 2)
+
+
+class MemoryTrackerTest(unittest.TestCase):
+    """Профилирование памяти на коротком прогоне"""
+
+    def test_samples_and_report(self):
+        random.seed(13)
+        with suppressed_output():
+            core = SimulationCore()
+            core.initialize_system(num_doctors=2, buffer_capacity=3, mean_service_time=40.0)
+        tracker = core.enable_memory_tracking(500.0)
+        try:
+            core.run_until(3000.0)
+            tracker.take_snapshot(core)
+        finally:
+            tracker.stop()
+            core.close()
+
+        self.assertGreaterEqual(len(tracker.samples), 6)  # Каждые 500 мин и финальный
+        times = [sample['time'] for sample in tracker.samples]
+        self.assertEqual(times, sorted(times))
+        last = tracker.samples[-1]
+        self.assertGreater(last['traced_bytes'], 0)
+        self.assertEqual(last['objects']['waiting_room'], len(core.waiting_room.patients))
+        self.assertIn('core', last['by_subsystem'])
+
+        text = tracker.format_report()
+        self.assertTrue(text.startswith("=== ПРОФИЛЬ ПАМЯТИ ==="))
+        self.assertGreater(len(text.splitlines()), len(tracker.samples) + 4)
+
+
+class TimeSeriesTest(unittest.TestCase):
+    """Попарное слияние интервалов ряда при переполнении"""
+
+    def test_pairwise_downsampling(self):
+        random.seed(14)
+        sampler = TimeSeriesSampler(interval=10.0, capacity=4)
+        values = [tuple(random.uniform(0.0, 10.0) for _ in CHANNELS) for _ in range(37)]
+        lengths = []
+        for sample in values:
+            sampler.add(sample)
+            self.assertLessEqual(sampler.size, sampler.capacity)
+            lengths.append(sampler.samples_per_bucket)
+        # Длина интервала только удваивается: 1, 2, 4, ..., и 37 отсчетов умещаются в 4 интервала по 16
+        self.assertEqual(sorted(set(lengths)), [1, 2, 4, 8, 16])
+        self.assertEqual(sampler.samples_per_bucket, 16)
+
+        series = sampler.get_series()
+        width = sampler.samples_per_bucket
+        self.assertEqual(series['time'], [index * width * 10.0 for index in range(sampler.size)])
+        for channel, name in enumerate(CHANNELS):
+            for index in range(sampler.size):
+                chunk = [sample[channel] for sample in values[index * width:(index + 1) * width]]
+                self.assertAlmostEqual(series[f"{name}_mean"][index], sum(chunk) / len(chunk))
+                self.assertEqual(series[f"{name}_min"][index], min(chunk))
+                self.assertEqual(series[f"{name}_max"][index], max(chunk))
+            # Взвешенное по числу отсчетов среднее ряда - среднее всех отсчетов
+            total = sum(mean * sampler.counts[index] for index, mean in enumerate(series[f"{name}_mean"]))
+            self.assertAlmostEqual(total / len(values), sum(sample[channel] for sample in values) / len(values))
+
+    def test_enabled_mid_run(self):
+        random.seed(15)
+        with suppressed_output():
+            core = SimulationCore()
+            core.initialize_system(num_doctors=2, buffer_capacity=3, mean_service_time=40.0)
+            core.run_until(1000.0)
+            sampler = core.enable_time_series(interval=10.0, capacity=64)
+            core.run_until(1100.0)
+        # Опросы только с момента включения: 1000, 1010, ... до последнего события прогона
+        self.assertTrue(0 < sampler.total_samples <= 10)
+        series = sampler.get_series()
+        self.assertEqual(series['time'], [1000.0 + 10.0 * index for index in range(sampler.total_samples)])
+        self.assertGreater(series['rejections_min'][0], 0)  # Состояние на момент включения, а не пустая система
+
+class WaitingRoomTest(unittest.TestCase):
+    """Д2Б4: высший приоритет, при равенстве - раньше прибывший; низший приоритет тоже выбирается"""
+
+    def test_selection_order(self):
+        room = WaitingRoom(capacity=5)
+        with suppressed_output():
+            # Только пациенты низшего приоритета: раньше ни один из них не выбирался
+            for patient_id, arrival_time in ((1, 5.0), (2, 3.0)):
+                room.add_patient(Patient(id=patient_id, source_id=3, name='', arrival_time=arrival_time))
+            room.add_patient(Patient(id=3, source_id=2, name='', arrival_time=7.0))
+            room.add_patient(Patient(id=4, source_id=1, name='', arrival_time=9.0))
+            order = [room.get_next_patient().id for _ in range(4)]
+            self.assertIsNone(room.get_next_patient())
+        self.assertEqual(order, [4, 3, 2, 1])
+        self.assertEqual(room.size, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import random
+from typing import Sequence
+
+
+class AliasTable:
+    """Alias-таблица (метод Уолкера - Воуза) для выбора индекса с заданными весами за O(1)"""
+
+    def __init__(self, weights: Sequence[float]):
+        total = float(sum(weights))
+        if not weights or total <= 0 or min(weights) < 0:
+            raise ValueError("Веса должны быть неотрицательными с положительной суммой")
+        size = len(weights)
+        scaled = [weight * size / total for weight in weights]
+        self.size = size
+        self.probability = [1.0] * size
+        self.alias = list(range(size))
+
+        small = [i for i, value in enumerate(scaled) if value < 1.0]
+        large = [i for i, value in enumerate(scaled) if value >= 1.0]
+        while small and large:
+            low, high = small.pop(), large.pop()
+            self.probability[low] = scaled[low]
+            self.alias[low] = high
+            scaled[high] -= 1.0 - scaled[low]
+            (small if scaled[high] < 1.0 else large).append(high)
+        # Остатки (из-за округления) - с вероятностью 1
+
+    def sample(self) -> int:
+        """Индекс: один розыгрыш на ячейку и сравнение с ее порогом"""
+        u = random.random() * self.size
+        index = int(u)
+        return index if u - index < self.probability[index] else self.alias[index]
@@ -0,0 +1,9 @@
+import contextlib
+import os
+
+
+@contextlib.contextmanager
+def suppressed_output():
+    """Подавляет вывод print на время пакетного (безэкранного) прогона"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
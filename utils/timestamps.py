@@ -0,0 +1,22 @@
+from datetime import datetime, timezone
+from typing import Union
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def parse_trace_time(value: Union[str, float, int]) -> float:
+    """Время записи журнала в минутах: число как есть, метка ISO 8601 - от 1970-01-01"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = value.strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    try:
+        moment = datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"Не удалось разобрать время '{text}' (минуты или ISO 8601)") from None
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return (moment - _EPOCH).total_seconds() / 60.0